@@ -64,11 +64,26 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{MYSQL_USER}:{urllib.parse.quote_plus(MYSQL_PASSWORD)}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = True
+    # One engine pool serves the ORM and raw SQL (utils.db_manager)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))  # idle connections kept open
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))  # extra connections under load
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))  # seconds
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
-        'pool_recycle': 3600,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_POOL_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
         'pool_pre_ping': True
     }
+    DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'False').lower() in ('true', '1', 't')
+    DB_PREPARED_STATEMENT_LIMIT = int(os.environ.get('DB_PREPARED_STATEMENT_LIMIT', 64))  # per connection
+    DB_STREAM_BATCH_SIZE = int(os.environ.get('DB_STREAM_BATCH_SIZE', 1000))  # rows per fetch in iter_query
+    DB_BULK_BATCH_SIZE = int(os.environ.get('DB_BULK_BATCH_SIZE', 500))  # rows per statement in bulk writes
+    DB_REPLICA_URLS = [url.strip() for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url.strip()]  # SQLAlchemy URLs
+    DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))  # seconds; lagging replicas are skipped
+    DB_REPLICA_LAG_CHECK_INTERVAL = int(os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', 10))  # seconds
+    DB_READ_YOUR_WRITES_SECONDS = int(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 10))  # reads stay on the primary after a write
     
     # Application Configuration
     DEBUG = True
@@ -94,6 +109,41 @@ class Config:
     CACHE_TYPE = 'redis'
     CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # 'memory', 'sqlite' or 'redis'
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH')  # defaults to a file in the temp dir
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'library:')
+    CACHE_L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', 1000))  # per-worker L1, only used with CACHE_INVALIDATION_BUS; 0 disables
+    CACHE_L1_TTL = int(os.environ.get('CACHE_L1_TTL', 30))
+    CACHE_INVALIDATION_BUS = os.environ.get('CACHE_INVALIDATION_BUS')  # 'redis', 'socket' or unset
+    CACHE_BUS_DIR = os.environ.get('CACHE_BUS_DIR')  # defaults to a directory in the temp dir
+    CACHE_SWEEP_INTERVAL = float(os.environ.get('CACHE_SWEEP_INTERVAL', 1.0))  # seconds, 0 disables
+    CACHE_SWEEP_BATCH_SIZE = int(os.environ.get('CACHE_SWEEP_BATCH_SIZE', 500))
+    CACHE_STATS_ENABLED = os.environ.get('CACHE_STATS_ENABLED', 'True').lower() in ('true', '1', 't')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_EVICTION_POLICY = os.environ.get('CACHE_EVICTION_POLICY', 'lru')  # 'lru' or 'lfu'
+    CACHE_SHARDS = int(os.environ.get('CACHE_SHARDS', 16))  # 1 = single global lock
+
+    # Search Configuration
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'like')  # 'like' or 'fulltext' (needs the FULLTEXT indexes)
+    FULLTEXT_MIN_TOKEN_SIZE = int(os.environ.get('FULLTEXT_MIN_TOKEN_SIZE', 3))  # innodb_ft_min_token_size
+    SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'False').lower() in ('true', '1', 't')
+    SEARCH_INDEX_MIN_PREFIX = int(os.environ.get('SEARCH_INDEX_MIN_PREFIX', 2))
+    SEARCH_INDEX_REBUILD_INTERVAL = int(os.environ.get('SEARCH_INDEX_REBUILD_INTERVAL', 0))  # seconds, 0 = build once
+    SEARCH_INDEX_MAX_IDS = int(os.environ.get('SEARCH_INDEX_MAX_IDS', 1000))  # broader searches use FULLTEXT/LIKE
+    BITMAP_INDEX_ENABLED = os.environ.get('BITMAP_INDEX_ENABLED', 'False').lower() in ('true', '1', 't')
+    BITMAP_INDEX_REBUILD_INTERVAL = int(os.environ.get('BITMAP_INDEX_REBUILD_INTERVAL', 0))  # seconds, 0 = build once
+    BITMAP_INDEX_MAX_IDS = int(os.environ.get('BITMAP_INDEX_MAX_IDS', 5000))  # larger tag filter results stay in SQL
+    SEARCH_RESULT_CACHE_ENABLED = os.environ.get('SEARCH_RESULT_CACHE_ENABLED', 'False').lower() in ('true', '1', 't')
+    SEARCH_RESULT_CACHE_TTL = int(os.environ.get('SEARCH_RESULT_CACHE_TTL', 300))
+    SEARCH_RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_RESULT_CACHE_MAX_ENTRIES', 1000))
+    SEARCH_RESULT_CACHE_MAX_IDS = int(os.environ.get('SEARCH_RESULT_CACHE_MAX_IDS', 10000))  # longer results aren't cached
+    TYPEAHEAD_ENABLED = os.environ.get('TYPEAHEAD_ENABLED', 'False').lower() in ('true', '1', 't')
+    TYPEAHEAD_REBUILD_INTERVAL = int(os.environ.get('TYPEAHEAD_REBUILD_INTERVAL', 600))  # seconds, refreshes popularity
+    COUNT_STRATEGY = os.environ.get('COUNT_STRATEGY', 'auto')  # 'auto' (estimate large totals) or 'exact'
+    COUNT_EXACT_THRESHOLD = int(os.environ.get('COUNT_EXACT_THRESHOLD', 10000))
+    COUNT_CACHE_TTL = int(os.environ.get('COUNT_CACHE_TTL', 300))
+    COUNT_ESTIMATE_CACHE_TTL = int(os.environ.get('COUNT_ESTIMATE_CACHE_TTL', 60))
     
     # Celery Configuration (for background tasks)
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or REDIS_URL
@@ -119,6 +169,10 @@ class Config:
     # Rate Limiting
     RATELIMIT_STORAGE_URL = REDIS_URL
     RATELIMIT_DEFAULT = "100 per hour"
+    RATELIMIT_ALGORITHM = os.environ.get('RATELIMIT_ALGORITHM', 'sliding_window')  # or 'token_bucket', 'gcra'
+    # Per-endpoint limits, counted per user (per IP when anonymous), e.g.
+    # {'auth.login': '5 per minute', 'books_api.get_books': {'rate': '60/minute', 'algorithm': 'gcra'}}
+    RATELIMIT_POLICIES = {}
     
     # Logging Configuration
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT', 'False').lower() in ('true', '1', 't')
@@ -17,7 +17,8 @@ CREATE TABLE authors (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     INDEX idx_full_name (last_name, first_name),
-    INDEX idx_nationality (nationality)
+    INDEX idx_nationality (nationality),
+    FULLTEXT INDEX ft_authors_name (first_name, last_name)
 );
 
 -- Create publishers table (from enhanced.sql)
@@ -108,6 +109,7 @@ CREATE TABLE books (
     INDEX idx_title (title),
     INDEX idx_author (author),
     INDEX idx_copies_available (copies_available),
+    FULLTEXT INDEX ft_books_text (title, author, description),
     CONSTRAINT chk_copies_positive CHECK (total_copies > 0),
     CONSTRAINT chk_available_copies CHECK (copies_available >= 0),
     CONSTRAINT chk_available_not_exceed_total CHECK (copies_available <= total_copies)
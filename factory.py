@@ -2,7 +2,16 @@ from flask import Flask
 from database import config as db_config
 from extensions import db, bcrypt, login_manager, jwt
 from utils.security import Security
-from utils.middleware import security_headers, request_logger, require_https, handle_cors
+from utils.cache import cache
+from utils.rate_limiter import rate_limiter
+from utils.db_pool import db_pool
+from utils.db_router import replica_router
+from utils.search_index import search_index
+from utils.bitmap_index import bitmap_index
+from utils.result_cache import search_result_cache
+from utils.counting import count_strategy
+from utils.typeahead import typeahead
+from utils.middleware import security_headers, rate_limit_headers, request_logger, require_https, handle_cors
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_cors import CORS
@@ -44,7 +53,9 @@ def create_app(config_class=Config):
     app.debug = True
     
     # Initialize extensions
+    db_pool.init_app(app)  # before db.init_app, which creates the engine
     db.init_app(app)
+    replica_router.init_app(app)
     migrate = Migrate(app, db)
     bcrypt.init_app(app)
     login_manager = LoginManager()
@@ -52,6 +63,13 @@ def create_app(config_class=Config):
     login_manager.login_view = 'auth.login'
     CORS(app)
     jwt.init_app(app)
+    cache.init_app(app)
+    rate_limiter.init_app(app)
+    search_index.init_app(app)
+    bitmap_index.init_app(app)
+    search_result_cache.init_app(app)
+    count_strategy.init_app(app)
+    typeahead.init_app(app)
     
     # Register blueprints
     from routes.auth import auth_bp
@@ -65,6 +83,8 @@ def create_app(config_class=Config):
     from routes.fines import fines_bp
     from routes.audit import audit_bp
     from routes.reports import reports_bp
+    from routes.cache import cache_bp
+    from routes.database import database_bp
     from routes.main import main
     
     app.register_blueprint(auth_bp)
@@ -78,6 +98,8 @@ def create_app(config_class=Config):
     app.register_blueprint(fines_bp)
     app.register_blueprint(audit_bp)
     app.register_blueprint(reports_bp)
+    app.register_blueprint(cache_bp)
+    app.register_blueprint(database_bp)
     app.register_blueprint(main)
     
     # Register error handlers
@@ -86,6 +108,7 @@ def create_app(config_class=Config):
     
     # Register middleware
     app.after_request(security_headers)
+    app.after_request(rate_limit_headers)
     app.before_request(request_logger)
     app.before_request(require_https)
     app.before_request(handle_cors)
@@ -5,9 +5,10 @@ Models are imported in order to maintain foreign key relationships.
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from utils.db_router import routing_session_class
 
-# Initialize SQLAlchemy instance
-db = SQLAlchemy()
+# Initialize SQLAlchemy instance; read_only work may run on replicas
+db = SQLAlchemy(session_options={'class_': routing_session_class()})
 
 # Base models (no foreign keys)
 from models.user import User
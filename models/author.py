@@ -10,15 +10,25 @@ class Author(BaseModel):
     __tablename__ = 'authors'
     
     author_id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False, index=True)
+    first_name = db.Column(db.String(100), nullable=False)
+    last_name = db.Column(db.String(100), nullable=False)
     biography = db.Column(db.Text)
 
-    def __init__(self, name, biography=None):
+    # Full name, as the search index and typeahead read it
+    name = db.column_property(first_name + ' ' + last_name)
+
+    __table_args__ = (
+        db.Index('idx_full_name', 'last_name', 'first_name'),
+        db.Index('ft_authors_name', 'first_name', 'last_name', mysql_prefix='FULLTEXT'),
+    )
+
+    def __init__(self, first_name, last_name, biography=None):
         """Initialize a new author."""
-        self.name = name
+        self.first_name = first_name
+        self.last_name = last_name
         self.biography = biography
         self.is_active = True
 
     def __repr__(self):
         """String representation of the author."""
-        return f'<Author {self.name}>'
+        return f'<Author {self.first_name} {self.last_name}>'
@@ -2,10 +2,33 @@
 Base model class to eliminate DRY violations across models
 """
 
+import logging
 from datetime import UTC, datetime
+from itertools import chain
 from models import db
-from sqlalchemy import inspect
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 from sqlalchemy.ext.declarative import declared_attr
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Callbacks run after each commit, see on_commit()
+_commit_hooks = []
+
+def on_commit(callback):
+    """
+    Register a callback run after each commit that wrote BaseModel rows
+
+    Args:
+        callback: Called with a list of (table_name, column_values) tuples.
+            Values are captured at flush time, so deleted rows are included.
+
+    Returns:
+        The callback, so this can be used as a decorator
+    """
+    _commit_hooks.append(callback)
+    return callback
 
 class BaseModel(db.Model):
     """Base model class with common functionality"""
@@ -101,6 +124,23 @@ class BaseModel(db.Model):
         db.session.commit()
         return self
     
+    def cache_tags(self):
+        """Cache tags invalidated when this record is written: the table and the row"""
+        table = self.__tablename__
+        identity = inspect(self.__class__).primary_key_from_instance(self)
+        if any(value is None for value in identity):
+            return [table]
+        return [table, f"{table}:{','.join(str(value) for value in identity)}"]
+    
+    def column_values(self):
+        """Loaded column values, read without triggering lazy loads"""
+        state = self.__dict__
+        return {
+            attr.key: state[attr.key]
+            for attr in inspect(self.__class__).column_attrs
+            if attr.key in state
+        }
+    
     def __repr__(self):
         """String representation"""
         primary_key = inspect(self.__class__).primary_key[0].name
@@ -134,3 +174,35 @@ class ActiveMixin:
         if hasattr(self, 'updated_at'):
             self.updated_at = datetime.now(UTC)
         db.session.commit()
+
+# Invalidate cache entries tagged with written tables/rows and run commit
+# hooks once the transaction commits; changes are collected per flush and
+# dropped on rollback
+@event.listens_for(Session, 'after_flush')
+def _collect_cache_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    changes = session.info.setdefault('model_changes', [])
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, BaseModel):
+            tags.update(instance.cache_tags())
+            if _commit_hooks:
+                changes.append((instance.__tablename__, instance.column_values()))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cache_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        cache.invalidate_tags(*tags)
+
+    changes = session.info.pop('model_changes', None)
+    if changes:
+        for callback in _commit_hooks:
+            try:
+                callback(changes)
+            except Exception as e:
+                logger.error(f"Commit hook {callback.__name__} failed: {e}")
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_cache_tags(session, previous_transaction):
+    session.info.pop('cache_tags', None)
+    session.info.pop('model_changes', None)
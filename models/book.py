@@ -18,21 +18,34 @@ class Book(BaseModel):
     book_id = db.Column(db.Integer, primary_key=True)
     isbn = db.Column(db.String(13), unique=True, nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False, index=True)
+    author = db.Column(db.String(100), nullable=False, default='', index=True)
     description = db.Column(db.Text)
     publication_date = db.Column(db.Date, index=True)
     price = db.Column(db.Numeric(10, 2))
     stock_quantity = db.Column(db.Integer, default=0)
     publisher_id = db.Column(db.Integer, db.ForeignKey('publishers.publisher_id', ondelete='SET NULL'), index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id', ondelete='SET NULL'), index=True)
+    publication_year = db.Column(db.Integer)
+    total_copies = db.Column(db.Integer, nullable=False, default=1)
+    copies_available = db.Column(db.Integer, nullable=False, default=1, index=True)
+
+    __table_args__ = (
+        # Same columns as MATCH() in utils.search and EnhancedBook, which must list them exactly
+        db.Index('ft_books_text', 'title', 'author', 'description', mysql_prefix='FULLTEXT'),
+    )
 
     # Relationships
     publisher = db.relationship('Publisher', backref=db.backref('books', lazy='dynamic'))
     category = db.relationship('Category', backref=db.backref('books', lazy='dynamic'))
     authors = db.relationship('Author', secondary='book_authors', backref=db.backref('books', lazy='dynamic'))
     reviews = db.relationship('BookReview', backref='book', lazy='dynamic', cascade='all, delete-orphan')
+    copies = db.relationship('BookCopy', back_populates='book', lazy='dynamic', cascade='all, delete-orphan')
+    borrowings = db.relationship('Borrowing', back_populates='book', lazy='dynamic')
+    tags = db.relationship('BookTag', back_populates='book', cascade='all, delete-orphan')
 
     def __init__(self, isbn, title, description=None, publication_date=None, price=None,
-                 stock_quantity=0, publisher_id=None, category_id=None):
+                 stock_quantity=0, publisher_id=None, category_id=None, publication_year=None,
+                 total_copies=1, copies_available=None):
         """Initialize a new book."""
         self.isbn = isbn
         self.title = title
@@ -42,6 +55,9 @@ class Book(BaseModel):
         self.stock_quantity = stock_quantity
         self.publisher_id = publisher_id
         self.category_id = category_id
+        self.publication_year = publication_year
+        self.total_copies = total_copies
+        self.copies_available = total_copies if copies_available is None else copies_available
         self.is_active = True
 
     def to_dict(self, exclude=None, include_relationships=True):
@@ -16,8 +16,9 @@ class BookAuthor(BaseModel):
     role = db.Column(db.Enum('author', 'co-author', 'editor', 'translator'), default='author')
 
     # Relationships
-    book = db.relationship('Book', back_populates='authors')
-    author = db.relationship('Author', back_populates='books')
+    # Book.authors and its Author.books backref go through this table
+    book = db.relationship('Book', overlaps='authors,books')
+    author = db.relationship('Author', overlaps='authors,books')
 
     def __init__(self, book_id, author_id, role='author'):
         """Initialize a new book-author relationship."""
@@ -25,7 +25,7 @@ class BookCopy(BaseModel):
     # Relationships
     book = db.relationship('Book', back_populates='copies')
     branch = db.relationship('LibraryBranch', back_populates='book_copies')
-    borrowings = db.relationship('Borrowing', back_populates='book_copy', lazy='dynamic')
+    borrowings = db.relationship('Borrowing', back_populates='copy', lazy='dynamic')
 
     def __init__(self, book_id, branch_id, barcode=None, condition='good', location=None, price=None, notes=None):
         """Initialize a new book copy."""
@@ -172,7 +172,7 @@ class Reservation(BaseModel):
     notes = db.Column(db.Text)
 
     # Relationships
-    user = db.relationship('User', backref=db.backref('reservations', lazy='dynamic'))
+    user = db.relationship('User', back_populates='reservations')
     book = db.relationship('Book', backref=db.backref('reservations', lazy='dynamic'))
 
     __table_args__ = (
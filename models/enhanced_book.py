@@ -6,8 +6,13 @@ Provides advanced book management functionality with detailed information.
 from models import db
 from datetime import UTC, datetime
 from sqlalchemy import func, and_, or_, desc
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import relationship, joinedload
 from typing import List, Dict, Optional, Union
+from utils.bitmap_index import Bitmap, bitmap_index
+from utils.cache import cached
+from utils.facets import normalize_filters, fold_groups
+from utils.result_cache import SearchPredicate, search_result_cache
 
 class EnhancedBook:
     """Class providing enhanced book management functionality."""
@@ -132,44 +137,44 @@ class EnhancedBook:
         }
     
     @staticmethod
-    def search_advanced(filters: Dict) -> List[Dict]:
+    def _apply_search_filters(query, filters: Dict):
         """
-        Advanced book search with multiple filters.
+        Apply advanced search filters to a Book query.
         
         Args:
-            filters (Dict): Dictionary containing search filters:
-                - title (str): Book title
-                - author (str): Author name
-                - isbn (str): ISBN
-                - category_id (int): Category ID
-                - publisher_id (int): Publisher ID
-                - year_from (int): Publication year from
-                - year_to (int): Publication year to
-                - available_only (bool): Only show available books
-                - tags (List[int]): List of tag IDs
-                
+            query: Book query
+            filters (Dict): Filters as documented on search_advanced
+        
         Returns:
-            List[Dict]: List of dictionaries containing book information
+            Tuple of the filtered query and the FULLTEXT relevance
+            expression, or None when not matching by relevance
         """
+        from models.author import Author
         from models.book import Book
-        from models.book_tag import BookTag
+        from models.tag import BookTag
+        from utils.search import fulltext_query
         
-        query = Book.query.options(
-            joinedload(Book.publisher),
-            joinedload(Book.category),
-            joinedload(Book.authors),
-            joinedload(Book.tags)
-        )
+        # Apply filters; with the FULLTEXT backend title and author use
+        # MATCH ... AGAINST and results are ordered by title relevance
+        relevance = None
+        title_query = fulltext_query(filters.get('title'))
+        author_query = fulltext_query(filters.get('author'))
         
-        # Apply filters
-        if filters.get('title'):
+        if title_query:
+            relevance = match(Book.title, Book.author, Book.description, against=title_query).in_boolean_mode()
+            query = query.filter(relevance)
+        elif filters.get('title'):
             query = query.filter(Book.title.ilike(f"%{filters['title']}%"))
         
-        if filters.get('author'):
+        if author_query:
+            query = query.filter(Book.authors.any(
+                match(Author.first_name, Author.last_name, against=author_query).in_boolean_mode()
+            ))
+        elif filters.get('author'):
             query = query.join(Book.authors).filter(
                 or_(
-                    func.concat(Book.authors.first_name, ' ', Book.authors.last_name).ilike(f"%{filters['author']}%"),
-                    func.concat(Book.authors.last_name, ' ', Book.authors.first_name).ilike(f"%{filters['author']}%")
+                    (Author.first_name + ' ' + Author.last_name).ilike(f"%{filters['author']}%"),
+                    (Author.last_name + ' ' + Author.first_name).ilike(f"%{filters['author']}%")
                 )
             )
         
@@ -191,11 +196,83 @@ class EnhancedBook:
         if filters.get('available_only'):
             query = query.filter(Book.copies_available > 0)
         
-        if filters.get('tags'):
-            query = query.join(Book.tags).filter(BookTag.tag_id.in_(filters['tags']))
+        # Tag filters resolve to book IDs through the bitmap index once it is
+        # built, unless the ID list would be too long to be worth sending; the
+        # category and stock filters above still apply, so a bitmap that
+        # hasn't caught up with a write can't widen the results
+        book_ids = bitmap_index.select(filters)
+        if book_ids is not None and len(book_ids) <= bitmap_index.max_ids:
+            query = query.filter(Book.book_id.in_(book_ids.to_list()))
+        else:
+            # EXISTS subqueries rather than a join, so books with several
+            # matching tags aren't returned once per tag
+            if filters.get('tags'):
+                query = query.filter(Book.tags.any(BookTag.tag_id.in_(filters['tags'])))
+            for tag_id in filters.get('all_tags') or ():
+                query = query.filter(Book.tags.any(BookTag.tag_id == tag_id))
+            if filters.get('exclude_tags'):
+                query = query.filter(~Book.tags.any(BookTag.tag_id.in_(filters['exclude_tags'])))
+        
+        return query, relevance
+    
+    @staticmethod
+    def search_advanced(filters: Dict) -> List[Dict]:
+        """
+        Advanced book search with multiple filters.
+        
+        Args:
+            filters (Dict): Dictionary containing search filters:
+                - title (str): Book title, matched against title, author
+                  and description with the FULLTEXT backend
+                - author (str): Author name
+                - isbn (str): ISBN
+                - category_id (int): Category ID
+                - publisher_id (int): Publisher ID
+                - year_from (int): Publication year from
+                - year_to (int): Publication year to
+                - available_only (bool): Only show available books
+                - tags (List[int]): Tag IDs, books with any of them
+                - all_tags (List[int]): Tag IDs, books with all of them
+                - exclude_tags (List[int]): Tag IDs, books with none of them
+                
+        Returns:
+            List[Dict]: List of dictionaries containing book information
+        """
+        from models.book import Book
+        
+        options = (
+            joinedload(Book.publisher),
+            joinedload(Book.category),
+            joinedload(Book.authors),
+            joinedload(Book.tags)
+        )
+        
+        # With the result cache, the filters run once per normalized search
+        # and later calls only load the cached IDs by primary key
+        book_ids = None
+        if search_result_cache.enabled:
+            filters = normalize_filters(filters)
+            
+            def result_ids(limit):
+                query, relevance = EnhancedBook._apply_search_filters(Book.query, filters)
+                rows = query.with_entities(Book.book_id).order_by(
+                    desc(relevance) if relevance is not None else Book.title, Book.book_id
+                ).limit(limit)
+                return list(dict.fromkeys(book_id for book_id, in rows))
+            
+            signature = tuple(sorted((name, str(value)) for name, value in filters.items()))
+            book_ids = search_result_cache.get_or_compute(
+                'search_advanced', signature, EnhancedBook._search_predicate(filters), result_ids
+            )
         
         # Execute query and format results
-        books = query.order_by(Book.title).all()
+        if book_ids is not None:
+            position = {book_id: index for index, book_id in enumerate(book_ids)}
+            books = Book.query.options(*options).filter(Book.book_id.in_(book_ids)).all() if book_ids else []
+            books.sort(key=lambda book: position[book.book_id])
+        else:
+            query, relevance = EnhancedBook._apply_search_filters(Book.query.options(*options), filters)
+            books = query.order_by(desc(relevance) if relevance is not None else Book.title).all()
         
         return [{
             'book_id': book.book_id,
@@ -210,4 +287,73 @@ class EnhancedBook:
                 f"{author.first_name} {author.last_name}"
                 for author in book.authors
             )
-        } for book in books]
\ No newline at end of file
+        } for book in books]
+    
+    @staticmethod
+    def _search_predicate(filters: Dict) -> SearchPredicate:
+        """Rows a cached search_advanced result depends on"""
+        predicate = SearchPredicate('books')
+        if filters.get('title'):
+            predicate.text(filters['title'], ('title', 'description'))
+        if filters.get('author'):
+            predicate.related('book_authors', 'authors')
+        if filters.get('isbn'):
+            predicate.text(filters['isbn'], ('isbn',))
+        for name in ('category_id', 'publisher_id'):
+            if filters.get(name):
+                predicate.where(name, '=', filters[name])
+        if filters.get('year_from'):
+            predicate.where('publication_year', '>=', filters['year_from'])
+        if filters.get('year_to'):
+            predicate.where('publication_year', '<=', filters['year_to'])
+        if filters.get('available_only'):
+            predicate.where('copies_available', '>', 0)
+        for name in ('tags', 'all_tags', 'exclude_tags'):
+            if filters.get(name):
+                predicate.tagged(filters[name])
+        return predicate
+    
+    @staticmethod
+    def facet_counts(filters: Dict) -> Dict:
+        """
+        Result counts per facet value for an advanced search.
+        
+        Args:
+            filters (Dict): Filters as documented on search_advanced
+        
+        Returns:
+            Dict: Facet name ('category_id', 'publisher_id',
+            'publication_year', 'availability', 'tags') to {value: count}
+        """
+        return EnhancedBook._facet_counts(normalize_filters(filters))
+    
+    @staticmethod
+    @cached(ttl=300, tags=['books', 'book_tags', 'book_authors'])
+    def _facet_counts(filters: Dict) -> Dict:
+        """Facet counts for normalized filters, cached per query signature"""
+        from models.book import Book
+        from models.tag import BookTag
+        
+        query, _ = EnhancedBook._apply_search_filters(Book.query, filters)
+        
+        # One grouped pass over the single-valued facets; a book lands in
+        # exactly one group, so counting distinct IDs undoes join fan-out
+        available = (Book.copies_available > 0).label('available')
+        groups = query.with_entities(
+            Book.category_id, Book.publisher_id, Book.publication_year, available,
+            func.count(func.distinct(Book.book_id))
+        ).group_by(Book.category_id, Book.publisher_id, Book.publication_year, available)
+        facets = fold_groups(groups)
+        
+        book_ids = query.with_entities(Book.book_id)
+        if bitmap_index.ready:
+            matching = Bitmap(book_id for book_id, in book_ids)
+            facets['tags'] = bitmap_index.value_counts('tag', matching)
+            return facets
+        
+        tags = db.session.query(BookTag.tag_id, func.count(func.distinct(BookTag.book_id))).filter(
+            BookTag.book_id.in_(book_ids)
+        ).group_by(BookTag.tag_id)
+        facets['tags'] = {tag_id: count for tag_id, count in tags}
+        
+        return facets
@@ -16,9 +16,11 @@ class LibraryEvent(BaseModel):
     capacity = db.Column(db.Integer)
     registration_deadline = db.Column(db.DateTime)
     created_by = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='SET NULL'))
+    branch_id = db.Column(db.Integer, db.ForeignKey('library_branches.branch_id', ondelete='SET NULL'), index=True)
     
     # Relationships
     creator = db.relationship('User', backref='created_events')
+    branch = db.relationship('LibraryBranch', back_populates='events')
     registrations = db.relationship('EventRegistration', back_populates='event', cascade='all, delete-orphan')
     
     def __init__(self, title, event_type, start_time, end_time, description=None, location=None, 
@@ -19,7 +19,7 @@ class Notification(BaseModel):
     read_at = db.Column(db.DateTime)
 
     # Relationships
-    user = db.relationship('User', backref='notifications')
+    user = db.relationship('User', back_populates='notifications')
 
     def __init__(self, user_id, title, message, type='info'):
         self.user_id = user_id
@@ -74,7 +74,7 @@ class AuditLog(BaseModel):
     user_agent = db.Column(db.String(255))
 
     # Relationships
-    user = db.relationship('User', backref='audit_logs')
+    user = db.relationship('User', back_populates='audit_logs')
 
     def __init__(self, action, table_name, record_id, user_id=None, old_values=None, 
                  new_values=None, ip_address=None, user_agent=None):
@@ -130,7 +130,7 @@ class UserPreference(BaseModel):
     preference_value = db.Column(db.Text)
 
     # Relationships
-    user = db.relationship('User', backref='preferences')
+    user = db.relationship('User', back_populates='preferences')
 
     __table_args__ = (
         db.UniqueConstraint('user_id', 'preference_key', name='unique_user_preference'),
@@ -7,7 +7,7 @@ class Preferences(BaseModel):
     __tablename__ = 'preferences'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
     theme = db.Column(db.String(20), default='light')
     language = db.Column(db.String(10), default='en')
     email_notifications = db.Column(db.Boolean, default=True)
@@ -15,7 +15,7 @@ class Preferences(BaseModel):
     timezone = db.Column(db.String(50), default='UTC')
 
     # Relationship with User model
-    user = db.relationship('User', backref=db.backref('preferences', uselist=False))
+    user = db.relationship('User')
 
     def __init__(self, user_id, **kwargs):
         self.user_id = user_id
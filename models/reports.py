@@ -11,11 +11,13 @@ from models.book import Book
 from models.user import User
 from models.fine import Fine
 from models.fine_payment import FinePayment
+from utils.db_router import read_only
 
 class Reports:
     """Class containing various reporting methods for the library system."""
 
     @staticmethod
+    @read_only
     def get_overdue_books():
         """
         Get all overdue books with user and book details.
@@ -39,6 +41,7 @@ class Reports:
         ).all()
 
     @staticmethod
+    @read_only
     def get_popular_books(limit=10, days=None):
         """
         Get the most popular books based on borrowing count.
@@ -69,6 +72,7 @@ class Reports:
         ).limit(limit).all()
 
     @staticmethod
+    @read_only
     def get_user_activity(days=30):
         """
         Get user activity statistics for the specified period.
@@ -103,6 +107,7 @@ class Reports:
         ).all()
 
     @staticmethod
+    @read_only
     def get_branch_statistics(branch_id=None):
         """
         Get statistics for library branches.
@@ -135,6 +140,7 @@ class Reports:
         ).all()
 
     @staticmethod
+    @read_only
     def get_fine_statistics(days=30):
         """
         Get fine statistics for the specified period.
@@ -159,6 +165,7 @@ class Reports:
         ).first()
 
     @staticmethod
+    @read_only
     def get_event_statistics(days=30):
         """
         Get event statistics for the specified period.
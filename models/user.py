@@ -10,6 +10,7 @@ from datetime import UTC, datetime
 import re
 from models.base_model import BaseModel
 from models.borrowing import Borrowing
+from utils.cache import cached
 
 class User(UserMixin, BaseModel):
     """Model for library users."""
@@ -27,17 +28,21 @@ class User(UserMixin, BaseModel):
     address = db.Column(db.Text, nullable=True)
 
     # Relationships
-    borrowings = db.relationship('Borrowing', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    borrowings = db.relationship('Borrowing', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
     reviews = db.relationship('BookReview', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    notifications = db.relationship('Notification', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    permissions = db.relationship('UserPermission', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    memberships = db.relationship('UserMembership', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    preferences = db.relationship('UserPreference', backref='user', lazy='joined', cascade='all, delete-orphan')
-    managed_branches = db.relationship('LibraryBranch', backref='manager', lazy='dynamic')
+    notifications = db.relationship('Notification', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
+    permissions = db.relationship('UserPermission', backref='user', lazy='dynamic', cascade='all, delete-orphan',
+                                  foreign_keys='UserPermission.user_id')
+    memberships = db.relationship('UserMembership', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
+    preferences = db.relationship('UserPreference', back_populates='user', lazy='joined', cascade='all, delete-orphan')
+    managed_branches = db.relationship('LibraryBranch', back_populates='manager', lazy='dynamic')
     granted_permissions = db.relationship('UserPermission', backref='granted_by_user', lazy='dynamic',
                                         foreign_keys='UserPermission.granted_by')
-    reservations = db.relationship('Reservation', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    audit_logs = db.relationship('AuditLog', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    reservations = db.relationship('Reservation', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
+    audit_logs = db.relationship('AuditLog', back_populates='user', lazy='dynamic', cascade='all, delete-orphan')
+    event_registrations = db.relationship('EventRegistration', back_populates='user', lazy='dynamic')
+    created_tags = db.relationship('Tag', back_populates='creator', lazy='dynamic')
+    added_book_tags = db.relationship('BookTag', back_populates='adder', lazy='dynamic')
 
     def __init__(self, username, password, email, full_name, role='member', phone=None, address=None):
         """Initialize a new user."""
@@ -99,7 +104,16 @@ class User(UserMixin, BaseModel):
 
     def has_permission(self, permission_name):
         """Check if the user has a specific permission."""
-        return any(p.permission.permission_name == permission_name for p in self.permissions)
+        return permission_name in User.get_permission_names(self.user_id)
+
+    @staticmethod
+    @cached(ttl=3600, tags=['permissions', 'user_permissions'])
+    def get_permission_names(user_id):
+        """Get the names of all permissions granted to a user."""
+        rows = db.session.query(Permission.permission_name).join(
+            UserPermission, UserPermission.permission_id == Permission.permission_id
+        ).filter(UserPermission.user_id == user_id).all()
+        return frozenset(name for (name,) in rows)
 
     def update_last_login(self):
         """Update the user's last login timestamp."""
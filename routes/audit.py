@@ -1,32 +1,40 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify
 from models.notification import AuditLog
 from utils.security import permission_required
 from utils.error_handler import handle_error
+from utils.db_router import read_only
+from utils.pagination import paginate_query, InvalidCursor
 
 audit_bp = Blueprint('audit', __name__)
 
+def _audit_log_page(query):
+    """Newest-first page of audit logs; pass next_cursor back as ?cursor= to page by keyset"""
+    try:
+        logs, pagination = paginate_query(query, AuditLog.created_at, AuditLog.log_id, descending=True)
+    except InvalidCursor as e:
+        return jsonify({'error': 'Bad Request', 'message': str(e)}), 400
+    
+    return jsonify({
+        'logs': [log.to_dict() for log in logs],
+        'total': pagination.total_count,
+        'total_exact': pagination.total_exact,
+        'pages': pagination.pages,
+        'current_page': pagination.page,
+        'next_cursor': pagination.next_cursor
+    })
+
 @audit_bp.route('/audit-logs', methods=['GET'])
 @permission_required('admin')
 @handle_error
+@read_only
 def get_audit_logs():
     """Get all audit logs."""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    
-    logs = AuditLog.query.order_by(AuditLog.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    return jsonify({
-        'logs': [log.to_dict() for log in logs.items],
-        'total': logs.total,
-        'pages': logs.pages,
-        'current_page': logs.page
-    })
+    return _audit_log_page(AuditLog.query)
 
 @audit_bp.route('/audit-logs/<int:log_id>', methods=['GET'])
 @permission_required('admin')
 @handle_error
+@read_only
 def get_audit_log(log_id):
     """Get a specific audit log."""
     log = AuditLog.query.get_or_404(log_id)
@@ -35,18 +43,7 @@ def get_audit_log(log_id):
 @audit_bp.route('/audit-logs/user/<int:user_id>', methods=['GET'])
 @permission_required('admin')
 @handle_error
+@read_only
 def get_user_audit_logs(user_id):
     """Get audit logs for a specific user."""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    
-    logs = AuditLog.query.filter_by(user_id=user_id).order_by(
-        AuditLog.created_at.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
-    
-    return jsonify({
-        'logs': [log.to_dict() for log in logs.items],
-        'total': logs.total,
-        'pages': logs.pages,
-        'current_page': logs.page
-    }) 
\ No newline at end of file
+    return _audit_log_page(AuditLog.query.filter_by(user_id=user_id)) 
\ No newline at end of file
@@ -1,9 +1,13 @@
 from flask import Blueprint, jsonify, request, render_template
 from flask_login import login_required, current_user
 from models.book import Book
+from models.enhanced_book import EnhancedBook
+from utils.facets import normalize_filters
+from utils.typeahead import typeahead
 from utils.security import Security
 from utils.validation import validate_json_schema_decorator
 from routes.generic_crud_routes import CRUDBlueprint
+from utils.db_router import read_only
 
 # Create the books blueprint with CRUD functionality
 books_crud = CRUDBlueprint(
@@ -93,6 +97,44 @@ def api_get_books():
     
     return jsonify([book.to_dict() for book in books])
 
+@books_crud.blueprint.route('/api/books/search', methods=['GET'])
+@read_only
+def api_search_books():
+    """Advanced search with facet counts for category, publisher, year, availability and tags"""
+    filters = request.args.to_dict()
+    for name in ('tags', 'all_tags', 'exclude_tags'):
+        filters[name] = request.args.getlist(name)
+    
+    try:
+        filters = normalize_filters(filters)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid search filter'}), 400
+    
+    return jsonify({
+        'success': True,
+        'books': EnhancedBook.search_advanced(filters),
+        'facets': EnhancedBook.facet_counts(filters)
+    })
+
+@books_crud.blueprint.route('/api/books/suggest', methods=['GET'])
+def api_suggest_books():
+    """Typeahead suggestions for titles, author names and ISBNs, most borrowed first"""
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int) or 10, 25))
+    if not query.strip():
+        return jsonify({'success': True, 'suggestions': []})
+    
+    suggestions = typeahead.suggest(query, limit)
+    if suggestions is None:
+        # Index still building: fall back to a title prefix match, which can use idx_title
+        books = Book.query.filter(Book.title.ilike(f"{query.strip()}%")).order_by(Book.title).limit(limit)
+        suggestions = [
+            {'type': 'title', 'text': book.title, 'id': book.book_id, 'score': 0}
+            for book in books
+        ]
+    
+    return jsonify({'success': True, 'suggestions': suggestions})
+
 @books_crud.blueprint.route('/api/books/<int:book_id>', methods=['GET'])
 def api_get_book(book_id):
     book = Book.get_by_id(book_id)
@@ -0,0 +1,29 @@
+from flask import Blueprint, Response
+from utils.cache import cache, stats
+from utils.security import permission_required
+from utils.error_handler import handle_error
+from utils.api_response import ApiResponse
+
+cache_bp = Blueprint('cache', __name__)
+
+@cache_bp.route('/admin/cache/stats', methods=['GET'])
+@permission_required('admin')
+@handle_error
+def get_cache_stats():
+    """Get cache hit/miss/eviction counters by key prefix."""
+    return ApiResponse.success(cache.get_stats())
+
+@cache_bp.route('/admin/cache/metrics', methods=['GET'])
+@permission_required('admin')
+@handle_error
+def get_cache_metrics():
+    """Get cache counters in the Prometheus text format."""
+    return Response(cache.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@cache_bp.route('/admin/cache/stats', methods=['DELETE'])
+@permission_required('admin')
+@handle_error
+def reset_cache_stats():
+    """Reset cache counters."""
+    stats.reset()
+    return ApiResponse.success(message="Cache statistics reset")
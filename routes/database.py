@@ -0,0 +1,39 @@
+from flask import Blueprint, Response
+from utils.db_pool import db_pool
+from utils.db_router import replica_router
+from utils.security import permission_required
+from utils.error_handler import handle_error
+from utils.api_response import ApiResponse
+
+database_bp = Blueprint('database', __name__)
+
+@database_bp.route('/admin/db/pool', methods=['GET'])
+@permission_required('admin')
+@handle_error
+def get_pool_stats():
+    """Get connection pool occupancy and checkout wait counters."""
+    return ApiResponse.success({**db_pool.status(), **db_pool.stats.snapshot()})
+
+@database_bp.route('/admin/db/pool/metrics', methods=['GET'])
+@permission_required('admin')
+@handle_error
+def get_pool_metrics():
+    """Get connection pool counters in the Prometheus text format."""
+    status = db_pool.status()
+    gauges = {name: status[name] for name in ('idle', 'checked_out', 'overflow')}
+    return Response(db_pool.stats.render_metrics(gauges), mimetype='text/plain; version=0.0.4')
+
+@database_bp.route('/admin/db/pool/stats', methods=['DELETE'])
+@permission_required('admin')
+@handle_error
+def reset_pool_stats():
+    """Reset connection pool counters."""
+    db_pool.stats.reset()
+    return ApiResponse.success(message="Connection pool statistics reset")
+
+@database_bp.route('/admin/db/replicas', methods=['GET'])
+@permission_required('admin')
+@handle_error
+def get_replica_stats():
+    """Get read routing counters and the last measured lag of each replica."""
+    return ApiResponse.success(replica_router.get_stats())
@@ -5,10 +5,11 @@ Generic CRUD routes to eliminate DRY violations in route patterns
 from flask import Blueprint, request, jsonify
 from flask_login import current_user, login_required
 from utils.security import permission_required
-from utils.pagination import get_pagination_args, Pagination
+from utils.pagination import get_pagination_args, paginate_query, InvalidCursor
 from utils.api_response import ApiResponse
 from utils.validation import validate_json_schema_decorator
 from functools import wraps
+from sqlalchemy import inspect
 
 class CRUDBlueprint:
     """Generic CRUD operations for models"""
@@ -87,24 +88,26 @@ class CRUDBlueprint:
             
             # Apply filters
             for key, value in request.args.items():
-                if key not in ['q', 'page', 'per_page'] and hasattr(self.model_class, key):
+                if key not in ['q', 'page', 'per_page', 'cursor'] and hasattr(self.model_class, key):
                     query = query.filter(getattr(self.model_class, key) == value)
             
             # Apply active filter if available
             if hasattr(self.model_class, 'is_active') and request.args.get('include_inactive') != 'true':
                 query = query.filter(self.model_class.is_active == True)
             
-            # Get total count
-            total = query.count()
-            
-            # Apply pagination
-            items = query.offset((page - 1) * per_page).limit(per_page).all()
+            # Apply pagination, by primary key so pages can also be fetched by cursor
+            primary_key = getattr(self.model_class, inspect(self.model_class).primary_key[0].name)
+            items, pagination = paginate_query(query, primary_key, primary_key)
             
             # Convert to dict
             data = [item.to_dict() for item in items]
             
-            return ApiResponse.pagination(data, total, page, per_page)
+            return ApiResponse.pagination(data, pagination.total_count, pagination.page, per_page,
+                                          next_cursor=pagination.next_cursor,
+                                          total_exact=pagination.total_exact)
             
+        except InvalidCursor as e:
+            return ApiResponse.error(str(e), 400)
         except Exception as e:
             return ApiResponse.error(f"Error retrieving {self.name}: {str(e)}", 500)
     
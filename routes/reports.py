@@ -1,7 +1,11 @@
+from datetime import date
 from flask import render_template, jsonify
 from models.reports import Reports
+from utils.db_manager import iter_query
+from utils.export import stream_csv
 from utils.security import permission_required
 from utils.error_handler import handle_error
+from utils.db_router import read_only
 from routes.generic_crud_routes import CRUDBlueprint
 
 # Create the reports blueprint with CRUD functionality
@@ -24,6 +28,7 @@ reports_bp = reports_crud.blueprint
 @reports_bp.route('/reports', methods=['GET'])
 @permission_required('admin')
 @handle_error
+@read_only
 def get_reports():
     """Get all reports."""
     reports = Reports.query.all()
@@ -32,7 +37,28 @@ def get_reports():
 @reports_bp.route('/reports/<int:report_id>', methods=['GET'])
 @permission_required('admin')
 @handle_error
+@read_only
 def get_report(report_id):
     """Get a specific report."""
     report = Reports.query.get_or_404(report_id)
-    return jsonify(report.to_dict()) 
\ No newline at end of file
+    return jsonify(report.to_dict()) 
+
+OVERDUE_EXPORT_QUERY = """
+    SELECT br.borrowing_id, u.username, u.email, bk.title, bk.isbn,
+           br.borrow_date, br.due_date, DATEDIFF(CURDATE(), br.due_date) AS days_overdue
+    FROM borrowings br
+    JOIN users u ON br.user_id = u.user_id
+    JOIN books bk ON br.book_id = bk.book_id
+    WHERE br.status IN ('borrowed', 'overdue') AND br.due_date < CURDATE()
+    ORDER BY br.due_date
+"""
+
+@reports_bp.route('/reports/overdue/export', methods=['GET'])
+@permission_required('admin')
+@handle_error
+@read_only
+def export_overdue():
+    """Stream overdue borrowings as a CSV file."""
+    rows = iter_query(OVERDUE_EXPORT_QUERY, dictionary=True)
+    return stream_csv(rows, f"overdue_{date.today().isoformat()}.csv")
+
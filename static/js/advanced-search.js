@@ -24,6 +24,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 .then(data => {
                     if (data.success) {
                         displayBooks(data.books);
+                        displayFacets(data.facets || {});
                     } else {
                         alert('Error: ' + data.message);
                     }
@@ -35,6 +36,16 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Show result counts next to facet values marked up as
+    // <span data-facet="category_id" data-facet-value="3"></span>
+    function displayFacets(facets) {
+        document.querySelectorAll('[data-facet]').forEach(element => {
+            const counts = facets[element.dataset.facet] || {};
+            const count = counts[element.dataset.facetValue] || 0;
+            element.textContent = `(${count})`;
+        });
+    }
+    
     function displayBooks(books) {
         const tableBody = document.getElementById('booksTableBody');
         if (!tableBody) return;
@@ -1,5 +1,29 @@
 # test_books_api.py
 # Placeholder for books API endpoint tests
 
+import pytest
+from routes.books import books_bp
+from utils.cache import cache
+
 def test_placeholder_books_api():
     assert True
+
+class TestBookSearchApi:
+    @pytest.fixture(autouse=True)
+    def client(self, catalog_app, catalog):
+        cache.clear()
+        catalog_app.register_blueprint(books_bp)
+        self.client = catalog_app.test_client()
+
+    def test_search_with_facets(self):
+        """Test that /api/books/search returns matching books and their facet counts"""
+        response = self.client.get('/api/books/search?tags=2&available_only=1')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [book['title'] for book in data['books']] == ['The Silmarillion']
+        assert data['facets']['publication_year'] == {'1977': 1}
+        assert data['facets']['tags'] == {'2': 1}
+
+    def test_invalid_filter(self):
+        """Test that malformed filter values are rejected"""
+        assert self.client.get('/api/books/search?tags=abc').status_code == 400
@@ -0,0 +1,49 @@
+# conftest.py
+# Shared fixtures
+
+import pytest
+from flask import Flask
+
+# Every model the app maps, so relationships between them resolve
+import models.book_copy
+import models.enhanced_book
+import models.library_event
+import models.preferences
+import models.reports
+from models import db
+
+# Tables of the book catalog: books with their authors, tags and lookups
+CATALOG_TABLES = ('users', 'publishers', 'categories', 'books', 'authors', 'book_authors', 'tags', 'book_tags')
+
+@pytest.fixture
+def catalog_app():
+    """App with the catalog tables in an in-memory SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[db.metadata.tables[name] for name in CATALOG_TABLES])
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def catalog(catalog_app):
+    """Three books with authors and tags: Dune, The Hobbit (out of stock) and The Silmarillion"""
+    from models.author import Author
+    from models.book import Book
+    from models.tag import Tag, BookTag
+
+    herbert, tolkien = Author('Frank', 'Herbert'), Author('J. R. R.', 'Tolkien')
+    books = [
+        Book('9780441172719', 'Dune', publication_year=1965, total_copies=2, copies_available=1),
+        Book('9780547928227', 'The Hobbit', publication_year=1937, copies_available=0),
+        Book('9780618391110', 'The Silmarillion', publication_year=1977)
+    ]
+    books[0].authors.append(herbert)
+    books[1].authors.append(tolkien)
+    books[2].authors.append(tolkien)
+    db.session.add_all(books + [Tag('classic'), Tag('fantasy')])
+    db.session.flush()
+    db.session.add_all(BookTag(book_id, tag_id) for book_id, tag_id in ((1, 1), (2, 1), (2, 2), (3, 2)))
+    db.session.commit()
+    return books
@@ -1,5 +1,221 @@
 # test_load.py
 # Placeholder for performance/load tests
 
+import os
+import random
+import statistics
+import threading
+import time
+import pytest
+from utils.cache import MemoryStore, ShardedStore
+from utils.typeahead import TypeaheadIndex, KIND_TITLE
+from utils.bitmap_index import BitmapIndex, book_keys
+
 def test_placeholder_load():
     assert True
+
+def run_cache_contention(store, threads, ops_per_thread=20000):
+    """
+    Hammer a store with mixed get/set traffic from several threads
+
+    Returns:
+        Operations per second across all threads
+    """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(worker_id):
+        barrier.wait()
+        for i in range(ops_per_thread):
+            key = f"rate_limit:{worker_id}:{i % 512}"
+            if i % 4 == 0:
+                store.set(key, i, ttl=60)
+            else:
+                store.get(key)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return threads * ops_per_thread / elapsed
+
+def test_cache_contention_benchmark():
+    """Compare single-lock and sharded stores as thread count grows"""
+    results = {}
+    for threads in (1, 2, 4, 8):
+        single = run_cache_contention(MemoryStore(), threads)
+        sharded = run_cache_contention(ShardedStore(shards=16), threads)
+        results[threads] = (single, sharded)
+        print(f"threads={threads:2d} single={single:12,.0f} ops/s sharded={sharded:12,.0f} ops/s")
+
+    assert all(single > 0 and sharded > 0 for single, sharded in results.values())
+
+BENCHMARK_BOOKS = int(os.environ.get('BENCHMARK_BOOKS', 1000000))
+
+def benchmark_vocabulary(size=5000, seed=42):
+    """Pronounceable synthetic words; used with Zipf weights for realistic term frequencies"""
+    rng = random.Random(seed)
+    syllables = ['ka', 'lo', 'mir', 'th', 'an', 'el', 'dor', 'sa', 'vin', 'qu', 'or', 'is', 'ber', 'ton', 'ra', 'ne']
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def load_benchmark_books(connection, rows, batch_size=5000):
+    """Fill a bench_books table shaped like books, then build its FULLTEXT index"""
+    rng = random.Random(7)
+    words = benchmark_vocabulary()
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS bench_books")
+    cursor.execute("""
+        CREATE TABLE bench_books (
+            book_id INT AUTO_INCREMENT PRIMARY KEY,
+            isbn VARCHAR(20) NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            author VARCHAR(100) NOT NULL,
+            description TEXT
+        ) ENGINE=InnoDB
+    """)
+    for start in range(0, rows, batch_size):
+        batch = [
+            (
+                f"978{start + i:010d}",
+                ' '.join(rng.choices(words, weights, k=rng.randint(2, 6))).title(),
+                ' '.join(rng.choices(words, k=2)).title(),
+                ' '.join(rng.choices(words, weights, k=30))
+            )
+            for i in range(min(batch_size, rows - start))
+        ]
+        cursor.executemany(
+            "INSERT INTO bench_books (isbn, title, author, description) VALUES (%s, %s, %s, %s)", batch
+        )
+        connection.commit()
+    cursor.execute("ALTER TABLE bench_books ADD FULLTEXT INDEX ft_books_text (title, author, description)")
+    cursor.close()
+    return words
+
+def median_query_time(cursor, query, params, repeat=5):
+    """Median wall time in milliseconds of a query including fetching its rows"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def test_fulltext_search_benchmark():
+    """Compare LIKE scans with MATCH ... AGAINST over BENCHMARK_BOOKS rows (needs MySQL)"""
+    MySQLdb = pytest.importorskip('MySQLdb')
+    if not os.environ.get('BENCHMARK_MYSQL_DB'):
+        pytest.skip('Set BENCHMARK_MYSQL_DB (and BENCHMARK_MYSQL_HOST/USER/PASSWORD) to run')
+
+    connection = MySQLdb.connect(
+        host=os.environ.get('BENCHMARK_MYSQL_HOST', 'localhost'),
+        user=os.environ.get('BENCHMARK_MYSQL_USER', 'root'),
+        passwd=os.environ.get('BENCHMARK_MYSQL_PASSWORD', ''),
+        db=os.environ['BENCHMARK_MYSQL_DB']
+    )
+    words = load_benchmark_books(connection, BENCHMARK_BOOKS)
+    cursor = connection.cursor()
+
+    like_page = """
+        SELECT book_id, title FROM bench_books
+        WHERE title LIKE %s OR author LIKE %s OR isbn LIKE %s
+        ORDER BY title LIMIT 20
+    """
+    like_count = "SELECT COUNT(*) FROM bench_books WHERE title LIKE %s OR author LIKE %s OR isbn LIKE %s"
+    fulltext_page = """
+        SELECT book_id, title FROM bench_books
+        WHERE MATCH(title, author, description) AGAINST (%s IN BOOLEAN MODE)
+        ORDER BY MATCH(title, author, description) AGAINST (%s IN BOOLEAN MODE) DESC, book_id LIMIT 20
+    """
+    fulltext_count = "SELECT COUNT(*) FROM bench_books WHERE MATCH(title, author, description) AGAINST (%s IN BOOLEAN MODE)"
+
+    terms = {'common': words[0], 'rare': words[-1], 'two words': f"{words[1]} {words[50]}"}
+    try:
+        for label, term in terms.items():
+            pattern = f"%{term}%"
+            expression = ' '.join(f'+{word}*' for word in term.split())
+            like_ms = (median_query_time(cursor, like_page, (pattern,) * 3)
+                       + median_query_time(cursor, like_count, (pattern,) * 3))
+            fulltext_ms = (median_query_time(cursor, fulltext_page, (expression, expression))
+                           + median_query_time(cursor, fulltext_count, (expression,)))
+            print(f"{label:10s} rows={BENCHMARK_BOOKS:,} like={like_ms:9.1f} ms fulltext={fulltext_ms:9.1f} ms")
+            assert like_ms > 0 and fulltext_ms > 0
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS bench_books")
+        cursor.close()
+        connection.close()
+
+BENCHMARK_TYPEAHEAD_TITLES = int(os.environ.get('BENCHMARK_TYPEAHEAD_TITLES', 1000000))
+
+def test_typeahead_latency_benchmark():
+    """p99 suggestion latency over BENCHMARK_TYPEAHEAD_TITLES synthetic titles (target < 5 ms)"""
+    rng = random.Random(3)
+    words = benchmark_vocabulary(20000)
+    count = len(words)
+    entries = [
+        (' '.join(words[(i * step) % count] for step in (1, 7, 31)[:1 + i % 3]), KIND_TITLE, i, rng.randrange(500))
+        for i in range(BENCHMARK_TYPEAHEAD_TITLES)
+    ]
+
+    start = time.perf_counter()
+    index = TypeaheadIndex(entries)
+    build_time = time.perf_counter() - start
+
+    timings = []
+    for _ in range(2000):
+        word = rng.choice(words)
+        prefix = word[:rng.randint(1, len(word))]
+        start = time.perf_counter()
+        index.suggest(prefix)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+    print(f"titles={BENCHMARK_TYPEAHEAD_TITLES:,} build={build_time:.1f}s p50={p50:.3f} ms p99={p99:.3f} ms")
+
+    assert p99 < 5
+
+BENCHMARK_BITMAP_BOOKS = int(os.environ.get('BENCHMARK_BITMAP_BOOKS', 1000000))
+
+def test_bitmap_filter_benchmark():
+    """p99 latency of AND/OR/NOT tag filters over BENCHMARK_BITMAP_BOOKS books (target < 20 ms)"""
+    rng = random.Random(5)
+    memberships = {}
+    for book_id in range(1, BENCHMARK_BITMAP_BOOKS + 1):
+        # Skewed tag popularity: a few tags on most books, a long tail of rare ones
+        tags = {int(rng.paretovariate(1.2)) % 500 for _ in range(rng.randint(0, 5))}
+        memberships[book_id] = book_keys(rng.randrange(50), rng.randrange(4), tags)
+
+    index = BitmapIndex()
+    start = time.perf_counter()
+    index.build(memberships)
+    build_time = time.perf_counter() - start
+
+    timings = []
+    for _ in range(500):
+        filters = {
+            'tags': rng.sample(range(20), 3),
+            'all_tags': [rng.randrange(5)],
+            'exclude_tags': [rng.randrange(5, 40)],
+            'available_only': True
+        }
+        start = time.perf_counter()
+        len(index.select(filters))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+    print(f"books={BENCHMARK_BITMAP_BOOKS:,} build={build_time:.1f}s p50={p50:.3f} ms p99={p99:.3f} ms")
+
+    assert p99 < 20
+
+if __name__ == '__main__':
+    test_cache_contention_benchmark()
+    test_fulltext_search_benchmark()
+    test_typeahead_latency_benchmark()
+    test_bitmap_filter_benchmark()
@@ -0,0 +1,75 @@
+# test_bitmap_index.py
+# Tests for utils.bitmap_index
+
+from utils.bitmap_index import Bitmap, BitmapIndex, book_keys, load_memberships
+from models import db
+
+class TestBitmapIndex:
+    def setup_method(self):
+        self.index = BitmapIndex()
+        self.index.build({
+            1: book_keys(10, 2, [1, 2]),
+            2: book_keys(10, 0, [2]),
+            3: book_keys(20, 1, [1, 3]),
+            70000: book_keys(20, 5, [2, 3])
+        })
+
+    def test_bitmap_matches_set_operations(self):
+        """Test that array and bitset containers combine like Python sets"""
+        dense = set(range(0, 20000, 2)) | {70000, 200000}
+        sparse = {3, 4, 5000, 70000, 70001}
+        a, b = Bitmap(dense), Bitmap(sparse)
+        assert (a & b).to_list() == sorted(dense & sparse)
+        assert (a | b).to_list() == sorted(dense | sparse)
+        assert (a - b).to_list() == sorted(dense - sparse)
+        assert (b - a).to_list() == sorted(sparse - dense)
+        assert len(a) == len(dense) and 200000 in a and 3 not in a
+
+        a.discard(200000)
+        b.add(6)
+        assert 200000 not in a and 6 in b
+
+    def test_and_or_not_filters(self):
+        """Test that any/all/none tag filters combine with category and stock"""
+        assert self.index.select({'tags': [1, 3]}).to_list() == [1, 3, 70000]
+        assert self.index.select({'all_tags': [2, 3]}).to_list() == [70000]
+        assert self.index.select({'tags': [2], 'exclude_tags': [1]}).to_list() == [2, 70000]
+        assert self.index.select({'tags': [2], 'available_only': True, 'category_id': 10}).to_list() == [1]
+        assert self.index.select({'exclude_tags': [2]}).to_list() == [3]
+        assert self.index.select({'category_id': 10}) is None
+
+    def test_set_book_moves_between_bitmaps(self):
+        """Test that tag and stock changes update every affected bitmap"""
+        self.index.set_book(2, book_keys(10, 1, [3]))
+        assert self.index.select({'tags': [2]}).to_list() == [1, 70000]
+        assert self.index.select({'tags': [3], 'available_only': True}).to_list() == [2, 3, 70000]
+
+        self.index.remove(70000)
+        assert self.index.select({'tags': [3]}).to_list() == [2, 3]
+        assert self.index.value_counts('tag', Bitmap([1, 2, 3])) == {1: 2, 2: 1, 3: 2}
+
+    def test_selections_are_not_live(self):
+        """Test that a selected bitmap doesn't change with later writes"""
+        selected = self.index.select({'all_tags': [3]})
+        self.index.set_book(2, book_keys(10, 1, [3]))
+        assert selected.to_list() == [3, 70000]
+        assert self.index.select({'all_tags': [3]}).to_list() == [2, 3, 70000]
+
+    def test_commit_hook_marks_books_dirty(self):
+        """Test that book and book_tags writes queue the book for refresh"""
+        self.index.on_commit([('book_tags', {'book_id': 2, 'tag_id': 7}), ('books', {'book_id': 3}), ('tags', {'tag_id': 7})])
+        assert self.index._dirty == {2, 3}
+
+class TestBitmapIndexLoading:
+    def test_build_from_database(self, catalog):
+        """Test that the index loads categories, stock and tags of stored books"""
+        index = BitmapIndex()
+        index.build(load_memberships())
+        assert index.select({'tags': [1]}).to_list() == [1, 2]
+        assert index.select({'tags': [1, 2], 'available_only': True}).to_list() == [1, 3]
+
+        catalog[1].copies_available = 1
+        db.session.commit()
+        index._dirty.add(catalog[1].book_id)
+        index.refresh()
+        assert index.select({'all_tags': [1, 2], 'available_only': True}).to_list() == [2]
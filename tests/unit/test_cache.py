@@ -0,0 +1,209 @@
+# test_cache.py
+# Tests for utils.cache
+
+import threading
+import time
+from utils.cache import MemoryStore, ShardedStore, cache, cached, flights, make_key, stats, ExpirySweeper
+
+class TestMemoryStore:
+    def test_lru_evicts_least_recently_used(self):
+        """Test that the LRU policy evicts the oldest untouched key"""
+        store = MemoryStore(max_entries=2, policy='lru')
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        store.set('c', 3)
+        assert store.get('b') is None
+        assert store.get('a') == 1
+        assert store.get('c') == 3
+
+    def test_lfu_evicts_least_frequently_used(self):
+        """Test that the LFU policy evicts the least accessed key"""
+        store = MemoryStore(max_entries=2, policy='lfu')
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        store.get('a')
+        store.get('b')
+        store.set('c', 3)
+        assert store.get('b') is None
+        assert store.get('a') == 1
+
+    def test_byte_budget_is_enforced(self):
+        """Test that the store stays within its approximate byte budget"""
+        store = MemoryStore(max_entries=1000, max_bytes=4096)
+        for i in range(100):
+            store.set(f'key:{i}', 'x' * 100)
+        assert store.size_bytes <= 4096
+        assert store.get('key:99') == 'x' * 100
+
+    def test_expired_keys_are_not_returned(self):
+        """Test that a key past its TTL is treated as missing"""
+        store = MemoryStore()
+        store.set('a', 1, ttl=-1)
+        assert store.get('a', 'missing') == 'missing'
+        assert len(store) == 0
+
+    def test_cleanup_only_removes_expired_keys_in_batches(self):
+        """Test that bounded cleanups remove expired keys and skip superseded ones"""
+        store = MemoryStore()
+        for i in range(10):
+            store.set(f'rate_limit:{i}', i, ttl=-1)
+        store.set('rate_limit:0', 0, ttl=60)
+        store.set('permanent', 1)
+
+        assert store.cleanup(max_items=4) == 4
+        assert store.cleanup() == 5
+        assert len(store) == 2
+        assert store.get('rate_limit:0') == 0
+
+class TestShardedStore:
+    def test_keys_route_to_independent_segments(self):
+        """Test that keys are spread over segments and budgets are split"""
+        store = ShardedStore(shards=4, max_entries=400)
+        for i in range(100):
+            store.set(f'rate_limit:{i}', i)
+        assert len(store) == 100
+        assert store.get('rate_limit:42') == 42
+        assert all(segment.max_entries == 100 for segment in store._segments)
+        store.delete('rate_limit:42')
+        assert store.get('rate_limit:42') is None
+
+class TestCachedDecorator:
+    def setup_method(self):
+        cache.clear()
+
+    def test_single_flight_runs_function_once(self):
+        """Test that concurrent misses share one computation"""
+        calls = []
+
+        @cached(ttl=60)
+        def slow_stats():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'total_books': 42}
+
+        threads = [threading.Thread(target=slow_stats) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert slow_stats() == {'total_books': 42}
+
+    def test_stale_value_served_while_refreshing(self):
+        """Test that an expired entry is returned while a refresh runs"""
+        values = iter([1, 2])
+
+        @cached(ttl=0.01, stale_ttl=60)
+        def counter():
+            return next(values)
+
+        assert counter() == 1
+        time.sleep(0.02)
+        assert counter() == 1
+        for _ in range(100):
+            if not flights.in_flight(counter.cache_key()):
+                break
+            time.sleep(0.01)
+        assert counter() == 2
+
+    def test_none_results_are_cached(self):
+        """Test that a not-found result is not recomputed on every call"""
+        calls = []
+
+        @cached(ttl=60, negative_ttl=10)
+        def find_book(book_id):
+            calls.append(book_id)
+            return None
+
+        assert find_book(7) is None
+        assert find_book(7) is None
+        assert calls == [7]
+
+    def test_keys_are_type_aware(self):
+        """Test that arguments with the same str() get different keys"""
+        assert make_key('f', (1,)) != make_key('f', ('1',))
+        assert make_key('f', (True,)) != make_key('f', (1,))
+        assert make_key('f', (), {'a': 1, 'b': 2}) == make_key('f', (), {'b': 2, 'a': 1})
+        assert make_key('f', ('x' * 500,)).startswith('f:#')
+
+    def test_tag_invalidation_drops_dependent_entries(self):
+        """Test that invalidating a tag forces recomputation"""
+        calls = []
+
+        @cached(ttl=3600, tags=lambda book_id: ['books', f'books:{book_id}'])
+        def book_summary(book_id):
+            calls.append(book_id)
+            return {'book_id': book_id}
+
+        book_summary(1)
+        book_summary(2)
+        cache.invalidate_tags('books:1')
+        book_summary(1)
+        book_summary(2)
+        assert calls == [1, 2, 1]
+
+        cache.invalidate_tags('books')
+        book_summary(2)
+        assert calls == [1, 2, 1, 2]
+
+class TestCacheStats:
+    def setup_method(self):
+        cache.clear()
+        stats.reset()
+
+    def test_counters_are_grouped_by_prefix(self):
+        """Test that hits, misses and evictions are attributed to key prefixes"""
+        cache.set('rate_limit:10.0.0.1', 1)
+        cache.get('rate_limit:10.0.0.1')
+        cache.get('rate_limit:10.0.0.2')
+        cache.get('login_attempts:alice')
+
+        snapshot = stats.snapshot()
+        assert snapshot['prefixes']['rate_limit']['hits'] == 1
+        assert snapshot['prefixes']['rate_limit']['misses'] == 1
+        assert snapshot['prefixes']['rate_limit']['hit_ratio'] == 0.5
+        assert snapshot['prefixes']['login_attempts']['misses'] == 1
+        assert snapshot['totals']['misses'] == 2
+
+        store = MemoryStore(max_entries=1)
+        store.set('rate_limit:a', 1)
+        store.set('rate_limit:b', 2)
+        assert stats.snapshot()['prefixes']['rate_limit']['evictions'] == 1
+
+    def test_counters_of_other_threads_are_merged(self):
+        """Test that per-thread counters add up, also after their threads exit"""
+        def lookups():
+            for _ in range(100):
+                cache.get('rate_limit:10.0.0.1')
+
+        workers = [threading.Thread(target=lookups) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        cache.get('rate_limit:10.0.0.1')
+        assert stats.snapshot()['prefixes']['rate_limit']['misses'] == 401
+
+        stats.reset()
+        assert stats.snapshot()['prefixes'] == {}
+
+    def test_metrics_text_format(self):
+        """Test that metrics render as Prometheus counters"""
+        cache.get('rate_limit:10.0.0.1')
+        text = cache.render_metrics()
+        assert '# TYPE library_cache_misses_total counter' in text
+        assert 'library_cache_misses_total{prefix="rate_limit"} 1' in text
+
+class TestExpirySweeper:
+    def test_sweep_runs_in_bounded_batches(self):
+        """Test that one sweep removes expired keys in batch_size chunks"""
+        cache.clear()
+        for i in range(25):
+            cache.set(f'login_attempts:{i}', i, ttl=-1)
+
+        sweeper = ExpirySweeper(cache, batch_size=10, max_batches=2)
+        assert sweeper.sweep() == 20
+        assert sweeper.sweep() == 5
@@ -0,0 +1,69 @@
+# test_cache_backends.py
+# Tests for utils.cache_backends
+
+import time
+from utils.cache_backends import SQLiteBackend, SocketInvalidationBus, TieredBackend, create_backend
+
+class TestSQLiteBackend:
+    def test_values_and_counters_are_shared_between_instances(self, tmp_path):
+        """Test that two backends on one file (e.g. two workers) see the same data"""
+        path = str(tmp_path / 'cache.sqlite3')
+        worker_a = SQLiteBackend(path)
+        worker_b = SQLiteBackend(path)
+
+        worker_a.set('categories', ['Fiction', 'History'], ttl=60)
+        assert worker_b.get('categories') == ['Fiction', 'History']
+
+        worker_a.incr('login_attempts:alice', ttl=3600)
+        assert worker_b.incr('login_attempts:alice', ttl=3600) == 2
+
+        worker_b.set('expired', 1, ttl=-1)
+        assert worker_a.get('expired', 'missing') == 'missing'
+
+class TestTieredBackend:
+    def test_invalidation_reaches_other_workers(self, tmp_path):
+        """Test that a write in one worker drops the L1 copy held by another"""
+        path = str(tmp_path / 'cache.sqlite3')
+        bus_dir = str(tmp_path / 'bus')
+        worker_a = TieredBackend(SQLiteBackend(path), SocketInvalidationBus(bus_dir))
+        worker_b = TieredBackend(SQLiteBackend(path), SocketInvalidationBus(bus_dir))
+
+        worker_a.set('membership_types', ['Basic'])
+        assert worker_b.get('membership_types') == ['Basic']
+
+        worker_a.set('membership_types', ['Basic', 'Premium'])
+        for _ in range(100):
+            if worker_b.l1.get('membership_types') is None:
+                break
+            time.sleep(0.01)
+        assert worker_b.get('membership_types') == ['Basic', 'Premium']
+
+    def test_counters_stay_shared(self, tmp_path):
+        """Test that limiter and login counters are never served from a stale L1"""
+        path = str(tmp_path / 'cache.sqlite3')
+        bus_dir = str(tmp_path / 'bus')
+        worker_a = TieredBackend(SQLiteBackend(path), SocketInvalidationBus(bus_dir))
+        worker_b = TieredBackend(SQLiteBackend(path), SocketInvalidationBus(bus_dir))
+
+        worker_a.incr('login_attempts:alice', ttl=3600)
+        assert worker_b.get('login_attempts:alice') == 1
+        for _ in range(5):
+            worker_a.incr('login_attempts:alice', ttl=3600)
+        assert worker_b.get('login_attempts:alice') == 6
+        assert worker_b.l1.get('login_attempts:alice') is None
+
+    def test_l1_copy_expires_with_l2(self, tmp_path):
+        """Test that L1 never keeps a value past its L2 expiry"""
+        tiered = TieredBackend(SQLiteBackend(str(tmp_path / 'cache.sqlite3')), l1_ttl=30)
+        tiered.l2.set('report', 'stale', ttl=0.05)
+        assert tiered.get('report') == 'stale'
+        time.sleep(0.1)
+        assert tiered.get('report', 'missing') == 'missing'
+
+    def test_l1_requires_a_bus(self, tmp_path):
+        """Test that the shared backend isn't tiered without an invalidation bus"""
+        config = {'CACHE_BACKEND': 'sqlite', 'CACHE_SQLITE_PATH': str(tmp_path / 'cache.sqlite3'),
+                  'CACHE_L1_MAX_ENTRIES': 1000}
+        assert isinstance(create_backend(config), SQLiteBackend)
+        config.update(CACHE_INVALIDATION_BUS='socket', CACHE_BUS_DIR=str(tmp_path / 'bus'))
+        assert isinstance(create_backend(config), TieredBackend)
@@ -0,0 +1,45 @@
+# test_counting.py
+# Tests for utils.counting
+
+from utils.cache import cache
+from utils.counting import CountStrategy, estimate_from_plan
+
+class TestCountStrategy:
+    def setup_method(self):
+        cache.clear()
+        self.calls = []
+
+    def exact(self):
+        self.calls.append('exact')
+        return 42
+
+    def test_small_estimates_are_counted_exactly_and_cached(self):
+        """Test that small results get an exact count that is then served from cache"""
+        strategy = CountStrategy(exact_threshold=1000)
+        result = strategy.count(('SELECT COUNT(*) FROM books', ()), self.exact, lambda: 50, ['books'])
+        assert (result.total, result.exact) == (42, True)
+
+        result = strategy.count(('SELECT COUNT(*) FROM books', ()), self.exact, lambda: 50, ['books'])
+        assert result.total == 42
+        assert self.calls == ['exact']
+
+    def test_large_estimates_skip_the_exact_count(self):
+        """Test that a large estimate is returned and flagged as inexact"""
+        strategy = CountStrategy(exact_threshold=1000)
+        result = strategy.count(('q', ()), self.exact, lambda: 250000)
+        assert (result.total, result.exact) == (250000, False)
+        assert self.calls == []
+
+    def test_writes_invalidate_cached_counts(self):
+        """Test that invalidating the table tag forces a recount"""
+        strategy = CountStrategy()
+        strategy.count(('q', ()), self.exact, tags=['books'])
+        cache.invalidate_tags('books')
+        strategy.count(('q', ()), self.exact, tags=['books'])
+        assert self.calls == ['exact', 'exact']
+
+    def test_estimate_from_plan(self):
+        """Test the fan-out estimate over EXPLAIN rows"""
+        plan = [{'rows': 1000, 'filtered': 10.0}, {'rows': 3, 'filtered': 100.0}]
+        assert estimate_from_plan(plan) == 300
+        assert estimate_from_plan([{'rows': None}]) is None
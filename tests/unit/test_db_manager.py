@@ -0,0 +1,104 @@
+# test_db_manager.py
+# Tests for utils.db_manager
+
+import sys
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from utils.cache import cache
+from utils.db_manager import BulkWriteResult, _identifier, _insert_sql, _invalidate_raw_writes, execute_many, insert_many, upsert_many
+
+class FakeSession:
+    """Session whose connection records statements; commit runs the after_commit hook"""
+
+    def __init__(self):
+        self.info = {}
+        self.statements = []
+        self.commits = 0
+
+    def connection(self, bind_arguments=None):
+        return self
+
+    def exec_driver_sql(self, query, params=()):
+        self.statements.append((query, params))
+        # A list of parameter sets is an executemany call
+        rows = len(params) if isinstance(params, list) else 1
+        return SimpleNamespace(rowcount=rows)
+
+    def commit(self):
+        self.commits += 1
+        _invalidate_raw_writes(self)
+
+    def rollback(self):
+        self.info.clear()
+
+class TestBulkWrites:
+    @pytest.fixture(autouse=True)
+    def session(self, monkeypatch):
+        app = Flask(__name__)
+        app.config['DB_BULK_BATCH_SIZE'] = 2
+        self.session = FakeSession()
+        monkeypatch.setitem(sys.modules, 'models', SimpleNamespace(db=SimpleNamespace(session=self.session)))
+        with app.app_context():
+            yield
+
+    def test_identifiers_are_validated(self):
+        """Test that table and column names are quoted and anything else rejected"""
+        assert _identifier('book_tags') == '`book_tags`'
+        for name in ('books; DROP TABLE users', 'title`', 'a b', ''):
+            with pytest.raises(ValueError):
+                _identifier(name)
+        with pytest.raises(ValueError):
+            insert_many('books', ['title', 'isbn) VALUES (1'], [('a', 'b')])
+        assert self.session.statements == []
+
+    def test_insert_sql(self):
+        """Test the multi-row INSERT statement"""
+        assert _insert_sql('book_tags', ['book_id', 'tag_id'], 2) == (
+            "INSERT INTO `book_tags` (`book_id`, `tag_id`) VALUES (%s, %s), (%s, %s)"
+        )
+        assert _insert_sql('tags', ['name'], 1, ignore=True) == "INSERT IGNORE INTO `tags` (`name`) VALUES (%s)"
+
+    def test_rows_are_sent_in_batches(self):
+        """Test that rows are chunked by batch size in one transaction"""
+        result = insert_many('book_tags', ['book_id', 'tag_id'], [(1, 2), (1, 3), (2, 3)])
+        assert self.session.statements == [
+            ("INSERT INTO `book_tags` (`book_id`, `tag_id`) VALUES (%s, %s), (%s, %s)", (1, 2, 1, 3)),
+            ("INSERT INTO `book_tags` (`book_id`, `tag_id`) VALUES (%s, %s)", (2, 3))
+        ]
+        assert (result.rows, result.rowcount, result.statements) == (3, 2, 2)
+        assert self.session.commits == 1
+
+        result = execute_many("UPDATE books SET copies_available = %s WHERE book_id = %s", [(1, 7)] * 5, batch_size=4)
+        assert [len(params) for _, params in self.session.statements[2:]] == [4, 1]
+        assert (result.rows, result.rowcount, result.statements) == (5, 5, 2)
+
+    def test_upsert_updates_on_duplicate_key(self):
+        """Test the ON DUPLICATE KEY UPDATE clause, for all or some columns"""
+        upsert_many('tags', ['tag_id', 'name'], [(1, 'fantasy')])
+        assert self.session.statements[-1][0] == (
+            "INSERT INTO `tags` (`tag_id`, `name`) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE `tag_id` = VALUES(`tag_id`), `name` = VALUES(`name`)"
+        )
+        upsert_many('tags', ['tag_id', 'name'], [(1, 'fantasy')], update_columns=['name'])
+        assert self.session.statements[-1][0].endswith("ON DUPLICATE KEY UPDATE `name` = VALUES(`name`)")
+
+    def test_empty_input(self):
+        """Test that no rows send no statements"""
+        result = insert_many('book_tags', ['book_id', 'tag_id'], [])
+        assert self.session.statements == []
+        assert (result.rows, result.rowcount, result.statements) == (0, 0, 0)
+
+    def test_result_counts(self):
+        """Test the throughput summary"""
+        result = BulkWriteResult(rows=10, rowcount=12, statements=2, seconds=0.5)
+        assert result.to_dict() == {'rows': 10, 'rowcount': 12, 'statements': 2, 'seconds': 0.5, 'rows_per_second': 20.0}
+        assert BulkWriteResult().rows_per_second is None
+
+    def test_writes_invalidate_cached_tables(self):
+        """Test that a committed bulk write drops the written table's cache entries"""
+        cache.set('tagged:books', 1, tags=['book_tags'])
+        cache.set('tagged:loans', 1, tags=['borrowings'])
+        insert_many('book_tags', ['book_id', 'tag_id'], [(1, 2)])
+        assert cache.get('tagged:books') is None
+        assert cache.get('tagged:loans') == 1
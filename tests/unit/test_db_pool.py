@@ -0,0 +1,32 @@
+# test_db_pool.py
+# Tests for utils.db_pool
+
+import pytest
+from utils.db_pool import PoolStats
+
+class TestPoolStats:
+    def test_wait_counters(self):
+        """Test that waits are counted and averaged separately from checkouts"""
+        pool_stats = PoolStats()
+        for _ in range(3):
+            pool_stats.record('checkouts')
+        pool_stats.record_wait(0.02)
+        pool_stats.record_wait(0.2)
+        snapshot = pool_stats.snapshot()
+        assert snapshot['checkouts'] == 3 and snapshot['waits'] == 2
+        assert snapshot['max_wait_seconds'] == 0.2
+        assert snapshot['avg_wait_seconds'] == pytest.approx(0.11)
+
+    def test_render_metrics(self):
+        """Test that checkouts without a wait land in the lowest histogram bucket"""
+        pool_stats = PoolStats()
+        pool_stats.record('checkouts', 4)
+        pool_stats.record_wait(0.03)
+        metrics = pool_stats.render_metrics({'idle': 2})
+        assert '# TYPE library_db_pool_checkout_wait_seconds histogram' in metrics
+        assert 'library_db_pool_checkout_wait_seconds_bucket{le="0.001"} 3' in metrics
+        assert 'library_db_pool_checkout_wait_seconds_bucket{le="0.05"} 4' in metrics
+        assert 'library_db_pool_checkout_wait_seconds_count 4' in metrics
+        assert 'library_db_pool_idle 2' in metrics
+        pool_stats.reset()
+        assert pool_stats.snapshot()['avg_wait_seconds'] is None
@@ -0,0 +1,66 @@
+# test_db_router.py
+# Tests for utils.db_router
+
+import time
+from flask import Flask
+from utils.db_router import Replica, ReplicaRouter, read_only_block
+
+class TestReplicaRouter:
+    def setup_method(self):
+        self.app = Flask(__name__)
+        self.app.secret_key = 'test'
+        self.lags = {'r1': 0, 'r2': 0}
+        self.router = ReplicaRouter(max_lag=5, check_interval=0, pin_seconds=10)
+        for name in self.lags:
+            self.router.add_replica(Replica(name, engine=name, lag_probe=self.lags.get))
+
+    def test_reads_route_only_inside_read_only_blocks(self):
+        """Test that replicas serve read_only work, round robin"""
+        with self.app.test_request_context():
+            assert self.router.read_engine() is None
+            with read_only_block():
+                assert [self.router.read_engine() for _ in range(3)] == ['r1', 'r2', 'r1']
+
+    def test_lagging_replicas_fall_back_to_primary(self):
+        """Test that replicas over the lag limit or without replication are skipped"""
+        self.lags.update(r1=30, r2=None)
+        with self.app.test_request_context(), read_only_block():
+            assert self.router.read_engine() is None
+            self.lags['r2'] = 1
+            assert self.router.read_engine() == 'r2'
+        stats = self.router.get_stats()
+        assert stats['primary_fallbacks'] == 1 and stats['replica_reads'] == 1
+        assert stats['replicas'][0] == {'name': 'r1', 'lag': 30, 'error': None}
+
+    def test_lag_checks_run_outside_the_lock(self):
+        """Test that a replica's lag probe doesn't hold the router lock"""
+        held = []
+
+        def probe(engine):
+            held.append(self.router._lock.locked())
+            return 0
+
+        for replica in self.router.replicas:
+            replica.lag_probe = probe
+        assert self.router.choose().name == 'r1'
+        assert held == [False]
+
+    def test_writes_pin_request_and_session(self):
+        """Test read-your-writes: a write keeps the request and the session on the primary"""
+        with self.app.test_client() as client:
+            @self.app.route('/write')
+            def write():
+                self.router.pin()
+                with read_only_block():
+                    return str(self.router.read_engine())
+
+            @self.app.route('/read')
+            def read():
+                with read_only_block():
+                    return str(self.router.read_engine())
+
+            assert client.get('/write').get_data(as_text=True) == 'None'
+            assert client.get('/read').get_data(as_text=True) == 'None'
+            with client.session_transaction() as session:
+                session['db_pinned_until'] = time.time() - 1
+            assert client.get('/read').get_data(as_text=True) == 'r1'
@@ -0,0 +1,26 @@
+# test_export.py
+# Tests for utils.export
+
+from utils.export import iter_csv
+
+class TestCsvStreaming:
+    def test_dict_rows_take_headers_from_first_row(self):
+        """Test that dictionary rows write a header row and their values"""
+        rows = [{'id': 1, 'title': 'Dune'}, {'id': 2, 'title': 'Emma, Vol. 1'}]
+        assert ''.join(iter_csv(rows)) == 'id,title\r\n1,Dune\r\n2,"Emma, Vol. 1"\r\n'
+
+    def test_chunks_are_bounded_and_lazy(self):
+        """Test that output is produced in chunks while rows are consumed"""
+        consumed = []
+
+        def rows():
+            for i in range(1000):
+                consumed.append(i)
+                yield (i, 'x' * 10)
+
+        chunks = iter_csv(rows(), headers=['id', 'value'], chunk_size=100)
+        first = next(chunks)
+        assert 100 <= len(first) < 200
+        assert len(consumed) < 20
+        rest = ''.join(chunks)
+        assert (first + rest).count('\r\n') == 1001
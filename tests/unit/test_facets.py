@@ -0,0 +1,25 @@
+# test_facets.py
+# Tests for utils.facets
+
+from utils.facets import fold_groups, normalize_filters
+
+class TestFacets:
+    def test_normalize_filters(self):
+        """Test that equivalent filter sets normalize to the same signature"""
+        a = normalize_filters({'title': '  Harry  Potter ', 'category_id': '3', 'tags': ['5', '2', '5'], 'available_only': 'true', 'isbn': ''})
+        b = normalize_filters({'title': 'harry potter', 'category_id': 3, 'tags': [2, 5], 'available_only': True})
+        assert a == b == {'title': 'harry potter', 'category_id': 3, 'available_only': True, 'tags': [2, 5]}
+        assert normalize_filters({'all_tags': ['4', '1'], 'exclude_tags': [9]}) == {'all_tags': [1, 4], 'exclude_tags': [9]}
+
+    def test_fold_groups(self):
+        """Test that one pass over grouped rows yields counts for every facet"""
+        facets = fold_groups([
+            (1, 10, 1999, 1, 4),
+            (1, 11, 2005, 0, 2),
+            (2, 10, 1999, 1, 3),
+            (None, None, None, 1, 1)
+        ])
+        assert facets['category_id'] == {1: 6, 2: 3}
+        assert facets['publisher_id'] == {10: 7, 11: 2}
+        assert facets['publication_year'] == {1999: 7, 2005: 2}
+        assert facets['availability'] == {'available': 8, 'unavailable': 2}
@@ -1,5 +1,32 @@
 # test_models.py
 # Placeholder for all model tests in one file per domain
 
+import pytest
+from models.enhanced_book import EnhancedBook
+from utils.cache import cache
+
 def test_placeholder_models():
     assert True
+
+class TestEnhancedBookSearch:
+    @pytest.fixture(autouse=True)
+    def setup(self, catalog):
+        cache.clear()
+
+    def test_search_advanced(self):
+        """Test that filters combine across book columns, authors and tags"""
+        assert [book['title'] for book in EnhancedBook.search_advanced({'author': 'tolkien'})] == [
+            'The Hobbit', 'The Silmarillion'
+        ]
+        results = EnhancedBook.search_advanced({'tags': [1], 'available_only': True})
+        assert [(book['title'], book['authors']) for book in results] == [('Dune', 'Frank Herbert')]
+
+    def test_facet_counts(self):
+        """Test counts per facet value of every matching book"""
+        facets = EnhancedBook.facet_counts({'year_from': 1950})
+        assert facets['publication_year'] == {1965: 1, 1977: 1}
+        assert facets['availability'] == {'available': 2}
+        assert facets['tags'] == {1: 1, 2: 1}
+
+        facets = EnhancedBook.facet_counts({'tags': ['2']})
+        assert facets['availability'] == {'available': 1, 'unavailable': 1}
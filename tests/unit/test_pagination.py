@@ -0,0 +1,93 @@
+# test_pagination.py
+# Tests for utils.pagination
+
+from datetime import datetime
+import pytest
+from flask import Flask
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+from utils.cache import cache
+from utils.pagination import Pagination, InvalidCursor, encode_cursor, decode_cursor, keyset_condition, paginate_query
+
+class TestKeysetPagination:
+    def test_cursor_round_trip(self):
+        """Test that cursors keep datetimes and are bound to their sort order"""
+        created_at = datetime(2024, 5, 1, 12, 30)
+        token = encode_cursor('created_at:desc', [created_at, 42])
+        assert decode_cursor(token, 'created_at:desc') == [created_at, 42]
+        with pytest.raises(InvalidCursor):
+            decode_cursor(token, 'created_at:asc')
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not-a-cursor', 'created_at:desc')
+
+    def test_keyset_condition(self):
+        """Test the SQL emitted for ascending, descending and NULL positions"""
+        sql, params = keyset_condition('b.title', 'b.book_id', ['Dune', 7])
+        assert sql == "(b.title >= %s AND (b.title > %s OR b.book_id > %s))"
+        assert params == ['Dune', 'Dune', 7]
+
+        sql, params = keyset_condition('b.publication_year', 'b.book_id', [1965, 7], descending=True, nullable=True)
+        assert sql.endswith("OR b.publication_year IS NULL)")
+
+        sql, params = keyset_condition('b.publication_year', 'b.book_id', [None, 7])
+        assert sql == "((b.publication_year IS NULL AND b.book_id > %s) OR b.publication_year IS NOT NULL)"
+        assert params == [7]
+
+    def test_pagination_modes(self):
+        """Test page metadata in offset and cursor mode"""
+        offset_page = Pagination(2, 10, 35, next_cursor='abc')
+        assert offset_page.mode == 'offset'
+        assert offset_page.has_prev and offset_page.has_next
+
+        cursor_page = Pagination(None, 10, None, cursor='abc')
+        assert cursor_page.mode == 'cursor'
+        assert cursor_page.has_prev and not cursor_page.has_next
+        assert cursor_page.get_pagination_data()['pages'] is None
+
+        # Relevance order has no cursor; the extra row decides with an estimated total
+        estimated = Pagination(1, 10, 5000, total_exact=False, has_more=True)
+        assert estimated.has_next and estimated.next_cursor is None
+        assert not Pagination(3, 10, 5000, total_exact=False, has_more=False).has_next
+
+class TestPaginateQuery:
+    @pytest.fixture(autouse=True)
+    def items(self):
+        Base = declarative_base()
+
+        class Item(Base):
+            __tablename__ = 'items'
+            item_id = Column(Integer, primary_key=True)
+            name = Column(String(20))
+
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.Item = Item
+        self.session = Session(engine)
+        self.session.add_all(Item(item_id=n, name=name) for n, name in enumerate('edcba', 1))
+        self.session.commit()
+        self.app = Flask(__name__)
+        cache.clear()
+        yield
+        self.session.close()
+
+    def page(self, query_string):
+        with self.app.test_request_context(f'/?per_page=2&{query_string}'):
+            items, pagination = paginate_query(self.session.query(self.Item), self.Item.name, self.Item.item_id)
+        return [item.name for item in items], pagination
+
+    def test_offset_pages(self):
+        """Test numbered pages ordered by the sort column"""
+        names, pagination = self.page('page=2')
+        assert names == ['c', 'd']
+        assert (pagination.page, pagination.total_count, pagination.has_next) == (2, 5, True)
+        names, pagination = self.page('page=3')
+        assert names == ['e'] and pagination.next_cursor is None
+
+    def test_cursor_pages(self):
+        """Test that next_cursor continues after the last row, from any mode"""
+        names, pagination = self.page('page=1')
+        assert names == ['a', 'b']
+        names, pagination = self.page(f'cursor={pagination.next_cursor}')
+        assert names == ['c', 'd'] and pagination.mode == 'cursor'
+        names, pagination = self.page(f'cursor={pagination.next_cursor}')
+        assert names == ['e'] and not pagination.has_next
@@ -0,0 +1,48 @@
+# test_query_builder.py
+# Tests for utils.query_builder
+
+from utils.query_builder import QueryBuilder, Condition
+
+class TestQueryBuilder:
+    def setup_method(self):
+        self.builder = QueryBuilder('b.book_id, b.title', 'books b', {
+            'book_ids': Condition('b.book_id IN ({})', expand=True),
+            'pattern': Condition('(b.title LIKE %s OR b.isbn LIKE %s)', repeat=2),
+            'year_from': Condition('b.publication_year >= %s'),
+            'available': Condition('b.copies_available > 0', repeat=0)
+        })
+
+    def test_page_and_count_share_where_clause(self):
+        """Test that one binding emits matching page and count statements"""
+        query = self.builder.bind({'pattern': '%hobbit%', 'year_from': 1937, 'available': True, 'book_ids': None})
+        where = "WHERE (b.title LIKE %s OR b.isbn LIKE %s) AND b.publication_year >= %s AND b.copies_available > 0"
+        assert query.count() == (f"SELECT COUNT(*) AS count FROM books b {where}", ['%hobbit%', '%hobbit%', 1937])
+        assert query.page('b.title ASC', 21, 40, after=('b.title > %s', ['m'])) == (
+            f"SELECT b.book_id, b.title FROM books b {where} AND b.title > %s ORDER BY b.title ASC LIMIT %s OFFSET %s",
+            ['%hobbit%', '%hobbit%', 1937, 'm', 21, 40]
+        )
+        assert self.builder.bind({}).select() == ("SELECT b.book_id, b.title FROM books b", [])
+
+    def test_statements_are_compiled_once_per_shape(self):
+        """Test that same-shaped requests reuse the compiled statement"""
+        first, _ = self.builder.bind({'year_from': 1990}).page('b.title ASC', 21)
+        second, params = self.builder.bind({'year_from': 2005}).page('b.title ASC', 21)
+        assert first is second and params == [2005, 21, 0]
+        assert len(self.builder) == 1
+
+    def test_lists_are_padded_to_size_buckets(self):
+        """Test that IN lists of similar length share one statement"""
+        sql, params = self.builder.bind({'book_ids': [1, 2, 3]}).select()
+        assert sql.count('%s') == 8 and params == [1, 2, 3, 3, 3, 3, 3, 3]
+        assert self.builder.bind({'book_ids': list(range(5))}).select()[0] is sql
+        assert self.builder.bind({'book_ids': list(range(9))}).select()[0].count('%s') == 16
+
+    def test_statement_cache_is_bounded(self):
+        """Test that the least recently used statements are dropped"""
+        self.builder.max_statements = 2
+        first, _ = self.builder.bind({'year_from': 1990}).select()
+        self.builder.bind({'available': True}).select()
+        assert self.builder.bind({'year_from': 2005}).select()[0] is first
+        self.builder.bind({'pattern': '%a%'}).select()
+        assert len(self.builder) == 2
+        assert self.builder.bind({'year_from': 1990}).select()[0] is first
@@ -0,0 +1,33 @@
+# test_rate_limiter.py
+# Tests for utils.rate_limiter
+
+from utils.cache import cache
+from utils.rate_limiter import RateLimiter, parse_rate
+
+class TestRateLimiter:
+    def setup_method(self):
+        cache.clear()
+
+    def test_each_algorithm_enforces_the_limit(self):
+        """Test that every algorithm admits exactly `limit` requests in a burst"""
+        limiter = RateLimiter()
+        for algorithm in ('sliding_window', 'token_bucket', 'gcra'):
+            results = [limiter.hit('10.0.0.1', 5, 60, algorithm) for _ in range(7)]
+            assert [r.allowed for r in results] == [True] * 5 + [False] * 2, algorithm
+            assert results[0].remaining == 4
+            assert results[-1].remaining == 0
+            assert results[-1].retry_after > 0
+
+    def test_state_per_key_is_constant_size(self):
+        """Test that a high limit doesn't grow the stored state"""
+        limiter = RateLimiter()
+        for _ in range(1000):
+            limiter.hit('10.0.0.2', 1000, 60, 'gcra')
+        state = cache.get('rate_limit:gcra:10.0.0.2')
+        assert isinstance(state, float)
+
+    def test_parse_rate(self):
+        """Test parsing of rate strings"""
+        assert parse_rate('100 per hour') == (100, 3600)
+        assert parse_rate('5/minute') == (5, 60)
+        assert parse_rate('10 per 30 seconds') == (10, 30)
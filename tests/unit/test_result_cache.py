@@ -0,0 +1,104 @@
+# test_result_cache.py
+# Tests for utils.result_cache
+
+from utils.result_cache import SearchPredicate, SearchResultCache
+from utils.search import Search
+
+class TestSearchResultCache:
+    def setup_method(self):
+        self.cache = SearchResultCache(max_ids=5)
+        self.calls = 0
+
+    def compute(self, ids):
+        def result_ids(limit):
+            self.calls += 1
+            return ids[:limit]
+        return result_ids
+
+    def test_predicate_rules_out_rows(self):
+        """Test that only rows that could match the search satisfy its predicate"""
+        predicate = SearchPredicate().text('Harry Pot', ('title', 'isbn')).where('publication_year', '>=', 1990)
+        assert predicate.matches('books', {'title': 'Harry Potter', 'isbn': '1', 'publication_year': 1999})
+        assert not predicate.matches('books', {'title': 'The Hobbit', 'isbn': '1', 'publication_year': 1999})
+        assert not predicate.matches('books', {'title': 'Harry Potter', 'isbn': '1', 'publication_year': 1980})
+        # Unknown columns can't rule a row out
+        assert predicate.matches('books', {'publication_year': 2001})
+        assert not predicate.matches('book_tags', {'book_id': 1, 'tag_id': 2})
+
+        tagged = SearchPredicate().tagged([2, 3])
+        assert tagged.matches('book_tags', {'book_id': 9, 'tag_id': 3})
+        assert not tagged.matches('book_tags', {'book_id': 9, 'tag_id': 4})
+
+        # Searches through the index match author and tag names
+        indexed = SearchPredicate().text('tolkien', ('title',)).related('book_authors', 'authors').tagged()
+        assert indexed.matches('book_authors', {'book_id': 9, 'author_id': 1})
+        assert indexed.matches('book_tags', {'book_id': 9, 'tag_id': 4})
+        assert indexed.matches('tags', {'tag_id': 4, 'name': 'tolkien'})
+        assert not predicate.matches('tags', {'tag_id': 4, 'name': 'harry'})
+
+    def test_cached_ids_are_reused(self):
+        """Test that the same search is computed once"""
+        ids = self.cache.get_or_compute('books', ('harry',), SearchPredicate(), self.compute([3, 1, 2]))
+        again = self.cache.get_or_compute('books', ('harry',), SearchPredicate(), self.compute([9]))
+        assert ids == again == [3, 1, 2]
+        assert self.calls == 1
+
+    def test_only_affected_entries_are_invalidated(self):
+        """Test that a write drops the entries it can change and keeps the rest"""
+        harry = SearchPredicate().text('harry', ('title',))
+        hobbit = SearchPredicate().text('hobbit', ('title',))
+        self.cache.get_or_compute('books', ('harry',), harry, self.compute([1, 2]))
+        self.cache.get_or_compute('books', ('hobbit',), hobbit, self.compute([7]))
+
+        # A new matching book joins one result; an update to a listed book
+        # may move it out of the other
+        self.cache.on_commit([('books', {'book_id': 50, 'title': 'Harry Potter'})])
+        self.cache.get_or_compute('books', ('hobbit',), hobbit, self.compute([]))
+        assert self.calls == 2
+        self.cache.on_commit([('books', {'book_id': 7, 'title': 'Renamed'})])
+        assert self.cache.get_or_compute('books', ('hobbit',), hobbit, self.compute([])) == []
+        assert self.cache.get_or_compute('books', ('harry',), harry, self.compute([1, 2, 50])) == [1, 2, 50]
+        assert self.calls == 4
+
+        self.cache.on_write(['books'])
+        assert len(self.cache) == 0
+
+    def test_unrelated_writes_keep_computations(self):
+        """Test that only writes a search depends on discard its in-flight result"""
+        harry = SearchPredicate().text('harry', ('title',))
+        hobbit = SearchPredicate().text('hobbit', ('title',))
+
+        def compute_during(changes):
+            def result_ids(limit):
+                self.cache.on_commit(changes)
+                return [1]
+            return result_ids
+
+        self.cache.get_or_compute('books', ('hobbit',), hobbit, compute_during([('loans', {'book_id': 1})]))
+        self.cache.get_or_compute('books', ('harry',), harry, compute_during([('books', {'book_id': 2, 'title': 'Harry'})]))
+        assert len(self.cache) == 1
+
+    def test_book_writes_checked_against_columns(self):
+        """Test that a book write outside a term search keeps its entry"""
+        predicate = Search._book_predicate('tolkien', {}, fuzzy=False)
+        self.cache.get_or_compute('books', ('tolkien',), predicate, self.compute([2, 3]))
+
+        self.cache.on_commit([('books', {'book_id': 50, 'title': 'Dune', 'author': 'Frank Herbert', 'isbn': '9780441172719'})])
+        assert len(self.cache) == 1
+        # A new author link can add any book to the result
+        self.cache.on_commit([('book_authors', {'book_id': 50, 'author_id': 2})])
+        assert len(self.cache) == 0
+
+    def test_evicted_entries_are_forgotten(self):
+        """Test that predicates and ID sets are bounded with the entries"""
+        cache = SearchResultCache(max_entries=2)
+        for term in ('a', 'b', 'c'):
+            cache.get_or_compute('books', (term,), SearchPredicate(), self.compute([1, 2]))
+        assert len(cache) == 2
+        assert [entry.result for _, entry in cache._store.items()] == [[1, 2], [1, 2]]
+
+    def test_large_results_are_not_cached(self):
+        """Test that results over max_ids fall back to SQL without recomputing"""
+        assert self.cache.get_or_compute('books', ('a',), SearchPredicate(), self.compute(list(range(10)))) is None
+        assert self.cache.get_or_compute('books', ('a',), SearchPredicate(), self.compute([1])) is None
+        assert self.calls == 1
@@ -0,0 +1,61 @@
+# test_search_index.py
+# Tests for utils.search_index
+
+from utils.search_index import SearchIndex, edit_distance
+
+class TestSearchIndex:
+    def setup_method(self):
+        self.index = SearchIndex()
+        self.index.build({
+            1: {'title': 'Harry Potter and the Chamber of Secrets', 'authors': ['J. K. Rowling'], 'isbn': '978-0-7475-3849-1'},
+            2: {'title': 'The Hobbit', 'authors': ['J. R. R. Tolkien'], 'tags': ['fantasy']},
+            3: {'title': 'Harry Potter and the Prisoner of Azkaban', 'authors': ['J. K. Rowling'], 'tags': ['fantasy']}
+        })
+
+    def test_every_token_must_prefix_match(self):
+        """Test that multi-word terms intersect prefix matches"""
+        assert self.index.search('harry pot') == [1, 3]
+        assert self.index.search('rowling azkaban') == [3]
+        assert self.index.search('fantasy') == [2, 3]
+        assert self.index.search('harry hobbit') == []
+
+    def test_isbn_matches_without_separators(self):
+        """Test that ISBNs match with or without hyphens"""
+        assert self.index.search('978-0-7475') == [1]
+        assert self.index.search('9780747538491') == [1]
+
+    def test_incremental_add_and_remove(self):
+        """Test that updates replace a book's tokens and removals drop them"""
+        self.index.add(2, title='The Hobbit, or There and Back Again', authors=['Tolkien'])
+        assert self.index.search('back again') == [2]
+        assert self.index.search('fantasy') == [3]
+
+        self.index.remove(3)
+        assert self.index.search('azkaban') == []
+        assert self.index.search('harry') == [1]
+
+    def test_fuzzy_search_tolerates_typos(self):
+        """Test that misspelled words find books, closest matches first"""
+        assert self.index.fuzzy_search('hary poter') == [1, 3]
+        assert self.index.fuzzy_search('rowlnig azkaban') == [3]
+        assert self.index.fuzzy_search('hobit') == [2]
+        assert self.index.search('hobit') == []
+
+    def test_broad_searches_are_left_to_sql(self):
+        """Test that terms matching more than max_ids books return no ID list"""
+        self.index.max_ids = 1
+        assert self.index.search('harry') is None
+        assert self.index.search('azkaban') == [3]
+        assert self.index.fuzzy_search('hary') == [1]
+
+    def test_fuzzy_index_follows_updates(self):
+        """Test that removed terms stop matching fuzzily"""
+        self.index.remove(2)
+        assert self.index.fuzzy_search('hobit') == []
+        assert edit_distance('rowlnig', 'rowling', 2) == 1
+        assert edit_distance('potter', 'hobbit', 2) == 3
+
+    def test_commit_hook_marks_books_dirty(self):
+        """Test that commits on book tables queue the book for refresh"""
+        self.index.on_commit([('book_tags', {'book_id': 2, 'tag_id': 7}), ('users', {'user_id': 5})])
+        assert self.index._dirty == {2}
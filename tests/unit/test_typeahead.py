@@ -0,0 +1,35 @@
+# test_typeahead.py
+# Tests for utils.typeahead
+
+from utils.typeahead import TypeaheadIndex, KIND_TITLE, KIND_AUTHOR, KIND_ISBN
+
+class TestTypeahead:
+    def setup_method(self):
+        self.index = TypeaheadIndex([
+            ('Harry Potter and the Goblet of Fire', KIND_TITLE, 1, 40),
+            ('Harry Potter and the Half-Blood Prince', KIND_TITLE, 2, 90),
+            ('Harrison Bergeron', KIND_TITLE, 3, 5),
+            ('Harry Harrison', KIND_AUTHOR, 7, 12),
+            ('978-0-7475-3269-9', KIND_ISBN, 1, 40)
+        ])
+
+    def test_prefix_matches_ranked_by_popularity(self):
+        """Test that suggestions are prefix matches, most borrowed first"""
+        texts = [s['text'] for s in self.index.suggest('harr')]
+        assert texts == [
+            'Harry Potter and the Half-Blood Prince',
+            'Harry Potter and the Goblet of Fire',
+            'Harry Harrison',
+            'Harrison Bergeron'
+        ]
+        assert [s['text'] for s in self.index.suggest('harr', limit=2)] == texts[:2]
+
+    def test_trailing_space_ends_the_word(self):
+        """Test that 'harry ' doesn't match Harrison"""
+        assert {s['id'] for s in self.index.suggest('harry ')} == {1, 2, 7}
+        assert self.index.suggest('harry potter and the half')[0]['id'] == 2
+
+    def test_isbn_prefix(self):
+        """Test that ISBN prefixes match with or without hyphens"""
+        assert self.index.suggest('978-0-7475')[0] == {'type': 'isbn', 'text': '978-0-7475-3269-9', 'id': 1, 'score': 40}
+        assert self.index.suggest('zzz') == []
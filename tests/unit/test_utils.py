@@ -1,5 +0,0 @@
-# test_utils.py
-# Placeholder for utility function tests
-
-def test_placeholder_utils():
-    assert True
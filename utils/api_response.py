@@ -50,36 +50,45 @@ class ApiResponse:
         return jsonify(response), status_code
     
     @staticmethod
-    def pagination(items, total, page, per_page, message=None):
+    def pagination(items, total, page, per_page, message=None, next_cursor=None, total_exact=True):
         """
         Create a paginated response
         
         Args:
             items: List of items for current page
-            total: Total number of items
-            page: Current page number
+            total: Total number of items, or None if not counted
+            page: Current page number, or None for a cursor (keyset) page
             per_page: Number of items per page
             message: Optional message
+            next_cursor: Cursor token for the next page, if there is one
+            total_exact: False if total is an estimate
         
         Returns:
             JSON response with pagination metadata
         """
-        total_pages = (total + per_page - 1) // per_page
+        total_pages = (total + per_page - 1) // per_page if total is not None else None
+        
+        if page is None or total is None or not total_exact:
+            has_next = next_cursor is not None
+        else:
+            has_next = page < total_pages
         
         response = {
             "success": True,
             "data": items,
             "pagination": {
                 "total": total,
+                "total_exact": total_exact,
                 "per_page": per_page,
                 "current_page": page,
                 "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
+                "has_next": has_next,
+                "has_prev": page is None or page > 1,
+                "next_cursor": next_cursor
             }
         }
         
         if message:
             response["message"] = message
         
-        return jsonify(response), 200
\ No newline at end of file
+        return jsonify(response), 200
@@ -1,91 +1,1111 @@
+import os
+import sys
+import heapq
+import math
 import time
+import random
+import logging
 import threading
+import uuid
+import hashlib
 import functools
+import itertools
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+# Default bounds, overridable through Cache.configure() / Cache.init_app()
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+DEFAULT_EVICTION_POLICY = 'lru'
+DEFAULT_SHARDS = 1
+
+# Returned by lookups that found nothing, so None can be a cached value
+MISSING = object()
+
+# Tag versions live in the store under this prefix
+TAG_PREFIX = 'tag:'
+
+# Keys longer than this are replaced by a digest to keep them cheap to store
+MAX_READABLE_KEY_LENGTH = 128
+
+def estimate_size(value, _depth=0):
+    """
+    Approximate the memory footprint of a value in bytes
+
+    Only descends two levels into containers so the estimate stays cheap
+    enough to run on every set.
+
+    Args:
+        value: Value to measure
+
+    Returns:
+        Approximate size in bytes
+    """
+    size = sys.getsizeof(value)
+    if _depth >= 2:
+        return size
+
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+
+    return size
+
+class LRUPolicy:
+    """Least-recently-used eviction order, O(1) per operation"""
+
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def add(self, key):
+        self._order[key] = None
+
+    def touch(self, key):
+        self._order.move_to_end(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        """Return the key that should be evicted next"""
+        return next(iter(self._order)) if self._order else None
+
+    def clear(self):
+        self._order.clear()
+
+class LFUPolicy:
+    """
+    Least-frequently-used eviction order, O(1) per operation
+
+    Keys are kept in one insertion-ordered bucket per access count, so ties
+    within the lowest frequency are broken by recency.
+    """
+
+    def __init__(self):
+        self._freq = {}
+        self._buckets = {}
+        self._min_freq = 0
+
+    def add(self, key):
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def touch(self, key):
+        freq = self._freq[key]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def remove(self, key):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = min(self._buckets) if self._buckets else 0
+
+    def victim(self):
+        """Return the key that should be evicted next"""
+        if not self._buckets:
+            return None
+        return next(iter(self._buckets[self._min_freq]))
+
+    def clear(self):
+        self._freq.clear()
+        self._buckets.clear()
+        self._min_freq = 0
+
+EVICTION_POLICIES = {
+    'lru': LRUPolicy,
+    'lfu': LFUPolicy
+}
+
+STAT_FIELDS = ('hits', 'misses', 'expirations', 'evictions', 'invalidations',
+               'sets', 'set_bytes', 'loads', 'load_seconds')
+
+STAT_DESCRIPTIONS = {
+    'hits': 'Cache lookups that found a value',
+    'misses': 'Cache lookups that found nothing',
+    'expirations': 'Entries removed because their TTL passed',
+    'evictions': 'Entries removed to stay within the entry or byte budget',
+    'invalidations': 'Entries dropped because a tag they depend on was invalidated',
+    'sets': 'Entries written to an in-process store',
+    'set_bytes': 'Approximate bytes written to an in-process store',
+    'loads': 'Values computed by @cached functions',
+    'load_seconds': 'Seconds spent computing values in @cached functions'
+}
+
+def key_prefix(key):
+    """Group a key for statistics: the part before the first ':'"""
+    if isinstance(key, str):
+        return key.partition(':')[0]
+    return type(key).__name__
+
+class CacheStats:
+    """
+    Cache counters broken down by key prefix
+
+    Prefixes are e.g. 'rate_limit', 'login_attempts', 'tag' or the qualified
+    name of a @cached function. Expirations, evictions and entry sizes are
+    only seen by in-process stores (including the L1 of a TieredBackend).
+
+    Every thread counts into its own table, so recording takes no lock; the
+    tables are merged when read, and those of exited threads are folded
+    into one.
+    """
+
+    # Keeps the table bounded if keys without a fixed prefix are used
+    MAX_PREFIXES = 256
+    OVERFLOW_PREFIX = 'other'
+
+    def __init__(self):
+        self.enabled = True
+        self._local = threading.local()
+        self._threads = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _thread_counters(self):
+        by_prefix = getattr(self._local, 'by_prefix', None)
+        if by_prefix is None:
+            by_prefix = self._local.by_prefix = {}
+            with self._lock:
+                self._retire()
+                self._threads.append((threading.current_thread(), by_prefix))
+        return by_prefix
+
+    def record(self, key, field, amount=1):
+        """Add amount to a counter for the key's prefix"""
+        if not self.enabled:
+            return
+
+        prefix = key_prefix(key)
+        by_prefix = self._thread_counters()
+        counters = by_prefix.get(prefix)
+        if counters is None:
+            if len(by_prefix) >= self.MAX_PREFIXES:
+                prefix = self.OVERFLOW_PREFIX
+            counters = by_prefix.setdefault(prefix, dict.fromkeys(STAT_FIELDS, 0))
+        counters[field] += amount
+
+    def _merge(self, into, by_prefix):
+        # dict() copies in one step, while the owning thread may be writing
+        for prefix, counters in dict(by_prefix).items():
+            if prefix not in into and len(into) >= self.MAX_PREFIXES:
+                prefix = self.OVERFLOW_PREFIX
+            target = into.setdefault(prefix, dict.fromkeys(STAT_FIELDS, 0))
+            for field, value in dict(counters).items():
+                target[field] += value
+
+    def _retire(self):
+        """Fold the counters of exited threads together; call holding the lock"""
+        live = []
+        for thread, by_prefix in self._threads:
+            if thread.is_alive():
+                live.append((thread, by_prefix))
+            else:
+                self._merge(self._retired, by_prefix)
+        self._threads = live
+
+    def _counters(self):
+        """Counters of every thread merged by prefix"""
+        with self._lock:
+            self._retire()
+            by_prefix = {prefix: dict(counters) for prefix, counters in self._retired.items()}
+            for _, thread_counters in self._threads:
+                self._merge(by_prefix, thread_counters)
+        return by_prefix
+
+    def reset(self):
+        """Zero all counters"""
+        with self._lock:
+            self._retired.clear()
+            for _, by_prefix in self._threads:
+                by_prefix.clear()
+
+    def snapshot(self):
+        """
+        Get a copy of all counters
+
+        Returns:
+            Dictionary with per-prefix counters and totals, each including the
+            hit ratio and average written entry size
+        """
+        by_prefix = self._counters()
+
+        totals = dict.fromkeys(STAT_FIELDS, 0)
+        for counters in by_prefix.values():
+            for field in STAT_FIELDS:
+                totals[field] += counters[field]
+
+        for counters in list(by_prefix.values()) + [totals]:
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else None
+            counters['avg_entry_bytes'] = counters['set_bytes'] // counters['sets'] if counters['sets'] else None
+
+        return {'prefixes': by_prefix, 'totals': totals}
+
+    def render_metrics(self, gauges=None, namespace='library_cache'):
+        """
+        Render counters in the Prometheus text exposition format
+
+        Args:
+            gauges: Optional dictionary of extra gauge values (e.g. entries)
+            namespace: Metric name prefix
+
+        Returns:
+            Metrics text
+        """
+        by_prefix = self._counters()
+
+        lines = []
+        for field in STAT_FIELDS:
+            name = f"{namespace}_{field}_total"
+            lines.append(f"# HELP {name} {STAT_DESCRIPTIONS[field]}")
+            lines.append(f"# TYPE {name} counter")
+            for prefix in sorted(by_prefix):
+                label = prefix.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{prefix="{label}"}} {by_prefix[prefix][field]}')
+
+        for gauge, value in (gauges or {}).items():
+            name = f"{namespace}_{gauge}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+# Shared by every store and by Cache
+stats = CacheStats()
+
+class CacheBackend:
+    """
+    Interface implemented by every cache storage backend
+
+    Backends store arbitrary picklable values with an optional TTL. Shared
+    backends (see utils.cache_backends) make one cache, one set of tag
+    versions and one set of rate-limit counters visible to every worker.
+    """
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def get(self, key, default=None):
+        """Get value, or default if missing or expired"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Set value with optional TTL in seconds"""
+        raise NotImplementedError
+
+    def get_with_ttl(self, key, default=None):
+        """
+        Get value and its remaining TTL
+
+        Returns:
+            Tuple (value, seconds left); seconds left is None for keys
+            without an expiry, or when the backend can't tell
+        """
+        return self.get(key, default), None
+
+    def delete(self, key):
+        """Delete key"""
+        raise NotImplementedError
+
+    def incr(self, key, amount=1, ttl=None):
+        """
+        Atomically add amount to an integer counter
+
+        A missing or expired counter starts from 0 and gets the given TTL; an
+        existing counter keeps its expiry.
+
+        Returns:
+            The new value
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove all keys"""
+        raise NotImplementedError
+
+    def cleanup(self, max_items=None):
+        """
+        Remove expired keys
+
+        Args:
+            max_items: Stop after removing this many keys (None for no limit)
+
+        Returns:
+            Number of keys removed
+        """
+        return 0
+
+class MemoryStore(CacheBackend):
+    """
+    Bounded in-process key/value store
+
+    Holds at most max_entries keys and roughly max_bytes of data. When either
+    bound is exceeded, keys are evicted according to the eviction policy.
+
+    Expiry times are also kept in a min-heap, so cleanup() only visits keys
+    that have actually expired. Heap entries made stale by a later set or
+    delete are skipped when popped, and the heap is rebuilt once stale
+    entries outnumber live ones.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 policy=DEFAULT_EVICTION_POLICY):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy_name = policy
+        self._policy = EVICTION_POLICIES[policy]()
+        self._data = {}
+        self._expiry = {}
+        self._expiry_heap = []
+        self._heap_seq = itertools.count()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size_bytes(self):
+        """Approximate number of bytes held"""
+        return self._bytes
+
+    def get(self, key, default=None):
+        """Get value from store"""
+        with self._lock:
+            if key not in self._data:
+                return default
+
+            expires_at = self._expiry.get(key)
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                stats.record(key, 'expirations')
+                return default
+
+            self._policy.touch(key)
+            return self._data[key]
+
+    def set(self, key, value, ttl=None):
+        """Set value in store with optional TTL in seconds"""
+        size = estimate_size(key) + estimate_size(value)
+
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizes[key]
+                self._policy.touch(key)
+            else:
+                self._policy.add(key)
+
+            self._data[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+
+            if ttl is not None:
+                self._set_expiry(key, time.time() + ttl)
+            else:
+                self._expiry.pop(key, None)
+
+            self._enforce_bounds(key)
+
+        stats.record(key, 'sets')
+        stats.record(key, 'set_bytes', size)
+
+    def items(self):
+        """Unexpired (key, value) pairs; listing them doesn't count as access"""
+        with self._lock:
+            now = time.time()
+            return [
+                (key, value) for key, value in self._data.items()
+                if self._expiry.get(key, now + 1) > now
+            ]
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add amount to an integer counter"""
+        with self._lock:
+            current = self.get(key, MISSING)
+            if current is MISSING:
+                self.set(key, amount, ttl)
+                return amount
+
+            expires_at = self._expiry.get(key)
+            value = current + amount
+            self.set(key, value)
+            if expires_at is not None:
+                self._set_expiry(key, expires_at)
+            return value
+
+    def delete(self, key):
+        """Delete key from store"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        """Remove all keys"""
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+            self._expiry_heap.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self._policy.clear()
+
+    def cleanup(self, max_items=None):
+        """Remove expired keys, at most max_items of them if given"""
+        with self._lock:
+            current_time = time.time()
+            heap = self._expiry_heap
+            removed = 0
+            while heap and heap[0][0] <= current_time:
+                if max_items is not None and removed >= max_items:
+                    break
+                expires_at, _, key = heapq.heappop(heap)
+                # Skip entries superseded by a later set, or already removed
+                if self._expiry.get(key) != expires_at:
+                    continue
+                self._remove(key)
+                stats.record(key, 'expirations')
+                removed += 1
+            return removed
+
+    def _set_expiry(self, key, expires_at):
+        self._expiry[key] = expires_at
+        # The sequence number keeps heap comparisons away from the keys
+        heapq.heappush(self._expiry_heap, (expires_at, next(self._heap_seq), key))
+        if len(self._expiry_heap) > 2 * len(self._expiry) + 64:
+            self._expiry_heap = [(t, next(self._heap_seq), k) for k, t in self._expiry.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def _enforce_bounds(self, protected_key):
+        """Evict keys until both bounds hold, sparing the key just written if possible"""
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            victim = self._policy.victim()
+            if victim is None:
+                break
+            if victim == protected_key:
+                # A single oversized value can't be kept within budget
+                if len(self._data) == 1:
+                    self._remove(victim)
+                    stats.record(victim, 'evictions')
+                    break
+                self._policy.touch(victim)
+                continue
+            self._remove(victim)
+            stats.record(victim, 'evictions')
+
+    def _remove(self, key):
+        del self._data[key]
+        self._bytes -= self._sizes.pop(key, 0)
+        self._expiry.pop(key, None)
+        self._policy.remove(key)
+
+class ShardedStore(CacheBackend):
+    """
+    Lock-striped store made of independent MemoryStore segments
+
+    Each key is hashed to one segment, so threads touching different keys
+    rarely wait on the same lock. The entry and byte budgets are split evenly
+    across segments.
+    """
+
+    def __init__(self, shards=16, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 policy=DEFAULT_EVICTION_POLICY):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy_name = policy
+        self._segments = [
+            MemoryStore(max(1, max_entries // shards), max(1, max_bytes // shards), policy)
+            for _ in range(shards)
+        ]
+        self._sweep_start = 0
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments)
+
+    @property
+    def shards(self):
+        """Number of segments"""
+        return len(self._segments)
+
+    @property
+    def size_bytes(self):
+        """Approximate number of bytes held"""
+        return sum(segment.size_bytes for segment in self._segments)
+
+    def segment_for(self, key):
+        """Return the segment responsible for a key"""
+        return self._segments[hash(key) % len(self._segments)]
+
+    def get(self, key, default=None):
+        """Get value from store"""
+        return self.segment_for(key).get(key, default)
+
+    def set(self, key, value, ttl=None):
+        """Set value in store with optional TTL in seconds"""
+        self.segment_for(key).set(key, value, ttl)
+
+    def delete(self, key):
+        """Delete key from store"""
+        self.segment_for(key).delete(key)
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add amount to an integer counter"""
+        return self.segment_for(key).incr(key, amount, ttl)
+
+    def clear(self):
+        """Remove all keys"""
+        for segment in self._segments:
+            segment.clear()
+
+    def cleanup(self, max_items=None):
+        """
+        Remove expired keys, one segment at a time
+
+        Bounded sweeps start from a different segment each call so every
+        segment gets its turn.
+        """
+        count = len(self._segments)
+        start = self._sweep_start
+        self._sweep_start = (start + 1) % count
+
+        removed = 0
+        for offset in range(count):
+            limit = None if max_items is None else max_items - removed
+            if limit == 0:
+                break
+            removed += self._segments[(start + offset) % count].cleanup(limit)
+        return removed
+
+def create_store(max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 policy=DEFAULT_EVICTION_POLICY, shards=DEFAULT_SHARDS):
+    """Create a single-lock store, or a sharded one when shards > 1"""
+    if shards > 1:
+        return ShardedStore(shards, max_entries, max_bytes, policy)
+    return MemoryStore(max_entries, max_bytes, policy)
+
+class TaggedValue:
+    """A cached value together with the versions of the tags it depends on"""
+    __slots__ = ('value', 'versions')
+
+    def __init__(self, value, versions):
+        self.value = value
+        self.versions = versions
 
 class Cache:
     _instance = None
-    _cache = {}
-    _expiry = {}
-    _lock = threading.RLock()
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Cache, cls).__new__(cls)
+            cls._instance._store = MemoryStore()
+            cls._instance._sweeper = None
         return cls._instance
-    
+
+    def configure(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                  policy=DEFAULT_EVICTION_POLICY, shards=DEFAULT_SHARDS):
+        """
+        Replace the underlying store with an in-process one using the given bounds
+
+        Args:
+            max_entries: Maximum number of keys held
+            max_bytes: Approximate memory budget in bytes
+            policy: Eviction policy ('lru' or 'lfu')
+            shards: Number of independently locked segments
+        """
+        self._store = create_store(max_entries, max_bytes, policy, shards)
+
+    def use_backend(self, backend):
+        """Replace the underlying store with any CacheBackend"""
+        self._store = backend
+
+    @property
+    def backend(self):
+        """The CacheBackend currently in use"""
+        return self._store
+
+    def init_app(self, app):
+        """Configure the cache backend from Flask application config"""
+        from utils.cache_backends import create_backend
+        self.use_backend(create_backend(app.config))
+        stats.enabled = app.config.get('CACHE_STATS_ENABLED', True)
+
+        interval = app.config.get('CACHE_SWEEP_INTERVAL', 0)
+        if interval:
+            self.start_sweeper(interval, app.config.get('CACHE_SWEEP_BATCH_SIZE', 500))
+
+    def get_stats(self):
+        """Counters by key prefix plus the current size of the backend"""
+        snapshot = stats.snapshot()
+        snapshot['backend'] = {
+            'type': type(self._store).__name__,
+            'entries': len(self._store),
+            'bytes': getattr(self._store, 'size_bytes', None)
+        }
+        return snapshot
+
+    def render_metrics(self):
+        """Counters and backend size in the Prometheus text format"""
+        gauges = {'entries': len(self._store)}
+        if getattr(self._store, 'size_bytes', None) is not None:
+            gauges['bytes'] = self._store.size_bytes
+        return stats.render_metrics(gauges)
+
+    def __len__(self):
+        return len(self._store)
+
     def get(self, key, default=None):
-        """Get value from cache"""
-        with self._lock:
-            # Check if key exists and not expired
-            if key in self._cache and (key not in self._expiry or self._expiry[key] > time.time()):
-                return self._cache[key]
-            
-            # Remove expired key
-            if key in self._cache:
-                del self._cache[key]
-                if key in self._expiry:
-                    del self._expiry[key]
-            
+        """Get value from cache, treating entries with invalidated tags as missing"""
+        value = self._store.get(key, MISSING)
+        if value is MISSING:
+            stats.record(key, 'misses')
             return default
-    
-    def set(self, key, value, ttl=None):
-        """Set value in cache with optional TTL in seconds"""
-        with self._lock:
-            self._cache[key] = value
-            if ttl is not None:
-                self._expiry[key] = time.time() + ttl
-    
+
+        if isinstance(value, TaggedValue):
+            if not self._tags_current(value.versions):
+                self._store.delete(key)
+                stats.record(key, 'invalidations')
+                stats.record(key, 'misses')
+                return default
+            value = value.value
+
+        stats.record(key, 'hits')
+        return value
+
+    def set(self, key, value, ttl=None, tags=None):
+        """
+        Set value in cache with optional TTL in seconds
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Time to live in seconds
+            tags: Names of the tables or rows the value depends on (e.g.
+                'books', 'books:42'), or a snapshot from tag_versions()
+                taken before the value was computed
+        """
+        if tags:
+            versions = tags if isinstance(tags, dict) else self.tag_versions(tags)
+            value = TaggedValue(value, versions)
+        self._store.set(key, value, ttl)
+
+        if self._sweeper is not None and ttl is not None:
+            self._sweeper.ensure_running()
+
     def delete(self, key):
         """Delete key from cache"""
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-            if key in self._expiry:
-                del self._expiry[key]
-    
+        self._store.delete(key)
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically increment a counter, creating it with ttl if missing"""
+        return self._store.incr(key, amount, ttl)
+
     def clear(self):
         """Clear all cache"""
+        self._store.clear()
+
+    def cleanup(self, max_items=None):
+        """Remove expired keys, at most max_items of them if given"""
+        return self._store.cleanup(max_items)
+
+    def start_sweeper(self, interval=1.0, batch_size=500, max_batches=20):
+        """Start the background expiry sweeper (see ExpirySweeper)"""
+        if self._sweeper is not None:
+            self._sweeper.stop()
+        self._sweeper = ExpirySweeper(self, interval, batch_size, max_batches)
+        self._sweeper.start()
+        return self._sweeper
+
+    def stop_sweeper(self):
+        """Stop the background expiry sweeper if it is running"""
+        if self._sweeper is not None:
+            self._sweeper.stop()
+            self._sweeper = None
+
+    def tag_versions(self, tags):
+        """
+        Snapshot the current version of each tag
+
+        Take the snapshot before computing a value so that an invalidation
+        racing with the computation still marks the result as stale.
+
+        Returns:
+            Dictionary mapping tag to version
+        """
+        versions = {}
+        for tag in tags:
+            tag_key = TAG_PREFIX + tag
+            version = self._store.get(tag_key)
+            if version is None:
+                version = uuid.uuid4().hex
+                self._store.set(tag_key, version)
+            versions[tag] = version
+        return versions
+
+    def invalidate_tags(self, *tags):
+        """Invalidate every entry that depends on any of the given tags"""
+        for tag in tags:
+            self._store.delete(TAG_PREFIX + tag)
+
+    def _tags_current(self, versions):
+        for tag, version in versions.items():
+            if self._store.get(TAG_PREFIX + tag) != version:
+                return False
+        return True
+
+class ExpirySweeper:
+    """
+    Daemon thread that removes expired cache keys in small batches
+
+    Every interval seconds it calls cache.cleanup(batch_size) until a batch
+    comes back short or max_batches have run, so the store lock is only held
+    for one batch at a time and other threads get in between batches. The
+    thread is restarted lazily if the process forks (e.g. gunicorn --preload).
+    """
+
+    def __init__(self, cache, interval=1.0, batch_size=500, max_batches=20):
+        self.cache = cache
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def start(self):
+        """Start the sweeper thread"""
+        if self.running:
+            return False
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cache-expiry-sweeper')
+        self._thread.daemon = True
+        self._thread.start()
+        self._pid = os.getpid()
+        return True
+
+    def ensure_running(self):
+        """Restart the thread if it didn't survive a fork"""
+        if self._pid != os.getpid() and not self._stop.is_set():
+            self.start()
+
+    def stop(self):
+        """Stop the sweeper thread"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+
+    def sweep(self):
+        """Run one sweep: up to max_batches batches of batch_size removals"""
+        removed = 0
+        for _ in range(self.max_batches):
+            batch = self.cache.cleanup(self.batch_size)
+            removed += batch
+            if batch < self.batch_size:
+                break
+            # Let request threads take the lock between batches
+            time.sleep(0)
+        return removed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Cache expiry sweep failed: {e}")
+
+class _Call:
+    """An in-flight call shared by SingleFlight callers"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one execution
+
+    The first caller for a key runs the function; callers that arrive while
+    it is running wait for it and share its result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _begin(self, key):
         with self._lock:
-            self._cache.clear()
-            self._expiry.clear()
-    
-    def cleanup(self):
-        """Remove all expired keys"""
-        with self._lock:
-            current_time = time.time()
-            expired_keys = [k for k, v in self._expiry.items() if v <= current_time]
-            for key in expired_keys:
-                if key in self._cache:
-                    del self._cache[key]
-                del self._expiry[key]
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _run(self, key, call, func):
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    def in_flight(self, key):
+        """True if a call for key is currently running"""
+        return key in self._calls
+
+    def do(self, key, func, timeout=None):
+        """
+        Run func once for all concurrent callers of key
+
+        Args:
+            key: Key identifying the call
+            func: Zero-argument callable
+            timeout: Seconds a waiter blocks before running func itself
+
+        Returns:
+            Result of func
+        """
+        call, leader = self._begin(key)
+        if leader:
+            return self._run(key, call, func)
+
+        if not call.event.wait(timeout):
+            logger.warning(f"Single-flight wait timed out for {key}, computing directly")
+            return func()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do_async(self, key, func):
+        """
+        Run func in a daemon thread unless a call for key is already running
+
+        Returns:
+            True if a refresh was started
+        """
+        call, leader = self._begin(key)
+        if not leader:
+            return False
+
+        def run():
+            try:
+                self._run(key, call, func)
+            except Exception as e:
+                logger.error(f"Background cache refresh failed for {key}: {e}")
+
+        thread = threading.Thread(target=_with_app_context(run), name=f"cache-refresh:{key}")
+        thread.daemon = True
+        thread.start()
+        return True
+
+def _with_app_context(func):
+    """Wrap func so it runs inside the current Flask app context, if any"""
+    try:
+        from flask import current_app, has_app_context
+    except ImportError:
+        return func
+
+    if not has_app_context():
+        return func
+
+    app = current_app._get_current_object()
+
+    @functools.wraps(func)
+    def run():
+        with app.app_context():
+            return func()
+    return run
+
+def should_refresh_early(expires_at, compute_time, beta, now=None):
+    """
+    Probabilistic early expiration (XFetch)
+
+    Returns True with a probability that rises as expiry approaches and as
+    the value gets more expensive to recompute, so one caller refreshes a
+    hot entry before it expires instead of all callers at once afterwards.
+
+    Args:
+        expires_at: Expiry timestamp of the entry
+        compute_time: Seconds the last computation took
+        beta: Eagerness factor; 1.0 is the usual default, 0 disables
+        now: Current timestamp (defaults to time.time())
+    """
+    if not beta:
+        return False
+    now = time.time() if now is None else now
+    return now - compute_time * beta * math.log(1.0 - random.random()) >= expires_at
 
 # Create a singleton instance
 cache = Cache()
 
-def cached(ttl=300):
+_SCALAR_TYPES = (type(None), bool, int, float, str, bytes)
+
+def _key_part(value):
+    """
+    Reduce an argument to a hashable value whose repr is stable and type-aware
+
+    Scalars are kept as-is since their repr already differs by type
+    (1, 1.0, '1' and True all render differently). Containers are rebuilt as
+    tagged tuples, unordered ones sorted by repr. Objects can control their key
+    by defining cache_key(); other objects fall back to their type and repr.
+    """
+    if isinstance(value, _SCALAR_TYPES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_key_part(item) for item in value))
+    if isinstance(value, dict):
+        items = ((_key_part(k), _key_part(v)) for k, v in value.items())
+        return ('dict', tuple(sorted(items, key=repr)))
+    if isinstance(value, (set, frozenset)):
+        return (type(value).__name__, tuple(sorted((_key_part(item) for item in value), key=repr)))
+    if isinstance(value, (datetime, date, dt_time)):
+        return (type(value).__name__, value.isoformat())
+    if isinstance(value, Decimal):
+        return ('Decimal', str(value))
+
+    key_method = getattr(value, 'cache_key', None)
+    if callable(key_method):
+        return (type(value).__qualname__, _key_part(key_method()))
+    return (type(value).__qualname__, repr(value))
+
+def make_key(prefix, args=(), kwargs=None):
+    """
+    Build a stable, type-aware cache key for a call
+
+    Args:
+        prefix: Key prefix, usually the qualified function name
+        args: Positional arguments
+        kwargs: Keyword arguments
+
+    Returns:
+        String key of the form '<prefix>:<arguments>'
+    """
+    parts = tuple(_key_part(arg) for arg in args)
+    if kwargs:
+        parts += (('kwargs', tuple(sorted((k, _key_part(v)) for k, v in kwargs.items()))),)
+
+    body = repr(parts)
+    if len(body) > MAX_READABLE_KEY_LENGTH:
+        body = '#' + hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest()
+    return f"{prefix}:{body}"
+
+def is_empty_result(value):
+    """True for None and empty containers, which are cached with negative_ttl"""
+    if value is None:
+        return True
+    if isinstance(value, (str, bytes, list, tuple, dict, set, frozenset)):
+        return len(value) == 0
+    return False
+
+# Shared by every @cached function
+flights = SingleFlight()
+
+def cached(ttl=300, negative_ttl=30, single_flight=True, stale_ttl=0, early_refresh=0, wait_timeout=30,
+           tags=None):
     """
     Decorator to cache function results
-    
+
+    Entries are stored together with their expiry time and how long they took
+    to compute, which lets the decorator serve stale values and refresh hot
+    entries ahead of expiry. None and empty results are cached too, so
+    "not found" lookups are not re-run on every call.
+
+    The wrapped function gains cache_key(*args, **kwargs) and
+    invalidate(*args, **kwargs) helpers.
+
     Args:
         ttl: Time to live in seconds (default: 5 minutes)
+        negative_ttl: Time to live for None and empty results, capped at ttl
+        single_flight: If True, concurrent misses for the same key wait for
+            one computation instead of all running the function
+        stale_ttl: Seconds past expiry during which the stale value is still
+            returned while a background thread recomputes it
+        early_refresh: XFetch beta; when non-zero, callers may start a
+            background refresh shortly before expiry
+        wait_timeout: Seconds a single-flight waiter blocks before computing
+            the value itself
+        tags: Tables or rows the result depends on, as a list of tag names or
+            a callable taking the function's arguments and returning one.
+            Writes to those tables invalidate the entry (see
+            Cache.invalidate_tags)
     """
     def decorator(func):
+        prefix = f"{func.__module__}.{func.__qualname__}"
+
+        def cache_key(*args, **kwargs):
+            return make_key(prefix, args, kwargs)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Create cache key from function name and arguments
-            key_parts = [func.__name__]
-            key_parts.extend([str(arg) for arg in args])
-            key_parts.extend([f"{k}={v}" for k, v in sorted(kwargs.items())])
-            cache_key = ":".join(key_parts)
-            
+            key = cache_key(*args, **kwargs)
+
+            def load():
+                entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+                versions = cache.tag_versions(entry_tags) if entry_tags else None
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                compute_time = time.perf_counter() - start
+                stats.record(key, 'loads')
+                stats.record(key, 'load_seconds', compute_time)
+                entry_ttl = min(ttl, negative_ttl) if is_empty_result(result) else ttl
+                cache.set(key, (result, time.time() + entry_ttl, compute_time), entry_ttl + stale_ttl,
+                          tags=versions)
+                return result
+
             # Try to get from cache
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
-            
+            entry = cache.get(key, MISSING)
+            if entry is not MISSING:
+                value, expires_at, compute_time = entry
+                now = time.time()
+                if now >= expires_at or should_refresh_early(expires_at, compute_time, early_refresh, now):
+                    flights.do_async(key, load)
+                return value
+
             # Call function and cache result
-            result = func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
-            return result
+            if single_flight:
+                return flights.do(key, load, timeout=wait_timeout)
+            return load()
+
+        def invalidate(*args, **kwargs):
+            cache.delete(cache_key(*args, **kwargs))
+
+        wrapper.cache_key = cache_key
+        wrapper.invalidate = invalidate
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,550 @@
+"""
+Shared cache backends
+
+Every gunicorn worker has its own memory, so the default in-process store
+gives each worker its own cold cache and its own rate-limit counters. The
+backends here keep one copy of the data for all workers: RedisBackend talks
+to a Redis server, SQLiteBackend uses a WAL-mode SQLite file that every
+worker on the host opens.
+
+TieredBackend puts a small per-worker MemoryStore (L1) in front of a shared
+backend (L2) and keeps the L1 copies coherent by broadcasting invalidations
+over an InvalidationBus.
+"""
+
+import os
+import glob
+import uuid
+import socket
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+from utils.cache import (CacheBackend, MemoryStore, MISSING, DEFAULT_EVICTION_POLICY, DEFAULT_MAX_BYTES,
+                         DEFAULT_MAX_ENTRIES, DEFAULT_SHARDS, create_store)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+DEFAULT_NAMESPACE = 'library:'
+DEFAULT_SQLITE_PATH = os.path.join(tempfile.gettempdir(), 'library_cache.sqlite3')
+DEFAULT_BUS_DIR = os.path.join(tempfile.gettempdir(), 'library_cache_bus')
+DEFAULT_BUS_CHANNEL = 'library:cache-invalidation'
+
+# Invalidation message meaning "drop every L1 entry"
+CLEAR_ALL = '\x00clear'
+
+# Counters and limiter state change on every request; a stale L1 copy would
+# make lockouts and rate limits per-worker again, so they always go to L2
+NO_L1_PREFIXES = ('rate_limit:', 'login_attempts:', 'account_locked:')
+
+def dumps(value):
+    """Serialize a value for a shared backend; counters stay plain integers"""
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def loads(raw):
+    """Inverse of dumps()"""
+    if isinstance(raw, int):
+        return raw
+    raw = bytes(raw)
+    # Pickle protocol 2+ always starts with the PROTO opcode; anything else
+    # is a counter written by INCRBY
+    if raw[:1] == b'\x80':
+        return pickle.loads(raw)
+    return int(raw)
+
+class RedisBackend(CacheBackend):
+    """
+    Cache backend on a Redis server
+
+    All keys live under a namespace prefix so clear() only removes this
+    application's keys.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', namespace=DEFAULT_NAMESPACE, client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for the Redis cache backend")
+            client = redis.Redis.from_url(url)
+
+        self.namespace = namespace
+        self._client = client
+
+    def _key(self, key):
+        return f"{self.namespace}{key}"
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(match=f"{self.namespace}*", count=1000))
+
+    def get(self, key, default=None):
+        """Get value, or default if missing or expired"""
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            return default
+        return loads(raw)
+
+    def get_with_ttl(self, key, default=None):
+        """Get value and its remaining TTL in seconds"""
+        pipe = self._client.pipeline()
+        pipe.get(self._key(key))
+        pipe.pttl(self._key(key))
+        raw, pttl = pipe.execute()
+        if raw is None:
+            return default, None
+        # PTTL is -1 for keys without an expiry
+        return loads(raw), pttl / 1000 if pttl >= 0 else None
+
+    def set(self, key, value, ttl=None):
+        """Set value with optional TTL in seconds"""
+        if ttl is not None and ttl <= 0:
+            self.delete(key)
+            return
+        px = int(ttl * 1000) if ttl is not None else None
+        self._client.set(self._key(key), dumps(value), px=px)
+
+    def delete(self, key):
+        """Delete key"""
+        self._client.delete(self._key(key))
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add amount to an integer counter"""
+        full_key = self._key(key)
+        pipe = self._client.pipeline()
+        pipe.incrby(full_key, amount)
+        if ttl is not None:
+            # NX: only set the expiry when the counter was just created
+            pipe.pexpire(full_key, int(ttl * 1000), nx=True)
+        return pipe.execute()[0]
+
+    def clear(self):
+        """Remove all keys in this backend's namespace"""
+        batch = []
+        for key in self._client.scan_iter(match=f"{self.namespace}*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                self._client.delete(*batch)
+                batch = []
+        if batch:
+            self._client.delete(*batch)
+
+class SQLiteBackend(CacheBackend):
+    """
+    Host-local shared cache backend on a SQLite file in WAL mode
+
+    Needs no external service: every worker process on the host opens the same
+    file, so they share cached values, tag versions and counters. Expired rows
+    are purged and the table is trimmed to max_entries (oldest first) every
+    cleanup_interval writes.
+    """
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 cleanup_interval=1000, timeout=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.cleanup_interval = cleanup_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                expires_at REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache (expires_at)")
+
+    def _connection(self):
+        """One connection per thread and process; sqlite3 connections can't be shared"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __len__(self):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM cache WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+    def get(self, key, default=None):
+        """Get value, or default if missing or expired"""
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return loads(row[0])
+
+    def get_with_ttl(self, key, default=None):
+        """Get value and its remaining TTL in seconds"""
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return default, None
+        return loads(row[0]), row[1] - now if row[1] is not None else None
+
+    def set(self, key, value, ttl=None):
+        """Set value with optional TTL in seconds"""
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, dumps(value), expires_at)
+        )
+        self._after_write()
+
+    def delete(self, key):
+        """Delete key"""
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add amount to an integer counter"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                value = amount
+                expires_at = now + ttl if ttl is not None else None
+            else:
+                value = loads(row[0]) + amount
+                expires_at = row[1]
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return value
+
+    def clear(self):
+        """Remove all keys"""
+        self._connection().execute("DELETE FROM cache")
+
+    def cleanup(self, max_items=None):
+        """Purge expired rows (at most max_items) and trim the table to max_entries"""
+        conn = self._connection()
+        removed = conn.execute(
+            "DELETE FROM cache WHERE rowid IN ("
+            "SELECT rowid FROM cache WHERE expires_at <= ? ORDER BY expires_at LIMIT ?)",
+            (time.time(), -1 if max_items is None else max_items)
+        ).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY rowid LIMIT ?)",
+                (overflow,)
+            ).rowcount
+        return removed
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.cleanup_interval == 0:
+            self.cleanup()
+
+class InvalidationBus:
+    """
+    Broadcasts invalidated keys between worker processes
+
+    publish() sends a key to every other subscriber; callbacks registered
+    with subscribe() run on a background listener thread for each key
+    received. Listening starts lazily and restarts after a fork, so a bus
+    created before gunicorn forks its workers still works in each worker.
+    """
+
+    def __init__(self):
+        self._callbacks = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call callback(key) for every key published by another process"""
+        self._callbacks.append(callback)
+        self.ensure_listening()
+
+    def ensure_listening(self):
+        """Start the listener thread in this process if it isn't running"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._start()
+            self._pid = os.getpid()
+
+    def publish(self, key):
+        """Broadcast an invalidated key to the other processes"""
+        raise NotImplementedError
+
+    def _start(self):
+        raise NotImplementedError
+
+    def _dispatch(self, key):
+        for callback in self._callbacks:
+            try:
+                callback(key)
+            except Exception as e:
+                logger.error(f"Cache invalidation callback failed for {key}: {e}")
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name)
+        thread.daemon = True
+        thread.start()
+
+class RedisInvalidationBus(InvalidationBus):
+    """Invalidation bus on Redis pub/sub"""
+
+    def __init__(self, url='redis://localhost:6379/0', channel=DEFAULT_BUS_CHANNEL, client=None):
+        super().__init__()
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for the Redis invalidation bus")
+            client = redis.Redis.from_url(url)
+
+        self.channel = channel
+        self._client = client
+        self._origin = None
+
+    def publish(self, key):
+        """Broadcast an invalidated key to the other processes"""
+        self.ensure_listening()
+        self._client.publish(self.channel, f"{self._origin}|{key}")
+
+    def _start(self):
+        # Tag messages with our origin so we skip our own invalidations
+        self._origin = f"{socket.gethostname()}:{os.getpid()}"
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        def listen():
+            try:
+                for message in pubsub.listen():
+                    origin, _, key = message['data'].decode('utf-8').partition('|')
+                    if origin != self._origin:
+                        self._dispatch(key)
+            except Exception as e:
+                # L1 entries still expire after l1_ttl without the listener
+                logger.error(f"Cache invalidation listener stopped: {e}")
+
+        self._spawn(listen, 'cache-invalidation-redis')
+
+class SocketInvalidationBus(InvalidationBus):
+    """
+    Host-local invalidation bus on Unix datagram sockets
+
+    Stand-in for Redis pub/sub when workers share a SQLiteBackend: each
+    process binds a socket in a shared directory and publish() sends a
+    datagram to every other socket there. Sockets of dead processes are
+    removed when a send to them is refused.
+    """
+
+    def __init__(self, directory=DEFAULT_BUS_DIR):
+        super().__init__()
+        self.directory = directory
+        self._sock = None
+        self._path = None
+
+    def publish(self, key):
+        """Broadcast an invalidated key to the other processes"""
+        self.ensure_listening()
+        payload = key.encode('utf-8')
+        for path in glob.glob(os.path.join(self.directory, '*.sock')):
+            if path == self._path:
+                continue
+            try:
+                self._sock.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                self._remove_stale(path)
+            except OSError as e:
+                logger.warning(f"Failed to publish cache invalidation to {path}: {e}")
+
+    def _start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self._path)
+        self._sock = sock
+
+        def listen():
+            while True:
+                try:
+                    payload = sock.recv(65536)
+                except OSError:
+                    return
+                self._dispatch(payload.decode('utf-8'))
+
+        self._spawn(listen, 'cache-invalidation-socket')
+
+    @staticmethod
+    def _remove_stale(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+class TieredBackend(CacheBackend):
+    """
+    Two-tier cache: a small per-worker L1 in front of a shared L2
+
+    Reads are served from L1 when possible and fall back to L2, copying the
+    value into L1 for at most l1_ttl seconds and never past its L2 expiry.
+    Writes, deletes and counter updates go to L2 and are broadcast on the bus
+    so other workers drop their L1 copy. Keys starting with one of
+    no_l1_prefixes (counters and limiter state) are never held in L1.
+    """
+
+    def __init__(self, l2, bus=None, l1_max_entries=1000, l1_ttl=30, no_l1_prefixes=NO_L1_PREFIXES):
+        self.l1 = MemoryStore(max_entries=l1_max_entries)
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+        self.no_l1_prefixes = tuple(no_l1_prefixes)
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe(self._on_invalidate)
+
+    def __len__(self):
+        return len(self.l2)
+
+    def _uses_l1(self, key):
+        return not key.startswith(self.no_l1_prefixes)
+
+    def get(self, key, default=None):
+        """Get value from L1, falling back to L2"""
+        if not self._uses_l1(key):
+            return self.l2.get(key, default)
+        if self.bus is not None:
+            self.bus.ensure_listening()
+
+        value = self.l1.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        value, remaining = self.l2.get_with_ttl(key, MISSING)
+        if value is MISSING:
+            return default
+        ttl = self.l1_ttl if remaining is None else min(remaining, self.l1_ttl)
+        if ttl > 0:
+            self.l1.set(key, value, ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Write to both tiers and invalidate other workers' L1"""
+        self.l2.set(key, value, ttl)
+        if not self._uses_l1(key):
+            return
+        self.l1.set(key, value, self.l1_ttl if ttl is None else min(ttl, self.l1_ttl))
+        self._publish(key)
+
+    def delete(self, key):
+        """Delete from both tiers and invalidate other workers' L1"""
+        self.l2.delete(key)
+        if not self._uses_l1(key):
+            return
+        self.l1.delete(key)
+        self._publish(key)
+
+    def incr(self, key, amount=1, ttl=None):
+        """Increment the shared counter in L2 and invalidate every L1 copy"""
+        value = self.l2.incr(key, amount, ttl)
+        if self._uses_l1(key):
+            self.l1.delete(key)
+            self._publish(key)
+        return value
+
+    def clear(self):
+        """Clear both tiers on every worker"""
+        self.l2.clear()
+        self.l1.clear()
+        self._publish(CLEAR_ALL)
+
+    def cleanup(self, max_items=None):
+        """Remove expired keys from both tiers"""
+        return self.l1.cleanup(max_items) + self.l2.cleanup(max_items)
+
+    def _publish(self, key):
+        if self.bus is None:
+            return
+        try:
+            self.bus.publish(key)
+        except Exception as e:
+            # L1 TTL still bounds staleness if a broadcast is lost
+            logger.warning(f"Failed to broadcast cache invalidation for {key}: {e}")
+
+    def _on_invalidate(self, key):
+        if key == CLEAR_ALL:
+            self.l1.clear()
+        else:
+            self.l1.delete(key)
+
+def create_bus(config):
+    """Build the invalidation bus selected by CACHE_INVALIDATION_BUS, or None"""
+    bus = config.get('CACHE_INVALIDATION_BUS')
+    if bus == 'redis':
+        return RedisInvalidationBus(config.get('CACHE_REDIS_URL') or config.get('REDIS_URL'))
+    if bus == 'socket':
+        return SocketInvalidationBus(config.get('CACHE_BUS_DIR') or DEFAULT_BUS_DIR)
+    if bus:
+        raise ValueError(f"Unknown cache invalidation bus: {bus}")
+    return None
+
+def create_backend(config):
+    """
+    Build the cache backend selected by CACHE_BACKEND
+
+    Args:
+        config: Mapping with CACHE_* settings (e.g. app.config)
+
+    Shared backends are wrapped in a TieredBackend when CACHE_L1_MAX_ENTRIES
+    is non-zero and CACHE_INVALIDATION_BUS is set.
+
+    Returns:
+        CacheBackend instance ('memory', 'sqlite' or 'redis')
+    """
+    backend = config.get('CACHE_BACKEND', 'memory')
+    max_entries = config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    if backend in ('redis', 'sqlite'):
+        if backend == 'redis':
+            shared = RedisBackend(config.get('CACHE_REDIS_URL') or config.get('REDIS_URL'),
+                                  namespace=config.get('CACHE_KEY_PREFIX', DEFAULT_NAMESPACE))
+        else:
+            shared = SQLiteBackend(config.get('CACHE_SQLITE_PATH') or DEFAULT_SQLITE_PATH,
+                                   max_entries=max_entries)
+
+        # Without a bus other workers' writes would go unnoticed for up to
+        # CACHE_L1_TTL seconds, so L1 needs one
+        l1_max_entries = config.get('CACHE_L1_MAX_ENTRIES', 0)
+        bus = create_bus(config)
+        if not l1_max_entries or bus is None:
+            return shared
+        return TieredBackend(shared, bus, l1_max_entries, config.get('CACHE_L1_TTL', 30))
+
+    if backend == 'memory':
+        return create_store(
+            max_entries=max_entries,
+            max_bytes=config.get('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+            policy=config.get('CACHE_EVICTION_POLICY', DEFAULT_EVICTION_POLICY),
+            shards=config.get('CACHE_SHARDS', DEFAULT_SHARDS)
+        )
+
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,168 @@
+"""
+Total counts for paginated listings
+
+A COUNT(*) with the listing's filters visits every matching row, so for
+broad filters it costs more than the page itself. Counts are resolved in
+order:
+
+1. A cached count for the same normalized statement and parameters. It is
+   tagged with the tables it reads, so writes to them invalidate it.
+2. The optimizer's row estimate from EXPLAIN (MySQL only). When it is at or
+   below COUNT_EXACT_THRESHOLD the exact COUNT(*) runs.
+3. Otherwise the estimate is returned and flagged as not exact.
+"""
+
+import logging
+from utils.cache import cache, make_key
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'count'
+
+class CountResult:
+    """A total and whether it is exact or an estimate"""
+
+    def __init__(self, total, exact=True):
+        self.total = total
+        self.exact = exact
+
+    def __repr__(self):
+        return f"<CountResult {self.total} {'exact' if self.exact else 'estimated'}>"
+
+def estimate_from_plan(plan):
+    """
+    Estimated result rows from EXPLAIN output
+
+    Args:
+        plan: EXPLAIN rows as dictionaries
+
+    Returns:
+        Product of rows * filtered% over the joined tables, as MySQL's
+        optimizer computes the fan-out, or None if no row has an estimate
+    """
+    estimate = None
+    for row in plan:
+        rows = row.get('rows')
+        if rows is None:
+            continue
+        estimate = (estimate or 1.0) * float(rows) * float(row.get('filtered') or 100) / 100
+    return None if estimate is None else int(estimate)
+
+class CountStrategy:
+    """
+    Chooses between cached, exact and estimated totals
+
+    Args:
+        exact_threshold: Estimated totals above this are not counted exactly
+        ttl: Seconds to cache exact counts
+        estimate_ttl: Seconds to cache estimates
+        mode: 'auto' to use estimates, 'exact' to always count
+    """
+
+    def __init__(self, exact_threshold=10000, ttl=300, estimate_ttl=60, mode='auto'):
+        self.exact_threshold = exact_threshold
+        self.ttl = ttl
+        self.estimate_ttl = estimate_ttl
+        self.mode = mode
+
+    def init_app(self, app):
+        """Load thresholds and cache lifetimes from app config"""
+        self.exact_threshold = app.config.get('COUNT_EXACT_THRESHOLD', self.exact_threshold)
+        self.ttl = app.config.get('COUNT_CACHE_TTL', self.ttl)
+        self.estimate_ttl = app.config.get('COUNT_ESTIMATE_CACHE_TTL', self.estimate_ttl)
+        self.mode = app.config.get('COUNT_STRATEGY', self.mode)
+
+    def count(self, signature, exact, estimate=None, tags=()):
+        """
+        Resolve a total
+
+        Args:
+            signature: Hashable description of the filtered statement
+            exact: Callable returning the exact count
+            estimate: Callable returning an estimated count or None
+            tags: Cache tags (table names) that invalidate the cached count
+
+        Returns:
+            CountResult
+        """
+        key = make_key(KEY_PREFIX, (signature,), {})
+        cached_count = cache.get(key)
+        if cached_count is not None:
+            return CountResult(*cached_count)
+
+        result = None
+        if estimate is not None and self.mode == 'auto':
+            try:
+                estimated = estimate()
+            except Exception as e:
+                logger.warning(f"Count estimate failed, counting exactly: {e}")
+                estimated = None
+            if estimated is not None and estimated > self.exact_threshold:
+                result = CountResult(estimated, exact=False)
+
+        if result is None:
+            result = CountResult(exact())
+
+        ttl = self.ttl if result.exact else self.estimate_ttl
+        cache.set(key, (result.total, result.exact), ttl, tags=list(tags))
+        return result
+
+    def count_sql(self, count_query, params, tables):
+        """
+        Count with a raw SQL statement
+
+        Args:
+            count_query: SELECT COUNT(*) AS count ... with the listing's filters
+            params: Query parameters
+            tables: Tables the statement reads, used as cache tags
+
+        Returns:
+            CountResult
+        """
+        from utils.db_manager import execute_query
+
+        params = list(params or ())
+
+        def exact():
+            row = execute_query(count_query, params, dictionary=True, fetchall=False)
+            return row['count'] if row else 0
+
+        def estimate():
+            return estimate_from_plan(execute_query(f"EXPLAIN {count_query}", params, dictionary=True))
+
+        signature = (' '.join(count_query.split()), tuple(params))
+        return self.count(signature, exact, estimate, tables)
+
+    def count_query(self, query):
+        """
+        Count the rows of a SQLAlchemy query
+
+        Args:
+            query: Query with filters applied
+
+        Returns:
+            CountResult
+        """
+        from sqlalchemy.sql.util import find_tables
+
+        query = query.order_by(None)
+        statement = query.statement
+        bind = query.session.get_bind()
+        compiled = statement.compile(dialect=bind.dialect)
+        tables = sorted({table.name for table in find_tables(statement, include_joins=True) if hasattr(table, 'name')})
+
+        estimate = None
+        if bind.dialect.name == 'mysql':
+            def estimate():
+                if compiled.positional:
+                    params = tuple(compiled.params[name] for name in compiled.positiontup)
+                else:
+                    params = compiled.params
+                result = query.session.connection().exec_driver_sql(f"EXPLAIN {compiled}", params)
+                return estimate_from_plan(result.mappings())
+
+        signature = (str(compiled), tuple(sorted(compiled.params.items())))
+        return self.count(signature, query.count, estimate, tables)
+
+# Create a singleton instance
+count_strategy = CountStrategy()
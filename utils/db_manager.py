@@ -1,29 +1,208 @@
-from flask_mysqldb import MySQL
-from app import mysql
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from flask import current_app, has_request_context
 from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from utils.cache import cache
+from utils.db_router import replica_router
+
+logger = logging.getLogger(__name__)
+
+# Matches the target table of INSERT/REPLACE/UPDATE/DELETE statements
+_WRITE_TABLE_RE = re.compile(
+    r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE(?:\s+IGNORE)?|DELETE\s+FROM)\s+`?(\w+)`?',
+    re.IGNORECASE
+)
+
+# Table and column names accepted by the bulk write helpers
+_IDENTIFIER_RE = re.compile(r'^\w+$')
+
+# Callbacks run after raw SQL writes, see on_write()
+_write_hooks = []
+
+def on_write(callback):
+    """
+    Register a callback run after a write by execute_update or insert_and_get_id commits
+
+    Args:
+        callback: Called with the list of written table names
+
+    Returns:
+        The callback, so this can be used as a decorator
+    """
+    _write_hooks.append(callback)
+    return callback
+
+def _written(query):
+    """Invalidate caches derived from the table a committed write modified"""
+    tables = tables_written(query)
+    if not tables:
+        return
+    cache.invalidate_tags(*tables)
+    for callback in _write_hooks:
+        try:
+            callback(tables)
+        except Exception as e:
+            logger.error(f"Write hook {callback.__name__} failed: {e}")
+
+def tables_written(query):
+    """
+    Get the table a write statement modifies
+
+    Args:
+        query: SQL query string
+
+    Returns:
+        List with the target table name, or an empty list for reads
+    """
+    match = _WRITE_TABLE_RE.match(query)
+    return [match.group(1).lower()] if match else []
+
+# Raw statements run on the ORM session's connection, so they share the
+# engine's pool and the session's transaction. Written tables are collected
+# per transaction and invalidated once it commits, like model writes.
+@event.listens_for(Session, 'after_commit')
+def _invalidate_raw_writes(session):
+    session.info.pop('raw_sql', None)
+    for query in session.info.pop('raw_writes', ()):
+        _written(query)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_raw_writes(session, previous_transaction):
+    session.info.pop('raw_sql', None)
+    session.info.pop('raw_writes', None)
+
+def _params(params):
+    # A list would be taken for executemany parameter sets
+    if params is None or isinstance(params, dict):
+        return params or ()
+    return tuple(params)
 
 @contextmanager
-def get_db_cursor(dictionary=False):
+def _session_connection(write_query=None):
     """
-    Context manager for database cursor
+    The ORM session's connection, in the session's transaction
+    
+    During a request the transaction commits once, before the response is
+    sent (see utils.db_pool.commit_request), together with any ORM work of
+    the request. Elsewhere, e.g. in scheduler jobs, each statement commits
+    when the block exits. A failed statement rolls the transaction back.
+    
+    Reads inside a read_only block may run on a replica (see
+    utils.db_router); writes always run on the primary and pin the user's
+    later reads to it.
     
     Args:
-        dictionary: If True, returns rows as dictionaries
+        write_query: The write statement run in the block, whose tables'
+            caches are invalidated after the commit
     
     Yields:
-        MySQL cursor
+        SQLAlchemy Connection
     """
-    cursor = mysql.connection.cursor(dictionary=dictionary) if dictionary else mysql.connection.cursor()
+    from models import db
+    session = db.session
+    if write_query is not None:
+        connection = session.connection(bind_arguments={'for_write': True})
+        replica_router.pin()
+    else:
+        connection = session.connection()
     try:
-        yield cursor
-        mysql.connection.commit()
+        yield connection
     except Exception as e:
-        mysql.connection.rollback()
+        session.rollback()
         raise e
-    finally:
-        cursor.close()
+    session.info['raw_sql'] = True
+    if write_query is not None:
+        session.info.setdefault('raw_writes', []).append(write_query)
+    if not has_request_context():
+        session.commit()
+
+def _fetch(result, dictionary, fetchall):
+    rows = result.mappings() if dictionary else result
+    convert = dict if dictionary else tuple
+    if fetchall:
+        return [convert(row) for row in rows]
+    row = rows.fetchone()
+    result.close()
+    return convert(row) if row is not None else None
 
-def execute_query(query, params=None, dictionary=False, fetchall=True):
+@contextmanager
+def get_db_cursor(dictionary=False):
+    """
+    Context manager for database cursor
+    
+    Args:
+        dictionary: If True, returns rows as dictionaries
+    
+    Yields:
+        DB-API cursor on the session's connection
+    """
+    with _session_connection() as connection:
+        dbapi_connection = connection.connection.dbapi_connection
+        if dictionary:
+            from pymysql.cursors import DictCursor
+            cursor = dbapi_connection.cursor(DictCursor)
+        else:
+            cursor = dbapi_connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+def _prepared_statements(connection):
+    """Names of the statements prepared on a connection, least recently used first"""
+    # info lives as long as the pooled DB-API connection
+    return connection.info.setdefault('prepared_statements', OrderedDict())
+
+def execute_prepared(query, params=None, dictionary=False, fetchall=True):
+    """
+    Execute a query as a server-side prepared statement
+    
+    The statement is prepared once per connection with PREPARE ... FROM and
+    later calls only bind parameters through user variables and EXECUTE, so
+    the server skips parsing and planning setup for repeated statements.
+    At most DB_PREPARED_STATEMENT_LIMIT statements stay prepared per
+    connection; the least recently used one is deallocated beyond that.
+    Pooled connections outlive requests, so a statement is prepared once
+    per connection rather than once per request.
+    
+    Args:
+        query: SQL query string with %s placeholders and a sequence of params
+        params: Query parameters (tuple or list)
+        dictionary: If True, returns rows as dictionaries
+        fetchall: If True, fetches all rows, otherwise fetches one
+    
+    Returns:
+        Query results
+    """
+    params = list(params or ())
+    name = 'stmt_' + hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+    limit = current_app.config.get('DB_PREPARED_STATEMENT_LIMIT', 64)
+    
+    with _session_connection() as connection:
+        statements = _prepared_statements(connection)
+        if name in statements:
+            statements.move_to_end(name)
+        else:
+            while len(statements) >= limit:
+                stale, _ = statements.popitem(last=False)
+                connection.exec_driver_sql(f"DEALLOCATE PREPARE {stale}")
+            connection.exec_driver_sql(f"PREPARE {name} FROM %s", (query.replace('%s', '?'),))
+            statements[name] = True
+        
+        if params:
+            variables = ', '.join(f"@p{i}" for i in range(len(params)))
+            connection.exec_driver_sql("SET " + ', '.join(f"@p{i} = %s" for i in range(len(params))), tuple(params))
+            result = connection.exec_driver_sql(f"EXECUTE {name} USING {variables}")
+        else:
+            result = connection.exec_driver_sql(f"EXECUTE {name}")
+        return _fetch(result, dictionary, fetchall)
+
+def execute_query(query, params=None, dictionary=False, fetchall=True, prepared=False):
     """
     Execute a database query
     
@@ -32,15 +211,64 @@ def execute_query(query, params=None, dictionary=False, fetchall=True):
         params: Query parameters (tuple or dictionary)
         dictionary: If True, returns rows as dictionaries
         fetchall: If True, fetches all rows, otherwise fetches one
+        prepared: Run it as a server-side prepared statement when
+            DB_PREPARED_STATEMENTS is enabled; meant for statements that
+            repeat with different parameters, such as QueryBuilder output
     
     Returns:
         Query results
     """
-    with get_db_cursor(dictionary) as cursor:
-        cursor.execute(query, params or ())
-        if fetchall:
-            return cursor.fetchall()
-        return cursor.fetchone()
+    if prepared and current_app.config.get('DB_PREPARED_STATEMENTS', False):
+        return execute_prepared(query, params, dictionary, fetchall)
+    
+    with _session_connection() as connection:
+        result = connection.exec_driver_sql(query, _params(params))
+        return _fetch(result, dictionary, fetchall)
+
+def iter_query(query, params=None, dictionary=False, batch_size=None, batches=False):
+    """
+    Stream a query's rows through a server-side cursor
+    
+    Rows are fetched from the server batch_size at a time instead of being
+    buffered whole, so memory is bounded by one batch however large the
+    result, and the query only advances as fast as the consumer iterates.
+    
+    The query runs on a pooled connection of its own, outside the session's
+    transaction: it doesn't see the session's uncommitted writes, and the
+    consumer may run other queries and commit while iterating. Inside a
+    read_only block that connection may come from a replica. The
+    connection goes back to the pool when the generator is exhausted or
+    closed.
+    
+    Args:
+        query: SQL query string
+        params: Query parameters (tuple or dictionary)
+        dictionary: If True, returns rows as dictionaries
+        batch_size: Rows fetched per round trip, DB_STREAM_BATCH_SIZE by default
+        batches: If True, yields lists of up to batch_size rows
+    
+    Returns:
+        Generator of rows, or of lists of rows when batches is True
+    """
+    from models import db
+    batch_size = batch_size or current_app.config.get('DB_STREAM_BATCH_SIZE', 1000)
+    # Pick the engine now: a streamed response iterates after the view,
+    # outside its read_only block
+    engine = replica_router.read_engine() or db.engine
+    return _stream(engine, query, _params(params), dictionary, batch_size, batches)
+
+def _stream(engine, query, params, dictionary, batch_size, batches):
+    convert = dict if dictionary else tuple
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).exec_driver_sql(query, params)
+        if dictionary:
+            result = result.mappings()
+        for partition in result.partitions():
+            rows = [convert(row) for row in partition]
+            if batches:
+                yield rows
+            else:
+                yield from rows
 
 def execute_update(query, params=None):
     """
@@ -53,9 +281,9 @@ def execute_update(query, params=None):
     Returns:
         Number of affected rows
     """
-    with get_db_cursor() as cursor:
-        cursor.execute(query, params or ())
-        return cursor.rowcount
+    # Cache entries derived from the written table are dropped once it commits
+    with _session_connection(write_query=query) as connection:
+        return connection.exec_driver_sql(query, _params(params)).rowcount
 
 def insert_and_get_id(query, params=None):
     """
@@ -68,6 +296,163 @@ def insert_and_get_id(query, params=None):
     Returns:
         Last inserted ID
     """
-    with get_db_cursor() as cursor:
-        cursor.execute(query, params or ())
-        return cursor.lastrowid
\ No newline at end of file
+    with _session_connection(write_query=query) as connection:
+        return connection.exec_driver_sql(query, _params(params)).lastrowid
+
+class BulkWriteResult:
+    """
+    Outcome and throughput of a bulk write
+    
+    Attributes:
+        rows: Input rows written
+        rowcount: Affected rows reported by the server (an upsert counts 2
+            per updated row)
+        statements: Statements sent, one per batch
+        seconds: Wall time of all batches
+    """
+    
+    def __init__(self, rows=0, rowcount=0, statements=0, seconds=0.0):
+        self.rows = rows
+        self.rowcount = rowcount
+        self.statements = statements
+        self.seconds = seconds
+    
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else None
+    
+    def to_dict(self):
+        rate = self.rows_per_second
+        return {
+            'rows': self.rows,
+            'rowcount': self.rowcount,
+            'statements': self.statements,
+            'seconds': round(self.seconds, 6),
+            'rows_per_second': round(rate, 1) if rate is not None else None
+        }
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row if isinstance(row, dict) else tuple(row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _identifier(name):
+    if not _IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return f"`{name}`"
+
+def _bulk_write(name, write_query, rows, batch_size, write):
+    """
+    Run write(connection, batch) over batches of rows in one transaction
+    
+    Args:
+        name: Label of the write in the throughput log
+        write_query: A statement of the write, for cache invalidation
+        rows: Iterable of value tuples
+        batch_size: Rows per batch, DB_BULK_BATCH_SIZE by default
+        write: Callable running one batch and returning its rowcount
+    
+    Returns:
+        BulkWriteResult
+    """
+    batch_size = batch_size or current_app.config.get('DB_BULK_BATCH_SIZE', 500)
+    result = BulkWriteResult()
+    started = time.perf_counter()
+    with _session_connection(write_query=write_query) as connection:
+        for batch in _batches(rows, batch_size):
+            result.rowcount += max(write(connection, batch), 0)
+            result.rows += len(batch)
+            result.statements += 1
+    result.seconds = time.perf_counter() - started
+    
+    logger.info(
+        f"{name}: {result.rows} rows in {result.statements} statements, "
+        f"{result.seconds:.3f}s ({result.rows_per_second or 0:.0f} rows/s)"
+    )
+    return result
+
+def execute_many(query, params_seq, batch_size=None):
+    """
+    Execute a statement once per parameter set, batch_size sets per round trip
+    
+    Goes through the driver's executemany, which rewrites a plain
+    INSERT ... VALUES (%s, ...) into multi-row INSERTs; other statements are
+    sent one per parameter set but in a single transaction.
+    
+    Args:
+        query: SQL query string
+        params_seq: Iterable of parameter tuples (or dictionaries)
+        batch_size: Parameter sets per executemany call, DB_BULK_BATCH_SIZE
+            by default
+    
+    Returns:
+        BulkWriteResult
+    """
+    def write(connection, batch):
+        return connection.exec_driver_sql(query, batch).rowcount
+    
+    return _bulk_write('execute_many', query, params_seq, batch_size, write)
+
+def _insert_sql(table, columns, size, ignore=False):
+    row = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    return (
+        f"INSERT {'IGNORE ' if ignore else ''}INTO {_identifier(table)} "
+        f"({', '.join(_identifier(column) for column in columns)}) "
+        f"VALUES {', '.join([row] * size)}"
+    )
+
+def insert_many(table, columns, rows, batch_size=None, ignore=False):
+    """
+    Insert rows with multi-row INSERT ... VALUES (...), (...) statements
+    
+    Args:
+        table: Table name
+        columns: Column names, in the order of each row's values
+        rows: Iterable of value tuples
+        batch_size: Rows per statement, DB_BULK_BATCH_SIZE by default
+        ignore: Use INSERT IGNORE to skip rows that violate unique keys
+    
+    Returns:
+        BulkWriteResult
+    """
+    def write(connection, batch):
+        query = _insert_sql(table, columns, len(batch), ignore)
+        params = tuple(value for row in batch for value in row)
+        return connection.exec_driver_sql(query, params).rowcount
+    
+    return _bulk_write(f"insert_many({table})", _insert_sql(table, columns, 1), rows, batch_size, write)
+
+def upsert_many(table, columns, rows, update_columns=None, batch_size=None):
+    """
+    Insert rows, updating the existing row on a duplicate key
+    
+    Args:
+        table: Table name
+        columns: Column names, in the order of each row's values
+        rows: Iterable of value tuples
+        update_columns: Columns overwritten with the new row's values when
+            a row with the same primary or unique key exists; defaults to
+            all columns
+        batch_size: Rows per statement, DB_BULK_BATCH_SIZE by default
+    
+    Returns:
+        BulkWriteResult
+    """
+    # VALUES(col) rather than a row alias keeps MySQL 5.7 and MariaDB working
+    updates = ', '.join(
+        f"{_identifier(column)} = VALUES({_identifier(column)})"
+        for column in (update_columns or columns)
+    )
+    
+    def write(connection, batch):
+        query = _insert_sql(table, columns, len(batch)) + f" ON DUPLICATE KEY UPDATE {updates}"
+        params = tuple(value for row in batch for value in row)
+        return connection.exec_driver_sql(query, params).rowcount
+    
+    return _bulk_write(f"upsert_many({table})", _insert_sql(table, columns, 1), rows, batch_size, write)
+
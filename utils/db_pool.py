@@ -0,0 +1,181 @@
+"""
+Pool settings and instrumentation of the shared SQLAlchemy engine
+
+Raw SQL from db_manager and the ORM models go through the same engine, so a
+worker keeps one pool of MySQL connections. Its size, overflow, checkout
+timeout and recycle age come from the DB_POOL_* settings (see
+SQLALCHEMY_ENGINE_OPTIONS in config.py), and connections are pinged before
+they are handed out so one the server dropped is replaced instead of failing
+the query.
+
+The engine uses InstrumentedQueuePool, which counts checkouts, new
+connections, invalidated connections and checkout timeouts, and measures how
+long checkouts wait when every connection is in use. init_app must run before
+db.init_app, which creates the engine.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+class PoolStats:
+    """Checkout and wait-time counters of the engine's pool"""
+
+    FIELDS = ('checkouts', 'waits', 'timeouts', 'connects', 'invalidations')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero all counters"""
+        with self._lock:
+            self.counters = dict.fromkeys(self.FIELDS, 0)
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def record(self, field, amount=1):
+        with self._lock:
+            self.counters[field] += amount
+
+    def record_wait(self, seconds):
+        """Record the time a checkout spent waiting for a free connection"""
+        with self._lock:
+            self.counters['waits'] += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[index] += 1
+
+    def snapshot(self):
+        """Copy of the counters with the average wait"""
+        with self._lock:
+            result = dict(self.counters)
+            result['wait_seconds'] = round(self.wait_seconds, 6)
+            result['max_wait_seconds'] = round(self.max_wait_seconds, 6)
+        waits = result['waits']
+        result['avg_wait_seconds'] = round(result['wait_seconds'] / waits, 6) if waits else None
+        return result
+
+    def render_metrics(self, gauges=None, namespace='library_db_pool'):
+        """
+        Render counters in the Prometheus text exposition format
+
+        Args:
+            gauges: Optional dictionary of extra gauge values (e.g. idle)
+            namespace: Metric name prefix
+
+        Returns:
+            Metrics text
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            buckets = list(self.wait_buckets)
+            wait_seconds = self.wait_seconds
+
+        lines = []
+        for field in self.FIELDS:
+            name = f"{namespace}_{field}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {counters[field]}")
+
+        # Every checkout is an observation; ones that didn't wait count as 0s
+        name = f"{namespace}_checkout_wait_seconds"
+        lines.append(f"# TYPE {name} histogram")
+        no_wait = counters['checkouts'] - counters['waits']
+        for bound, count in zip(WAIT_BUCKETS, buckets):
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count + no_wait}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {counters["checkouts"]}')
+        lines.append(f"{name}_sum {wait_seconds}")
+        lines.append(f"{name}_count {counters['checkouts']}")
+
+        for gauge, value in (gauges or {}).items():
+            name = f"{namespace}_{gauge}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+def instrumented_pool_class(stats):
+    """
+    QueuePool subclass recording its checkouts in stats
+
+    Args:
+        stats: PoolStats to record into
+
+    Returns:
+        Pool class for the engine's poolclass option
+    """
+    from sqlalchemy import event
+    from sqlalchemy.exc import TimeoutError as PoolTimeout
+    from sqlalchemy.pool import QueuePool
+
+    class InstrumentedQueuePool(QueuePool):
+        def _do_get(self):
+            # Every connection is checked out: this checkout waits for a checkin
+            exhausted = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+            started = time.monotonic()
+            try:
+                connection = super()._do_get()
+            except PoolTimeout:
+                stats.record('timeouts')
+                raise
+            if exhausted:
+                stats.record_wait(time.monotonic() - started)
+            stats.record('checkouts')
+            return connection
+
+    event.listen(InstrumentedQueuePool, 'connect', lambda *args: stats.record('connects'))
+    event.listen(InstrumentedQueuePool, 'invalidate', lambda *args: stats.record('invalidations'))
+    return InstrumentedQueuePool
+
+def commit_request(response):
+    """
+    after_request handler: commit the request's raw SQL
+
+    db_manager statements join the session's transaction instead of
+    committing one by one; it commits here, before the response is sent, so
+    a failed commit is an error response. Error responses are left to the
+    session teardown, which rolls back.
+    """
+    from models import db
+    if response.status_code < 500 and db.session.info.get('raw_sql'):
+        db.session.commit()
+    return response
+
+class DatabasePool:
+    """Pool options and counters of the shared engine"""
+
+    def __init__(self):
+        self.stats = PoolStats()
+        self._pool_class = None
+
+    def init_app(self, app):
+        """Instrument the engine's pool and commit raw SQL per request; call before db.init_app"""
+        if self._pool_class is None:
+            self._pool_class = instrumented_pool_class(self.stats)
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        options['poolclass'] = self._pool_class
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        app.after_request(commit_request)
+
+    def status(self):
+        """Current occupancy of the engine's pool"""
+        from models import db
+        pool = db.engine.pool
+        return {
+            'size': pool.size(),
+            'overflow': pool.overflow(),
+            'idle': pool.checkedin(),
+            'checked_out': pool.checkedout()
+        }
+
+# Create a singleton instance
+db_pool = DatabasePool()
@@ -0,0 +1,270 @@
+"""
+Read-replica routing for read-only work
+
+Code marked with read_only (searches, reports, dashboard statistics, audit
+browsing) runs its ORM queries and raw SQL on a replica from
+DB_REPLICA_URLS; everything else, and every write, goes to the primary.
+
+A replica is only used while its replication lag, measured at most every
+DB_REPLICA_LAG_CHECK_INTERVAL seconds, is within DB_REPLICA_MAX_LAG
+seconds. A replica that lags, has replication stopped or can't be reached
+is skipped until its next check, and reads fall back to the primary when no
+replica qualifies.
+
+Read-your-writes: a write pins the rest of the request to the primary, and
+the user's session for DB_READ_YOUR_WRITES_SECONDS more, so a user never
+reads from a replica that hasn't caught up with their own change yet.
+
+Replica DSNs are SQLAlchemy URLs; a second local MySQL, or a SQLite file
+(which reports no lag), can stand in for tests.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_app_context, has_request_context, session
+
+logger = logging.getLogger(__name__)
+
+PIN_SESSION_KEY = 'db_pinned_until'
+
+def measure_lag(engine):
+    """
+    Replication lag of a replica in seconds
+
+    Returns:
+        Seconds behind the primary, 0 for databases without replication
+        (e.g. SQLite), or None when replication isn't running
+    """
+    if engine.dialect.name != 'mysql':
+        return 0
+    with engine.connect() as connection:
+        try:
+            status = connection.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+            field = 'Seconds_Behind_Source'
+        except Exception:
+            # MySQL before 8.0.22 and MariaDB
+            connection.rollback()
+            status = connection.exec_driver_sql("SHOW SLAVE STATUS").mappings().first()
+            field = 'Seconds_Behind_Master'
+    if status is None:
+        # Not configured as a replica
+        return None
+    return status[field]
+
+class Replica:
+    """
+    A replica engine with its last measured lag
+
+    Args:
+        name: Label used in stats, e.g. the host
+        engine: SQLAlchemy engine of the replica
+        lag_probe: Callable taking the engine and returning its lag, see
+            measure_lag()
+    """
+
+    def __init__(self, name, engine, lag_probe=measure_lag):
+        self.name = name
+        self.engine = engine
+        self.lag_probe = lag_probe
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+        self.checking = False
+
+    def check(self):
+        """Measure the lag now"""
+        try:
+            self.lag = self.lag_probe(self.engine)
+            self.error = None
+        except Exception as e:
+            logger.warning(f"Replica {self.name} lag check failed: {e}")
+            self.lag = None
+            self.error = str(e)
+        self.checked_at = time.monotonic()
+
+    def to_dict(self):
+        return {'name': self.name, 'lag': self.lag, 'error': self.error}
+
+class ReplicaRouter:
+    """
+    Picks the engine for read-only work
+
+    Args:
+        max_lag: Seconds of replication lag a replica may have
+        check_interval: Seconds between lag checks of a replica
+        pin_seconds: Seconds a user's reads stay on the primary after a write
+    """
+
+    def __init__(self, max_lag=5, check_interval=10, pin_seconds=10):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds
+        self.replicas = []
+        self.counters = dict.fromkeys(('replica_reads', 'primary_fallbacks', 'pinned_reads'), 0)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def init_app(self, app):
+        """Create replica engines from DB_REPLICA_URLS and pin sessions after writes"""
+        self.max_lag = app.config.get('DB_REPLICA_MAX_LAG', self.max_lag)
+        self.check_interval = app.config.get('DB_REPLICA_LAG_CHECK_INTERVAL', self.check_interval)
+        self.pin_seconds = app.config.get('DB_READ_YOUR_WRITES_SECONDS', self.pin_seconds)
+        urls = app.config.get('DB_REPLICA_URLS') or []
+        if not urls:
+            return
+
+        from sqlalchemy import create_engine
+        from sqlalchemy.engine import make_url
+        options = {
+            key: value for key, value in (app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}).items()
+            if key != 'poolclass'
+        }
+        for url in urls:
+            url = make_url(url)
+            engine_options = options if url.get_backend_name() == 'mysql' else {}
+            self.replicas.append(Replica(url.host or url.database, create_engine(url, **engine_options)))
+        logger.info(f"Routing read-only work to {len(self.replicas)} replica(s)")
+
+    def add_replica(self, replica):
+        self.replicas.append(replica)
+
+    def _claim_check(self, replica):
+        """Whether the caller should measure the replica's lag; call holding the lock"""
+        if replica.checking:
+            return False
+        if replica.checked_at is None or time.monotonic() - replica.checked_at >= self.check_interval:
+            replica.checking = True
+            return True
+        return False
+
+    def _fresh(self, replica):
+        return replica.lag is not None and replica.lag <= self.max_lag
+
+    def choose(self):
+        """
+        Next replica within the lag limit, round robin
+
+        Lag checks run outside the lock, so a slow or unreachable replica
+        doesn't hold up other requests; only one request checks a replica at
+        a time, the others use its last measurement.
+
+        Returns:
+            Replica, or None when every replica lags or is down
+        """
+        count = len(self.replicas)
+        for offset in range(count):
+            with self._lock:
+                position = (self._next + offset) % count
+                replica = self.replicas[position]
+                check = self._claim_check(replica)
+            if check:
+                try:
+                    replica.check()
+                finally:
+                    replica.checking = False
+            with self._lock:
+                if self._fresh(replica):
+                    self._next = (position + 1) % count
+                    return replica
+        return None
+
+    def read_engine(self):
+        """
+        Engine for the current read-only work
+
+        Returns:
+            A replica's engine, or None to use the primary
+        """
+        if not self.enabled or not reading_only():
+            return None
+        if self.pinned():
+            self._record('pinned_reads')
+            return None
+        replica = self.choose()
+        if replica is None:
+            self._record('primary_fallbacks')
+            return None
+        self._record('replica_reads')
+        return replica.engine
+
+    def pin(self):
+        """Keep the current request, and the user's session for a while, on the primary"""
+        if not has_app_context():
+            return
+        g._db_pinned = True
+        if has_request_context() and self.enabled and self.pin_seconds:
+            session[PIN_SESSION_KEY] = time.time() + self.pin_seconds
+
+    def pinned(self):
+        """Whether reads must see this request's or this session's recent writes"""
+        if g.get('_db_pinned'):
+            return True
+        return has_request_context() and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+    def _record(self, field):
+        with self._lock:
+            self.counters[field] += 1
+
+    def get_stats(self):
+        with self._lock:
+            result = dict(self.counters)
+        result['replicas'] = [replica.to_dict() for replica in self.replicas]
+        return result
+
+def reading_only():
+    """Whether the current code runs inside a read_only block"""
+    return has_app_context() and g.get('_db_read_only', 0) > 0
+
+@contextmanager
+def read_only_block():
+    """Route the block's reads to a replica when one is available"""
+    if not has_app_context():
+        yield
+        return
+    g._db_read_only = g.get('_db_read_only', 0) + 1
+    try:
+        yield
+    finally:
+        g._db_read_only -= 1
+
+def read_only(f):
+    """Decorator routing a function's reads to a replica when one is available"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with read_only_block():
+            return f(*args, **kwargs)
+    return decorated_function
+
+def routing_session_class():
+    """
+    Flask-SQLAlchemy session class sending read_only work to replicas
+
+    Returns:
+        Session class for the SQLAlchemy session_options
+    """
+    from flask_sqlalchemy.session import Session
+    from sqlalchemy import event
+
+    class RoutingSession(Session):
+        def get_bind(self, mapper=None, clause=None, bind=None, for_write=False, **kwargs):
+            if bind is None and not for_write and not self._flushing:
+                engine = replica_router.read_engine()
+                if engine is not None:
+                    return engine
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    @event.listens_for(RoutingSession, 'after_flush')
+    def _pin_after_write(session, flush_context):
+        replica_router.pin()
+
+    return RoutingSession
+
+# Create a singleton instance
+replica_router = ReplicaRouter()
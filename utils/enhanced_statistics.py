@@ -1,7 +1,9 @@
 from utils.db_manager import execute_query  # Adjust the import path as needed
+from utils.db_router import read_only
 
 class EnhancedStatistics:
     @staticmethod
+    @read_only
     def get_branch_statistics(branch_id=None):
         """Get statistics for a specific branch or all branches"""
         base_query = """
@@ -29,6 +31,7 @@ class EnhancedStatistics:
         return execute_query(base_query, params, dictionary=True)
     
     @staticmethod
+    @read_only
     def get_membership_statistics():
         """Get membership type statistics"""
         query = """
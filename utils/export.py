@@ -1,8 +1,10 @@
 import csv
 import io
-from flask import make_response
+from flask import Response, make_response, stream_with_context
 from datetime import datetime
-import pdfkit  # You'll need to install this: pip install pdfkit
+
+# Bytes of CSV buffered before a chunk is sent
+CSV_CHUNK_SIZE = 64 * 1024
 
 def export_to_csv(data, filename, headers=None):
     """
@@ -38,6 +40,61 @@ def export_to_csv(data, filename, headers=None):
     
     return output
 
+def iter_csv(rows, headers=None, chunk_size=CSV_CHUNK_SIZE):
+    """
+    Encode rows as CSV text in chunks
+    
+    Args:
+        rows: Iterable of dictionaries or tuples
+        headers: List of column headers (optional; taken from the first
+            dictionary otherwise)
+        chunk_size: Characters buffered before a chunk is yielded
+    
+    Yields:
+        CSV text chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if headers:
+        writer.writerow(headers)
+    
+    first = True
+    for row in rows:
+        if isinstance(row, dict):
+            if first and not headers:
+                writer.writerow(row.keys())
+            row = row.values()
+        first = False
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_csv(rows, filename, headers=None):
+    """
+    Export rows to a CSV file streamed as it is written
+    
+    Unlike export_to_csv the file is never held whole: chunks are produced
+    as the client reads them, and rows from a generator such as
+    db_manager.iter_query are only fetched as fast as the download
+    proceeds.
+    
+    Args:
+        rows: Iterable of dictionaries or tuples
+        filename: Name of the file to be downloaded
+        headers: List of column headers (optional)
+    
+    Returns:
+        Streaming Flask response with CSV attachment
+    """
+    output = Response(stream_with_context(iter_csv(rows, headers)), mimetype='text/csv')
+    output.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return output
+
 def export_to_pdf(data, filename, headers=None, title="Exported Data"):
     """
     Export data to PDF file
@@ -111,6 +168,7 @@ def export_to_pdf(data, filename, headers=None, title="Exported Data"):
     """
     
     # Convert HTML to PDF
+    import pdfkit  # You'll need to install this: pip install pdfkit
     pdf = pdfkit.from_string(html_content, False)
     
     # Create response
@@ -0,0 +1,83 @@
+"""
+Facet counts for the advanced book search
+
+Counts for every facet come from one grouped pass instead of one GROUP BY
+per facet: the filtered books are grouped by the combination of their
+single-valued facet columns, and fold_groups() sums each group into every
+facet it belongs to. Tags are many-to-many, so they are counted with one
+extra grouped query over the same filtered book IDs.
+
+Counts are conjunctive: they describe the current result set, so a value
+of a facet that is already filtered on only counts the matching books.
+"""
+
+FACET_FIELDS = ('category_id', 'publisher_id', 'publication_year', 'availability')
+
+_INT_FILTERS = ('category_id', 'publisher_id', 'year_from', 'year_to')
+_TEXT_FILTERS = ('title', 'author', 'isbn')
+_TAG_FILTERS = ('tags', 'all_tags', 'exclude_tags')
+
+def normalize_filters(filters):
+    """
+    Canonical form of advanced search filters, used as the cache signature
+
+    Empty values are dropped, IDs and years become ints, text is trimmed
+    and lower-cased, and tag IDs are de-duplicated and sorted, so equivalent
+    requests share one cache entry.
+
+    Args:
+        filters: Filters as passed to EnhancedBook.search_advanced
+
+    Returns:
+        Normalized dictionary
+
+    Raises:
+        ValueError: If a numeric filter isn't a number
+    """
+    normalized = {}
+    for name in _TEXT_FILTERS:
+        value = ' '.join(str(filters.get(name) or '').split()).lower()
+        if value:
+            normalized[name] = value
+    for name in _INT_FILTERS:
+        value = filters.get(name)
+        if value not in (None, ''):
+            normalized[name] = int(value)
+    available_only = filters.get('available_only')
+    if isinstance(available_only, str):
+        available_only = available_only.lower() in ('true', '1', 't', 'on')
+    if available_only:
+        normalized['available_only'] = True
+    for name in _TAG_FILTERS:
+        tags = filters.get(name)
+        if tags:
+            normalized[name] = sorted({int(tag) for tag in tags})
+    return normalized
+
+def fold_groups(groups):
+    """
+    Sum grouped counts into per-facet value counts in one pass
+
+    Args:
+        groups: Iterable of (category_id, publisher_id, publication_year,
+            available, count) rows
+
+    Returns:
+        Dictionary of facet name to {value: count}
+    """
+    facets = {name: {} for name in FACET_FIELDS}
+    categories = facets['category_id']
+    publishers = facets['publisher_id']
+    years = facets['publication_year']
+    availability = facets['availability']
+
+    for category_id, publisher_id, year, available, count in groups:
+        if category_id is not None:
+            categories[category_id] = categories.get(category_id, 0) + count
+        if publisher_id is not None:
+            publishers[publisher_id] = publishers.get(publisher_id, 0) + count
+        if year is not None:
+            years[year] = years.get(year, 0) + count
+        state = 'available' if available else 'unavailable'
+        availability[state] = availability.get(state, 0) + count
+    return facets
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import request, abort, current_app, make_response
+from flask import request, abort, current_app, make_response, g
 from utils.security import Security
 from utils.logger import get_logger
 import logging
@@ -17,6 +17,15 @@ def security_headers(response):
     response.headers['Content-Security-Policy'] = "default-src 'self'"
     return response
 
+def rate_limit_headers(response):
+    """
+    Add the remaining rate limit quota to the response.
+    """
+    result = getattr(g, 'rate_limit', None)
+    if result is not None:
+        response.headers.update(result.headers())
+    return response
+
 def validate_request():
     """
     Global middleware to validate request data.
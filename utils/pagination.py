@@ -1,31 +1,66 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
 from math import ceil
 from flask import request, url_for
 
+class InvalidCursor(ValueError):
+    """Raised for a cursor token that is malformed or was issued for another sort order"""
+
 class Pagination:
-    def __init__(self, page, per_page, total_count):
+    """
+    Page metadata for offset or keyset (cursor) pagination
+
+    In offset mode page is the page number. In cursor mode page is None and
+    cursor is the token the page was fetched with. Either mode may carry a
+    next_cursor to continue from the last row of the page. total_exact is
+    False when total_count is an estimate; has_more then tells whether rows
+    follow the page, for orderings that can't hand out a cursor.
+    """
+
+    def __init__(self, page, per_page, total_count, cursor=None, next_cursor=None, total_exact=True,
+                 has_more=None):
         self.page = page
         self.per_page = per_page
         self.total_count = total_count
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.total_exact = total_exact
+        self.has_more = has_more
+    
+    @property
+    def mode(self):
+        """'cursor' for keyset pages, 'offset' for numbered pages"""
+        return 'cursor' if self.cursor else 'offset'
     
     @property
     def pages(self):
         """Total number of pages"""
+        if self.total_count is None:
+            return None
         return ceil(self.total_count / self.per_page)
     
     @property
     def has_prev(self):
         """True if a previous page exists"""
+        if self.cursor:
+            return True
         return self.page > 1
     
     @property
     def has_next(self):
         """True if a next page exists"""
+        if self.cursor or self.total_count is None or not self.total_exact:
+            if self.has_more is not None:
+                return self.has_more
+            return self.next_cursor is not None
         return self.page < self.pages
     
     @property
     def offset(self):
         """Offset for SQL query"""
-        return (self.page - 1) * self.per_page
+        return (self.page - 1) * self.per_page if self.page else 0
     
     def get_page_items(self, items):
         """Get items for current page"""
@@ -39,9 +74,11 @@ class Pagination:
             'page': self.page,
             'per_page': self.per_page,
             'total': self.total_count,
+            'total_exact': self.total_exact,
             'pages': self.pages,
             'has_prev': self.has_prev,
-            'has_next': self.has_next
+            'has_next': self.has_next,
+            'next_cursor': self.next_cursor
         }
     
     def iter_pages(self, left_edge=2, left_current=2, right_current=5, right_edge=2):
@@ -57,6 +94,8 @@ class Pagination:
         Yields:
             Page numbers for pagination
         """
+        if self.page is None or self.pages is None:
+            return
         last = 0
         for num in range(1, self.pages + 1):
             if (num <= left_edge or
@@ -82,4 +121,151 @@ def get_pagination_args():
         page = 1
         per_page = 10
     
-    return page, per_page
\ No newline at end of file
+    return page, per_page
+
+def get_cursor_arg():
+    """Get the cursor token from the request, or None for offset pagination"""
+    return request.args.get('cursor') or None
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        return date.fromisoformat(value['d'])
+    return value
+
+def encode_cursor(sort, values):
+    """
+    Build an opaque cursor token for a keyset position
+
+    Args:
+        sort: Sort identifier, e.g. 'title:asc'; a cursor only works with
+            the sort it was issued for
+        values: Sort column value and primary key of the last row
+
+    Returns:
+        URL-safe token
+    """
+    payload = json.dumps({'s': sort, 'v': [_encode_value(value) for value in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b'=').decode()
+
+def decode_cursor(token, sort):
+    """
+    Decode a cursor token built by encode_cursor
+
+    Args:
+        token: Cursor token from the request
+        sort: Sort identifier of the current request
+
+    Returns:
+        List of [sort column value, primary key]
+
+    Raises:
+        InvalidCursor: If the token is malformed or for another sort
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = [_decode_value(value) for value in payload['v']]
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        raise InvalidCursor('Invalid pagination cursor')
+    if payload.get('s') != sort or len(values) != 2:
+        raise InvalidCursor('Pagination cursor does not match the requested sort order')
+    return values
+
+def keyset_condition(column, key_column, values, descending=False, nullable=False):
+    """
+    SQL condition for rows after a cursor position in (column, key_column) order
+
+    NULLs sort first ascending and last descending, as in MySQL.
+
+    Args:
+        column: Sort column expression, e.g. 'b.title'
+        key_column: Primary key column expression, e.g. 'b.book_id'
+        values: Decoded cursor values [sort value, key]
+        descending: True for descending order
+        nullable: Whether the sort column can be NULL
+
+    Returns:
+        Tuple (sql, params)
+    """
+    value, key = values
+    op = '<' if descending else '>'
+    if column == key_column:
+        return f"{key_column} {op} %s", [key]
+    if value is None:
+        sql = f"({column} IS NULL AND {key_column} {op} %s)"
+        if not descending:
+            sql = f"({sql} OR {column} IS NOT NULL)"
+        return sql, [key]
+
+    # The redundant range on the sort column lets MySQL use its index
+    sql = f"({column} {op}= %s AND ({column} {op} %s OR {key_column} {op} %s))"
+    if descending and nullable:
+        sql = f"({sql} OR {column} IS NULL)"
+    return sql, [value, value, key]
+
+def keyset_filter(column, key_column, values, descending=False):
+    """SQLAlchemy version of keyset_condition"""
+    from sqlalchemy import and_, or_
+    value, key = values
+    after = (lambda a, b: a < b) if descending else (lambda a, b: a > b)
+    if column is key_column:
+        return after(key_column, key)
+    if value is None:
+        condition = and_(column.is_(None), after(key_column, key))
+        return condition if descending else or_(condition, column.isnot(None))
+
+    at_or_after = column <= value if descending else column >= value
+    condition = and_(at_or_after, or_(after(column, value), after(key_column, key)))
+    return or_(condition, column.is_(None)) if descending else condition
+
+def paginate_query(query, sort_column, key_column, descending=False):
+    """
+    Paginate a SQLAlchemy query by page number, or by keyset when the
+    request has a cursor
+
+    Rows are ordered by (sort_column, key_column) so every page, in either
+    mode, can hand out a next_cursor. Keyset pages cost the same at any depth.
+
+    Args:
+        query: SQLAlchemy query with filters applied
+        sort_column: Model attribute to sort by
+        key_column: Primary key attribute used as the tie-breaker
+        descending: True for descending order
+
+    Returns:
+        Tuple (items, Pagination)
+
+    Raises:
+        InvalidCursor: If the request's cursor is malformed
+    """
+    page, per_page = get_pagination_args()
+    cursor = get_cursor_arg()
+    sort = f"{sort_column.key}:{'desc' if descending else 'asc'}"
+
+    from utils.counting import count_strategy
+    total = count_strategy.count_query(query)
+
+    # ORDER BY before OFFSET/LIMIT, which SQLAlchemy enforces
+    columns = [key_column] if sort_column is key_column else [sort_column, key_column]
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if cursor:
+        query = query.filter(keyset_filter(sort_column, key_column, decode_cursor(cursor, sort), descending))
+    else:
+        query = query.offset((page - 1) * per_page)
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, [getattr(last, sort_column.key), getattr(last, key_column.key)])
+
+    return items, Pagination(None if cursor else page, per_page, total.total, cursor, next_cursor, total.exact)
@@ -0,0 +1,208 @@
+"""
+Compiled SQL for filtered, paginated listings
+
+A QueryBuilder declares a listing's columns, source and every WHERE
+condition it supports once. bind() takes one request's filter values and
+returns a BoundQuery that emits the unpaged, count, ordered-ID and page
+statements from the same WHERE clause, so they never drift apart.
+
+Statements are compiled once per filter shape: which conditions are active,
+plus the ordering and cursor condition for page statements. Requests with
+the same shape reuse the same SQL string, which lets the driver and server
+cache it (see execute_query(prepared=True)). List values such as ID sets
+are padded to the next power of two by repeating their last element, so
+an IN list adds a handful of shapes rather than one per length. The least
+recently used statements are dropped beyond max_statements.
+"""
+
+import threading
+from collections import OrderedDict
+
+MIN_LIST_SIZE = 8
+
+def list_bucket(size):
+    """Placeholder count used for a list of size values"""
+    bucket = MIN_LIST_SIZE
+    while bucket < size:
+        bucket *= 2
+    return bucket
+
+class Condition:
+    """
+    A WHERE fragment enabled by a filter value
+
+    Args:
+        sql: Fragment with %s placeholders; for list values '{}' marks
+            where the placeholders of the list go
+        repeat: Times the value is bound, e.g. 3 for one LIKE pattern over
+            three columns, or 0 for fragments without placeholders that are
+            enabled by a true value
+        expand: The value is a list bound as an IN list
+    """
+
+    def __init__(self, sql, repeat=1, expand=False):
+        self.sql = sql
+        self.repeat = repeat
+        self.expand = expand
+
+    def bind(self, value):
+        """
+        Shape and parameters for a value
+
+        Returns:
+            Tuple (size, params) where size is the padded list length for
+            expanded conditions and None otherwise
+        """
+        if self.expand:
+            values = list(value)
+            size = list_bucket(len(values))
+            return size, values + [values[-1]] * (size - len(values))
+        return None, [value] * self.repeat
+
+    def render(self, size):
+        if self.expand:
+            return self.sql.format(', '.join(['%s'] * size))
+        return self.sql
+
+def _is_active(value):
+    if value is None or value is False or value == '':
+        return False
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return bool(value)
+    return True
+
+class BoundQuery:
+    """A builder's statements bound to one request's filter values"""
+
+    def __init__(self, builder, shape, params):
+        self.builder = builder
+        self.shape = shape
+        self.params = params
+
+    def select(self):
+        """Unpaged statement and parameters"""
+        return self.builder.statement('select', self.shape), list(self.params)
+
+    def count(self):
+        """SELECT COUNT(*) AS count statement and parameters"""
+        return self.builder.statement('count', self.shape), list(self.params)
+
+    def ids(self, order_by, limit, order_params=()):
+        """
+        Statement and parameters selecting the ordered key column
+
+        Args:
+            order_by: ORDER BY clause without the keywords
+            limit: Rows to fetch
+            order_params: Parameters of placeholders in order_by
+
+        Returns:
+            Tuple (sql, params)
+        """
+        sql = self.builder.statement('ids', self.shape, order_by)
+        return sql, list(self.params) + list(order_params) + [limit]
+
+    def page(self, order_by, limit, offset=0, order_params=(), after=None):
+        """
+        Page statement and parameters
+
+        Args:
+            order_by: ORDER BY clause without the keywords
+            limit: Rows to fetch
+            offset: Rows to skip
+            order_params: Parameters of placeholders in order_by
+            after: Optional (sql, params) condition applied to the page only,
+                such as a keyset cursor from keyset_condition()
+
+        Returns:
+            Tuple (sql, params)
+        """
+        after_sql, after_params = after or (None, ())
+        sql = self.builder.statement('page', self.shape, order_by, after_sql)
+        params = list(self.params)
+        params.extend(after_params)
+        params.extend(order_params)
+        params.extend([limit, offset])
+        return sql, params
+
+class QueryBuilder:
+    """
+    Declares a listing query and caches its compiled statements
+
+    Args:
+        columns: Select list of the unpaged and page statements
+        source: FROM clause, e.g. 'books b'
+        conditions: Dictionary of filter name to Condition; active conditions
+            are combined with AND in declaration order
+        key_column: Unique column selected by BoundQuery.ids()
+        max_statements: Most compiled statements kept
+    """
+
+    def __init__(self, columns, source, conditions, key_column=None, max_statements=256):
+        self.columns = ' '.join(columns.split())
+        self.source = source
+        self.conditions = conditions
+        self.key_column = key_column
+        self.max_statements = max_statements
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bind(self, values):
+        """
+        Bind filter values
+
+        Args:
+            values: Dictionary of condition name to value; None, False, ''
+                and empty lists leave the condition out
+
+        Returns:
+            BoundQuery
+        """
+        shape = []
+        params = []
+        for name, condition in self.conditions.items():
+            value = values.get(name)
+            if not _is_active(value):
+                continue
+            size, condition_params = condition.bind(value)
+            shape.append((name, size))
+            params.extend(condition_params)
+        return BoundQuery(self, tuple(shape), params)
+
+    def statement(self, kind, shape, order_by=None, after_sql=None):
+        """Compiled 'select', 'count', 'ids' or 'page' statement for a shape"""
+        key = (kind, shape, order_by, after_sql)
+        with self._lock:
+            sql = self._statements.get(key)
+            if sql is not None:
+                self._statements.move_to_end(key)
+                return sql
+        sql = self._compile(kind, shape, order_by, after_sql)
+        with self._lock:
+            self._statements[key] = sql
+            while len(self._statements) > self.max_statements:
+                self._statements.popitem(last=False)
+        return sql
+
+    def _compile(self, kind, shape, order_by, after_sql):
+        conditions = [self.conditions[name].render(size) for name, size in shape]
+        if kind == 'count':
+            columns = 'COUNT(*) AS count'
+        elif kind == 'ids':
+            columns = self.key_column
+        else:
+            columns = self.columns
+        if kind == 'page' and after_sql:
+            conditions.append(after_sql)
+
+        sql = f"SELECT {columns} FROM {self.source}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if kind == 'page':
+            sql += f" ORDER BY {order_by} LIMIT %s OFFSET %s"
+        elif kind == 'ids':
+            sql += f" ORDER BY {order_by} LIMIT %s"
+        return sql
+
+    def __len__(self):
+        return len(self._statements)
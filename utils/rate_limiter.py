@@ -0,0 +1,220 @@
+"""
+Constant-memory rate limiting
+
+Each algorithm keeps a fixed-size state per key in the cache and decides in
+O(1), unlike a list of request timestamps that grows with the limit.
+
+- sliding_window: sliding-window counter. Two fixed-window counters are
+  weighted by how far the current window has progressed. Built on
+  cache.incr(), so it stays exact across workers on a shared backend.
+- token_bucket: bucket of `limit` tokens refilled evenly over `period`.
+- gcra: generic cell rate algorithm. Stores one timestamp, the theoretical
+  arrival time, per key.
+
+token_bucket and gcra do a read-modify-write that is serialized by striped
+in-process locks; on a shared backend concurrent workers can occasionally
+admit a request or two over the limit.
+"""
+
+import math
+import re
+import threading
+import time
+from utils.cache import cache
+
+KEY_PREFIX = 'rate_limit:'
+DEFAULT_ALGORITHM = 'sliding_window'
+
+_PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+_RATE_RE = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$', re.IGNORECASE)
+
+def parse_rate(rate):
+    """
+    Parse a rate string such as '100 per hour', '5/minute' or '10 per 30 seconds'
+
+    Returns:
+        Tuple (limit, period_in_seconds)
+    """
+    match = _RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {rate}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * _PERIODS[unit.lower()]
+
+class RateLimitResult:
+    """Outcome of a rate limit check"""
+
+    def __init__(self, allowed, limit, remaining, reset_after, retry_after=0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, remaining)
+        self.reset_after = max(0.0, reset_after)
+        self.retry_after = max(0.0, retry_after)
+
+    def headers(self):
+        """HTTP headers describing the remaining quota"""
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(math.ceil(self.retry_after))
+        return headers
+
+class RateLimitPolicy:
+    """
+    A limit applied to an endpoint
+
+    Args:
+        limit: Requests allowed per period
+        period: Period in seconds
+        algorithm: 'sliding_window', 'token_bucket' or 'gcra'
+        per: 'user' to count per logged-in user (falling back to IP), or 'ip'
+    """
+
+    def __init__(self, limit, period, algorithm=DEFAULT_ALGORITHM, per='user'):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        if per not in ('user', 'ip'):
+            raise ValueError(f"Unknown rate limit scope: {per}")
+
+        self.limit = limit
+        self.period = period
+        self.algorithm = algorithm
+        self.per = per
+
+    @classmethod
+    def from_config(cls, value, algorithm=DEFAULT_ALGORITHM):
+        """Build a policy from a rate string or a dict of constructor arguments"""
+        if isinstance(value, RateLimitPolicy):
+            return value
+        if isinstance(value, str):
+            limit, period = parse_rate(value)
+            return cls(limit, period, algorithm)
+
+        options = dict(value)
+        if 'rate' in options:
+            options['limit'], options['period'] = parse_rate(options.pop('rate'))
+        options.setdefault('algorithm', algorithm)
+        return cls(**options)
+
+def _sliding_window(key, limit, period, cost, now):
+    window = int(now // period)
+    elapsed = now - window * period
+    current_key = f"{key}:{window}"
+
+    count = cache.incr(current_key, cost, ttl=2 * period)
+    previous = cache.get(f"{key}:{window - 1}", 0)
+    weight = (period - elapsed) / period
+    estimate = previous * weight + count
+    reset_after = period - elapsed
+
+    if estimate > limit:
+        # Don't count rejected requests against the caller
+        cache.incr(current_key, -cost)
+        # The previous window's weight decays until the estimate fits again
+        retry_after = reset_after
+        if previous:
+            needed = previous * weight - (limit - (count - cost) - cost)
+            retry_after = min(reset_after, needed / previous * period)
+        return RateLimitResult(False, limit, 0, reset_after, retry_after)
+
+    return RateLimitResult(True, limit, int(limit - estimate), reset_after)
+
+def _token_bucket(key, limit, period, cost, now):
+    rate = limit / period
+    tokens, updated_at = cache.get(key, (float(limit), now))
+    tokens = min(float(limit), tokens + (now - updated_at) * rate)
+
+    if tokens < cost:
+        cache.set(key, (tokens, now), period)
+        return RateLimitResult(False, limit, 0, (limit - tokens) / rate, (cost - tokens) / rate)
+
+    tokens -= cost
+    cache.set(key, (tokens, now), period)
+    return RateLimitResult(True, limit, int(tokens), (limit - tokens) / rate)
+
+def _gcra(key, limit, period, cost, now):
+    interval = period / limit
+    tat = max(cache.get(key, now), now)
+    new_tat = tat + interval * cost
+    allow_at = new_tat - period
+
+    if now < allow_at:
+        return RateLimitResult(False, limit, 0, tat - now, allow_at - now)
+
+    cache.set(key, new_tat, period)
+    remaining = int((period - (new_tat - now)) / interval)
+    return RateLimitResult(True, limit, remaining, new_tat - now)
+
+ALGORITHMS = {
+    'sliding_window': _sliding_window,
+    'token_bucket': _token_bucket,
+    'gcra': _gcra
+}
+
+class RateLimiter:
+    """
+    Rate limiting engine with per-endpoint policies
+
+    Policies are looked up by Flask endpoint name from the RATELIMIT_POLICIES
+    config, e.g. {'auth.login': '5 per minute'}; other endpoints use the
+    default limit passed to check().
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self):
+        self.algorithm = DEFAULT_ALGORITHM
+        self.policies = {}
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def init_app(self, app):
+        """Load the default algorithm and endpoint policies from app config"""
+        self.algorithm = app.config.get('RATELIMIT_ALGORITHM', DEFAULT_ALGORITHM)
+        self.policies = {
+            endpoint: RateLimitPolicy.from_config(value, self.algorithm)
+            for endpoint, value in app.config.get('RATELIMIT_POLICIES', {}).items()
+        }
+
+    def policy_for(self, endpoint, limit, period):
+        """Get the policy for an endpoint, or a default one with the given limit"""
+        policy = self.policies.get(endpoint)
+        if policy is None:
+            policy = RateLimitPolicy(limit, period, self.algorithm, per='ip')
+        return policy
+
+    def hit(self, key, limit, period, algorithm=None, cost=1):
+        """
+        Record a request against key and decide whether it is allowed
+
+        Args:
+            key: Key to rate limit (e.g., IP address, user ID)
+            limit: Maximum number of requests per period
+            period: Time period in seconds
+            algorithm: Algorithm name (defaults to the configured one)
+            cost: Number of requests this call counts as
+
+        Returns:
+            RateLimitResult
+        """
+        algorithm = algorithm or self.algorithm
+        check = ALGORITHMS[algorithm]
+        cache_key = f"{KEY_PREFIX}{algorithm}:{key}"
+
+        if algorithm == 'sliding_window':
+            # Atomic through cache.incr, no lock needed
+            return check(cache_key, limit, period, cost, time.time())
+
+        with self._locks[hash(cache_key) % self.LOCK_STRIPES]:
+            return check(cache_key, limit, period, cost, time.time())
+
+# Create a singleton instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,294 @@
+"""
+Result-ID cache for book searches
+
+A search's full result is cached as its ordered list of book IDs, keyed by
+the normalized term, filters and sort. Any page is then a slice of the list
+and only that page's rows are read, by primary key.
+
+Entries are not tagged with the books table, since every book write would
+drop them all. Each entry instead keeps a SearchPredicate describing the
+rows it depends on, and the BaseModel commit hook drops only the entries a
+write can affect:
+
+- the written book is in the cached result (it may have left it or moved), or
+- the written row satisfies the predicate (it may have joined the result).
+
+Predicates are conservative: a clause whose column isn't in the written
+values, or that can't be checked in Python (fuzzy or boolean-mode text),
+counts as satisfied. Raw SQL writes through db_manager carry no row values,
+so they drop every entry that reads the written table.
+
+Entries, predicates included, live in a bounded in-process store and expire
+after SEARCH_RESULT_CACHE_TTL seconds; as with the search index, commit
+hooks only fire in the process that made the write, and the TTL bounds
+staleness in the other workers.
+"""
+
+import logging
+import operator
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+from utils.cache import MemoryStore, MISSING, make_key, stats
+from utils.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'search_ids'
+
+# Tables whose rows are keyed by book_id
+BOOK_TABLES = ('books', 'book_authors', 'book_tags')
+
+# Stored for results longer than max_ids, so they go straight to SQL
+TOO_LARGE = 'too_large'
+
+_OPERATORS = {
+    '=': operator.eq,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    'in': lambda value, values: value in values
+}
+
+# Characters that make a term more than a plain substring match: boolean
+# mode operators and LIKE wildcards
+_INEXACT_TERM_RE = re.compile(r'[-+~<>*"()@%_]')
+_SEPARATOR_RE = re.compile(r'[\W_]+')
+
+def fold(text):
+    """Lower-case text without accents, as the case-insensitive collations compare it"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+def normalize_term(search_term):
+    """Search term with case and whitespace differences removed"""
+    return ' '.join(fold(search_term or '').split())
+
+class SearchPredicate:
+    """
+    Conservative description of the rows a cached search depends on
+
+    Clauses are added with where(), text(), tagged() and related(); a
+    written row affects the entry unless some clause rules it out.
+    """
+
+    def __init__(self, table='books'):
+        self.table = table
+        self.clauses = []
+        self.texts = []
+        self.tags = None
+        self.any_tag = False
+        self.tables = set()
+
+    def where(self, field, op, value):
+        """Require field <op> value, op being '=', '>', '>=', '<=' or 'in'"""
+        self.clauses.append((field, _OPERATORS[op], value))
+        return self
+
+    def text(self, search_term, fields, exact=True):
+        """
+        Require the term's words in the given fields
+
+        Args:
+            search_term: Term as typed
+            fields: Columns of the table the term is matched against; rows
+                matched through other tables go in related()
+            exact: False when matches can't be checked by substring, e.g.
+                for typo-tolerant search
+        """
+        tokens = [fold(token) for token in tokenize(search_term)]
+        exact = exact and not _INEXACT_TERM_RE.search(search_term)
+        self.texts.append((tuple(fields), tokens if exact else None))
+        return self
+
+    def tagged(self, tag_ids=None):
+        """
+        Depend on book_tags rows with these tag IDs
+
+        Args:
+            tag_ids: Tag IDs, or None to depend on every book_tags row and on
+                tag names, e.g. for searches matching tag names
+        """
+        if tag_ids is None:
+            self.any_tag = True
+        self.tags = set(self.tags or ()) | set(tag_ids or ())
+        return self
+
+    def related(self, *tables):
+        """Depend on every write to these related tables, e.g. 'book_authors'"""
+        self.tables.update(tables)
+        return self
+
+    def related_tables(self):
+        """Tables besides the main one whose writes can change the result"""
+        tables = set(self.tables)
+        if self.tags is not None:
+            tables.add('book_tags')
+        if self.any_tag:
+            tables.add('tags')
+        return tables
+
+    def matches(self, table, values):
+        """
+        Whether a written row may belong to the result
+
+        Args:
+            table: Table name of the written row
+            values: Column values captured at flush
+        """
+        if table == 'book_tags':
+            if self.tags is None:
+                return False
+            tag_id = values.get('tag_id')
+            return self.any_tag or tag_id is None or tag_id in self.tags
+        if table in ('book_authors', 'authors', 'tags'):
+            return table in self.related_tables()
+        if table != self.table:
+            return False
+
+        for field, compare, expected in self.clauses:
+            if field not in values:
+                continue
+            value = values[field]
+            if value is None:
+                return False
+            try:
+                if not compare(value, expected):
+                    return False
+            except TypeError:
+                continue
+
+        for fields, tokens in self.texts:
+            if tokens is None or any(field not in values for field in fields):
+                continue
+            haystack = fold(' '.join(str(values[field] or '') for field in fields))
+            # ISBNs match with or without separators
+            haystack += ' ' + _SEPARATOR_RE.sub('', haystack)
+            if not all(token in haystack for token in tokens):
+                return False
+        return True
+
+# Stored per search: the predicate, the set of result IDs (None when too
+# large) and the ordered result. A tuple, so the store sizes all of it.
+_Entry = namedtuple('_Entry', ('predicate', 'book_ids', 'result'))
+
+class SearchResultCache:
+    """
+    Ordered result IDs per normalized search with selective invalidation
+
+    Args:
+        ttl: Seconds an entry lives
+        max_entries: Entries kept before the least recently used are evicted
+        max_ids: Longest result cached; longer ones are remembered as too
+            large and served by SQL
+    """
+
+    def __init__(self, ttl=300, max_entries=1000, max_ids=10000):
+        self.enabled = False
+        self.ttl = ttl
+        self.max_ids = max_ids
+        self._store = MemoryStore(max_entries=max_entries)
+        # Entries being computed; a write affecting one bumps the generation
+        self._computing = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._store)
+
+    def init_app(self, app):
+        """Enable the cache if SEARCH_RESULT_CACHE_ENABLED is set and follow writes"""
+        if not app.config.get('SEARCH_RESULT_CACHE_ENABLED', False):
+            return
+
+        from models.base_model import on_commit
+        from utils.db_manager import on_write
+        self.ttl = app.config.get('SEARCH_RESULT_CACHE_TTL', self.ttl)
+        self.max_ids = app.config.get('SEARCH_RESULT_CACHE_MAX_IDS', self.max_ids)
+        self._store = MemoryStore(max_entries=app.config.get('SEARCH_RESULT_CACHE_MAX_ENTRIES', 1000))
+        on_commit(self.on_commit)
+        on_write(self.on_write)
+        self.enabled = True
+
+    def get_or_compute(self, namespace, signature, predicate, compute):
+        """
+        Cached result IDs for a search, computing them on a miss
+
+        Args:
+            namespace: Name of the search, e.g. 'search_books'
+            signature: Hashable normalized term, filters and sort
+            predicate: SearchPredicate of the search
+            compute: Callable taking a row limit and returning the ordered
+                result IDs, at most that many
+
+        Returns:
+            List of book IDs, or None when the result is longer than max_ids
+        """
+        key = make_key(f"{KEY_PREFIX}:{namespace}", (signature,), {})
+        entry = self._store.get(key, MISSING)
+        if entry is not MISSING:
+            stats.record(key, 'hits')
+            return None if entry.result == TOO_LARGE else entry.result
+        stats.record(key, 'misses')
+
+        pending = _Entry(predicate, None, None)
+        with self._lock:
+            generation = self._generation
+            self._computing.append(pending)
+        try:
+            book_ids = list(compute(self.max_ids + 1))
+        except Exception:
+            with self._lock:
+                self._computing.remove(pending)
+            raise
+        too_large = len(book_ids) > self.max_ids
+
+        with self._lock:
+            self._computing.remove(pending)
+            # A write committed while computing may not be reflected
+            if generation == self._generation:
+                if too_large:
+                    entry = _Entry(predicate, None, TOO_LARGE)
+                else:
+                    entry = _Entry(predicate, set(book_ids), book_ids)
+                self._store.set(key, entry, self.ttl)
+        return None if too_large else book_ids
+
+    def _invalidate(self, affected):
+        with self._lock:
+            if any(affected(entry) for entry in self._computing):
+                self._generation += 1
+            for key, entry in self._store.items():
+                if affected(entry):
+                    self._store.delete(key)
+
+    def on_commit(self, changes):
+        """Commit hook: drop the entries the written rows can affect"""
+        def affected(entry):
+            for table, values in changes:
+                if table in BOOK_TABLES and entry.book_ids and values.get('book_id') in entry.book_ids:
+                    return True
+                if entry.predicate.matches(table, values):
+                    return True
+            return False
+
+        self._invalidate(affected)
+
+    def on_write(self, tables):
+        """Raw SQL write hook: drop the entries reading the written tables"""
+        tables = set(tables)
+
+        def affected(entry):
+            predicate = entry.predicate
+            return predicate.table in tables or bool(predicate.related_tables() & tables)
+
+        self._invalidate(affected)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._store.clear()
+
+# Create a singleton instance
+search_result_cache = SearchResultCache()
@@ -36,7 +36,6 @@ class Scheduler:
     def _update_overdue_books(self):
         """Update status of overdue books"""
         from utils.db_manager import execute_update
-        from models.notification import Notification
         
         try:
             # Update borrowings status to 'overdue' if due_date has passed
@@ -47,24 +46,26 @@ class Scheduler:
             """)
             
             if affected_rows > 0:
-                # Get the overdue borrowings to create notifications
-                from utils.db_manager import execute_query
-                overdue_borrowings = execute_query("""
+                # Stream the overdue borrowings to create notifications
+                from utils.db_manager import iter_query, insert_many
+                overdue_batches = iter_query("""
                     SELECT b.borrowing_id, b.user_id, b.book_id, b.due_date, bk.title
                     FROM borrowings b
                     JOIN books bk ON b.book_id = bk.book_id
                     WHERE b.status = 'overdue' AND b.due_date = DATE_SUB(CURDATE(), INTERVAL 1 DAY)
-                """, dictionary=True)
+                """, dictionary=True, batches=True)
                 
-                # Create notifications for newly overdue books
-                for borrowing in overdue_borrowings:
-                    message = f"Your book '{borrowing['title']}' is now overdue. Please return it as soon as possible to avoid additional fines."
-                    Notification.create(
-                        borrowing['user_id'],
-                        message,
-                        'overdue_book',
-                        borrowing['borrowing_id']
-                    )
+                # Create notifications for newly overdue books, one INSERT per batch
+                for batch in overdue_batches:
+                    insert_many('notifications', ('user_id', 'message', 'type', 'related_id'), (
+                        (
+                            borrowing['user_id'],
+                            f"Your book '{borrowing['title']}' is now overdue. Please return it as soon as possible to avoid additional fines.",
+                            'overdue',
+                            borrowing['borrowing_id']
+                        )
+                        for borrowing in batch
+                    ))
             
             logger.info(f"Updated {affected_rows} borrowings to overdue status")
             return True
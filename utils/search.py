@@ -1,124 +1,260 @@
+import re
+from flask import current_app
 from utils.db_manager import execute_query
-from utils.pagination import Pagination, get_pagination_args
+from utils.pagination import Pagination, get_pagination_args, get_cursor_arg, encode_cursor, decode_cursor, keyset_condition
+from utils.cache import cached
+from utils.db_router import read_only
+from utils.counting import count_strategy
+from utils.query_builder import QueryBuilder, Condition
+from utils.result_cache import SearchPredicate, normalize_term, search_result_cache
+from utils.search_index import search_index, tokenize, looks_like_isbn
+
+# Columns of the ft_books_text FULLTEXT index; MATCH() must list them exactly
+FULLTEXT_COLUMNS = 'b.title, b.author, b.description'
+
+# Words and quoted phrases with optional boolean-mode operators; an operator
+# only counts at the start of a word, so 'spider-man' isn't 'spider -man'
+_BOOLEAN_TERM_RE = re.compile(r'(?:(?<![^\s])([+\-~<>]))?("[^"]+"|[^\W_]+)(\*?)')
+_BOOLEAN_OPERATOR_RE = re.compile(r'(?<![^\s])[+\-~<>]|\*|"')
+
+BOOK_SEARCH = QueryBuilder(
+    columns="""
+        b.book_id, b.isbn, b.title, b.author, b.category,
+        b.publication_year, b.copies_available, b.total_copies
+    """,
+    source='books b',
+    conditions={
+        'book_ids': Condition('b.book_id IN ({})', expand=True),
+        'fulltext': Condition(f'MATCH({FULLTEXT_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)'),
+        'pattern': Condition('(b.title LIKE %s OR b.author LIKE %s OR b.isbn LIKE %s)', repeat=3),
+        'category': Condition('b.category = %s'),
+        'year_from': Condition('b.publication_year >= %s'),
+        'year_to': Condition('b.publication_year <= %s'),
+        'available': Condition('b.copies_available > 0', repeat=0),
+        'unavailable': Condition('b.copies_available = 0', repeat=0)
+    },
+    key_column='b.book_id'
+)
+
+USER_SEARCH = QueryBuilder(
+    columns='u.user_id, u.username, u.full_name, u.email, u.role, u.created_at',
+    source='users u',
+    conditions={
+        'pattern': Condition('(u.username LIKE %s OR u.full_name LIKE %s OR u.email LIKE %s)', repeat=3),
+        'role': Condition('u.role = %s')
+    }
+)
+
+
+def boolean_query(search_term, min_token_size=3):
+    """
+    Convert a search term into a MATCH ... AGAINST boolean-mode expression
+
+    Plain words become required prefix terms ('harry pot' -> '+harry* +pot*').
+    Terms that already use operators (+word -word "a phrase" word*) keep them,
+    with dangling operators dropped so MySQL can't reject the expression.
+
+    Args:
+        search_term: User search input
+        min_token_size: Words shorter than this are not in the FULLTEXT
+            index (innodb_ft_min_token_size) and are left out
+
+    Returns:
+        Boolean-mode expression, or None if nothing searchable remains
+        (the caller should fall back to LIKE)
+    """
+    # ISBNs aren't in the FULLTEXT index
+    if looks_like_isbn(search_term):
+        return None
+
+    if not _BOOLEAN_OPERATOR_RE.search(search_term):
+        words = [word for word in tokenize(search_term) if len(word) >= min_token_size]
+        return ' '.join(f'+{word}*' for word in words) or None
+
+    terms = []
+    for operator, word, wildcard in _BOOLEAN_TERM_RE.findall(search_term):
+        if not word.startswith('"') and len(word) < min_token_size:
+            continue
+        terms.append(f'{operator}{word}{wildcard}')
+    return ' '.join(terms) or None
+
+def fulltext_query(search_term):
+    """
+    Boolean-mode expression for a search term when the configured
+    SEARCH_BACKEND is 'fulltext'
+
+    Returns:
+        Expression for MATCH ... AGAINST, or None to use LIKE
+    """
+    if not search_term or current_app.config.get('SEARCH_BACKEND', 'like') != 'fulltext':
+        return None
+    return boolean_query(search_term, current_app.config.get('FULLTEXT_MIN_TOKEN_SIZE', 3))
 
 class Search:
     @staticmethod
-    def search_books(search_term=None, filters=None, sort_by='title', sort_order='asc'):
+    @read_only
+    def search_books(search_term=None, filters=None, sort_by=None, sort_order='asc', fuzzy=False):
         """
         Search books with filters and sorting
         
         Args:
-            search_term: Search term for title, author, or ISBN
+            search_term: Search term for title, author, or ISBN; with the
+                'fulltext' backend it may use boolean-mode operators
             filters: Dictionary of filters (category, year, etc.)
-            sort_by: Field to sort by
+            sort_by: Field to sort by, or 'relevance' (the default for
+                FULLTEXT searches, otherwise title)
             sort_order: Sort order ('asc' or 'desc')
+            fuzzy: Tolerate typos in title and author words; needs the
+                search index, and ranks by closeness unless sort_by is given
+        
+        A 'cursor' request argument from a previous page's next_cursor
+        pages by keyset instead of page number. With the search result
+        cache enabled, other requests page through the cached result IDs.
         
         Returns:
             List of books matching the criteria
         """
-        # Base query
-        query = """
-            SELECT b.book_id, b.isbn, b.title, b.author, b.category, 
-                   b.publication_year, b.copies_available, b.total_copies
-            FROM books b
-            WHERE 1=1
-        """
-        params = []
+        # Resolve the search term to candidate IDs from the in-memory index;
+        # terms matching too many books for an IN list are left to SQL
+        book_ids = None
+        if search_term and search_index.ready:
+            book_ids = search_index.fuzzy_search(search_term) if fuzzy else search_index.search(search_term)
+        if book_ids is not None and not book_ids:
+            page, per_page = get_pagination_args()
+            return [], Pagination(page, per_page, 0)
         
-        # Add search term
-        if search_term:
-            query += """ 
-                AND (
-                    b.title LIKE %s OR 
-                    b.author LIKE %s OR 
-                    b.isbn LIKE %s
-                )
-            """
-            search_pattern = f"%{search_term}%"
-            params.extend([search_pattern, search_pattern, search_pattern])
-        
-        # Add filters
-        if filters:
-            if 'category' in filters and filters['category']:
-                query += " AND b.category = %s"
-                params.append(filters['category'])
-            
-            if 'year_from' in filters and filters['year_from']:
-                query += " AND b.publication_year >= %s"
-                params.append(filters['year_from'])
-            
-            if 'year_to' in filters and filters['year_to']:
-                query += " AND b.publication_year <= %s"
-                params.append(filters['year_to'])
-            
-            if 'availability' in filters:
-                if filters['availability'] == 'available':
-                    query += " AND b.copies_available > 0"
-                elif filters['availability'] == 'unavailable':
-                    query += " AND b.copies_available = 0"
+        # Bind the search term and filters; candidate IDs replace the
+        # text match, which falls back from FULLTEXT to LIKE
+        filters = filters or {}
+        fulltext = None if book_ids else fulltext_query(search_term)
+        query = BOOK_SEARCH.bind({
+            'book_ids': book_ids,
+            'fulltext': fulltext,
+            'pattern': f"%{search_term}%" if search_term and not book_ids and not fulltext else None,
+            'category': filters.get('category'),
+            'year_from': filters.get('year_from'),
+            'year_to': filters.get('year_to'),
+            'available': filters.get('availability') == 'available',
+            'unavailable': filters.get('availability') == 'unavailable'
+        })
         
-        # Add sorting
-        valid_sort_fields = ['title', 'author', 'category', 'publication_year', 'copies_available']
-        if sort_by not in valid_sort_fields:
-            sort_by = 'title'
+        # Fuzzy matches are ranked by edit distance, which SQL can't order
+        # by, so they page through the (capped) ranked candidate IDs
+        rank = None
+        if fuzzy and book_ids and sort_by is None:
+            rank = {book_id: position for position, book_id in enumerate(book_ids)}
         
-        sort_order = 'DESC' if sort_order.lower() == 'desc' else 'ASC'
-        query += f" ORDER BY b.{sort_by} {sort_order}"
+        # Add sorting; relevance needs the MATCH expression again and
+        # isn't a column, so relevance-ordered results only page by offset
+        # and the extra row below tells if there's a next page
+        order_params = []
+        sort_key = None
+        valid_sort_fields = ['title', 'author', 'category', 'publication_year', 'copies_available']
+        if fulltext and sort_by in (None, 'relevance'):
+            order_by = f"MATCH({FULLTEXT_COLUMNS}) AGAINST (%s IN BOOLEAN MODE) DESC, b.book_id"
+            order_params.append(fulltext)
+        else:
+            if sort_by not in valid_sort_fields:
+                sort_by = 'title'
+            
+            sort_order = 'DESC' if sort_order.lower() == 'desc' else 'ASC'
+            order_by = f"b.{sort_by} {sort_order}, b.book_id {sort_order}"
+            sort_key = f"{sort_by}:{sort_order.lower()}"
         
         # Get pagination parameters
         page, per_page = get_pagination_args()
+        cursor = get_cursor_arg() if sort_key and rank is None else None
         
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as count
-            FROM books b
-            WHERE 1=1
-        """
-        
-        # Add search term to count query
-        if search_term:
-            count_query += """ 
-                AND (
-                    b.title LIKE %s OR 
-                    b.author LIKE %s OR 
-                    b.isbn LIKE %s
-                )
-            """
-        
-        # Add filters to count query
-        if filters:
-            if 'category' in filters and filters['category']:
-                count_query += " AND b.category = %s"
-            
-            if 'year_from' in filters and filters['year_from']:
-                count_query += " AND b.publication_year >= %s"
+        # Page through the ordered IDs of the whole result when they are
+        # cached per normalized search, or ranked in memory
+        if rank is not None or (search_result_cache.enabled and not cursor):
+            def result_ids(limit):
+                sql, params = query.ids(order_by, limit, order_params)
+                ids = [row['book_id'] for row in execute_query(sql, params, dictionary=True, prepared=True)]
+                if rank is not None:
+                    ids.sort(key=rank.__getitem__)
+                return ids
             
-            if 'year_to' in filters and filters['year_to']:
-                count_query += " AND b.publication_year <= %s"
-            
-            if 'availability' in filters:
-                if filters['availability'] == 'available':
-                    count_query += " AND b.copies_available > 0"
-                elif filters['availability'] == 'unavailable':
-                    count_query += " AND b.copies_available = 0"
+            if search_result_cache.enabled:
+                signature = (
+                    normalize_term(search_term), fuzzy,
+                    tuple(sorted((name, value) for name, value in filters.items() if value not in (None, ''))),
+                    sort_by if rank is None else 'rank', sort_order.lower()
+                )
+                ids = search_result_cache.get_or_compute(
+                    'search_books', signature, Search._book_predicate(search_term, filters, fuzzy, book_ids is not None), result_ids
+                )
+            else:
+                ids = result_ids(len(book_ids))
+            if ids is not None:
+                start = (page - 1) * per_page
+                return Search._books_by_id(ids[start:start + per_page]), Pagination(page, per_page, len(ids))
         
-        # Execute count query
-        count_result = execute_query(count_query, params, dictionary=True, fetchall=False)
-        total_count = count_result['count'] if count_result else 0
+        # Get total count (cached, or estimated for large results)
+        total = count_strategy.count_sql(*query.count(), ['books'])
         
-        # Add pagination to main query
-        query += " LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
+        # Continue after the cursor position, or skip to the page
+        after = None
+        if cursor:
+            after = keyset_condition(
+                f"b.{sort_by}", "b.book_id", decode_cursor(cursor, sort_key),
+                sort_order == 'DESC', sort_by in ('category', 'publication_year')
+            )
         
-        # Execute main query
-        books = execute_query(query, params, dictionary=True)
+        # One extra row tells if there's a next page
+        sql, params = query.page(
+            order_by, per_page + 1, 0 if cursor else (page - 1) * per_page, order_params, after
+        )
+        books = execute_query(sql, params, dictionary=True, prepared=True)
+        has_more = len(books) > per_page
+        next_cursor = None
+        if has_more:
+            books = books[:per_page]
+            if sort_key:
+                next_cursor = encode_cursor(sort_key, [books[-1][sort_by], books[-1]['book_id']])
         
         # Create pagination object
-        pagination = Pagination(page, per_page, total_count)
+        pagination = Pagination(
+            None if cursor else page, per_page, total.total, cursor, next_cursor, total.exact, has_more
+        )
         
         return books, pagination
     
     @staticmethod
+    def _books_by_id(book_ids):
+        """Book rows for IDs, in the order given"""
+        if not book_ids:
+            return []
+        sql, params = BOOK_SEARCH.bind({'book_ids': book_ids}).select()
+        books = {book['book_id']: book for book in execute_query(sql, params, dictionary=True, prepared=True)}
+        return [books[book_id] for book_id in book_ids if book_id in books]
+    
+    @staticmethod
+    def _book_predicate(search_term, filters, fuzzy, indexed=False):
+        """Rows a cached search_books result depends on"""
+        predicate = SearchPredicate('books')
+        if search_term:
+            predicate.text(search_term, ('title', 'author', 'isbn'), exact=not fuzzy)
+            # Author names are matched through the join tables
+            predicate.related('book_authors', 'authors')
+            if indexed:
+                # The search index also matches tag names
+                predicate.tagged()
+        if filters.get('category'):
+            predicate.where('category', '=', filters['category'])
+        if filters.get('year_from'):
+            predicate.where('publication_year', '>=', filters['year_from'])
+        if filters.get('year_to'):
+            predicate.where('publication_year', '<=', filters['year_to'])
+        if filters.get('availability') == 'available':
+            predicate.where('copies_available', '>', 0)
+        elif filters.get('availability') == 'unavailable':
+            predicate.where('copies_available', '=', 0)
+        return predicate
+    
+    @staticmethod
+    @cached(ttl=3600, tags=['books'])
+    @read_only
     def get_book_categories():
         """Get all unique book categories"""
         query = "SELECT DISTINCT category FROM books ORDER BY category"
@@ -126,6 +262,7 @@ class Search:
         return [category['category'] for category in categories]
     
     @staticmethod
+    @read_only
     def search_users(search_term=None, role=None, sort_by='username', sort_order='asc'):
         """
         Search users
@@ -139,30 +276,10 @@ class Search:
         Returns:
             List of users matching the criteria
         """
-        # Base query
-        query = """
-            SELECT u.user_id, u.username, u.full_name, u.email, u.role, u.created_at
-            FROM users u
-            WHERE 1=1
-        """
-        params = []
-        
-        # Add search term
-        if search_term:
-            query += """ 
-                AND (
-                    u.username LIKE %s OR 
-                    u.full_name LIKE %s OR 
-                    u.email LIKE %s
-                )
-            """
-            search_pattern = f"%{search_term}%"
-            params.extend([search_pattern, search_pattern, search_pattern])
-        
-        # Add role filter
-        if role:
-            query += " AND u.role = %s"
-            params.append(role)
+        query = USER_SEARCH.bind({
+            'pattern': f"%{search_term}%" if search_term else None,
+            'role': role
+        })
         
         # Add sorting
         valid_sort_fields = ['username', 'full_name', 'email', 'role', 'created_at']
@@ -170,44 +287,32 @@ class Search:
             sort_by = 'username'
         
         sort_order = 'DESC' if sort_order.lower() == 'desc' else 'ASC'
-        query += f" ORDER BY u.{sort_by} {sort_order}"
+        order_by = f"u.{sort_by} {sort_order}, u.user_id {sort_order}"
+        sort_key = f"{sort_by}:{sort_order.lower()}"
         
         # Get pagination parameters
         page, per_page = get_pagination_args()
+        cursor = get_cursor_arg()
         
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as count
-            FROM users u
-            WHERE 1=1
-        """
-        
-        # Add search term to count query
-        if search_term:
-            count_query += """ 
-                AND (
-                    u.username LIKE %s OR 
-                    u.full_name LIKE %s OR 
-                    u.email LIKE %s
-                )
-            """
-        
-        # Add role filter to count query
-        if role:
-            count_query += " AND u.role = %s"
-        
-        # Execute count query
-        count_result = execute_query(count_query, params, dictionary=True, fetchall=False)
-        total_count = count_result['count'] if count_result else 0
+        # Get total count (cached, or estimated for large results)
+        total = count_strategy.count_sql(*query.count(), ['users'])
         
-        # Add pagination to main query
-        query += " LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
+        # Continue after the cursor position, or skip to the page
+        after = None
+        if cursor:
+            after = keyset_condition(
+                f"u.{sort_by}", "u.user_id", decode_cursor(cursor, sort_key), sort_order == 'DESC'
+            )
         
-        # Execute main query
-        users = execute_query(query, params, dictionary=True)
+        # One extra row tells if there's a next page
+        sql, params = query.page(order_by, per_page + 1, 0 if cursor else (page - 1) * per_page, after=after)
+        users = execute_query(sql, params, dictionary=True, prepared=True)
+        next_cursor = None
+        if len(users) > per_page:
+            users = users[:per_page]
+            next_cursor = encode_cursor(sort_key, [users[-1][sort_by], users[-1]['user_id']])
         
         # Create pagination object
-        pagination = Pagination(page, per_page, total_count)
+        pagination = Pagination(None if cursor else page, per_page, total.total, cursor, next_cursor, total.exact)
         
         return users, pagination
\ No newline at end of file
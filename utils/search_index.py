@@ -0,0 +1,479 @@
+"""
+In-memory inverted index over the book catalog
+
+Each book is tokenized from its title, author names, ISBN and tag names.
+Every token maps to a posting list: a sorted array('I') of book IDs, 4 bytes
+per entry. A sorted vocabulary next to the postings allows prefix lookups
+with a binary search.
+
+A query matches a book when every query token is a prefix of one of the
+book's tokens, so 'harry pot' finds 'Harry Potter'. ISBNs are indexed with
+separators removed and match by prefix too.
+
+For typo-tolerant search every indexed term is also broken into trigrams
+with posting lists of the terms containing them. A misspelled query token
+collects the terms sharing enough of its trigrams, those few candidates are
+re-ranked by edit distance, and the postings of the close ones are used.
+Distances are only computed against the vocabulary, never per book.
+
+The index is built in a background thread at startup; until it is ready
+Search falls back to SQL. BaseModel commit hooks mark written books dirty
+and they are re-read on the next lookup. Commit hooks only fire in the
+process that made the write, so multi-worker deployments should also set
+SEARCH_INDEX_REBUILD_INTERVAL to rebuild periodically.
+"""
+
+import logging
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_ISBN_RE = re.compile(r'^[\d\s-]+[xX]?$')
+
+# Tables whose rows carry a book_id that changes the indexed text
+BOOK_TABLES = ('books', 'book_authors', 'book_tags')
+
+# Closest vocabulary terms a misspelled token expands to
+MAX_FUZZY_EXPANSIONS = 10
+
+def tokenize(text):
+    """
+    Split text into lower-case word tokens
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of tokens
+    """
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+def isbn_token(isbn):
+    """ISBN with separators removed, indexed as a single token"""
+    return re.sub(r'[^0-9xX]', '', isbn or '').lower()
+
+def document_tokens(title=None, authors=(), isbn=None, tags=()):
+    """
+    Distinct tokens for a book
+
+    Args:
+        title: Book title
+        authors: Author names
+        isbn: ISBN
+        tags: Tag names
+
+    Returns:
+        Tuple of interned tokens
+    """
+    tokens = tokenize(title)
+    for name in chain(authors or (), tags or ()):
+        tokens.extend(tokenize(name))
+    if isbn:
+        tokens.append(isbn_token(isbn))
+    return tuple(sys.intern(token) for token in dict.fromkeys(tokens) if token)
+
+def trigrams(term):
+    """Trigrams of a term padded with '$' so word starts and ends count"""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def max_typos(token):
+    """Edits tolerated for a query token: none for short tokens, then 1, then 2"""
+    if len(token) <= 3:
+        return 0
+    return 1 if len(token) <= 6 else 2
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus transpositions)
+
+    Only the diagonal band of width max_distance is computed, since cells
+    outside it can't lead to a distance within the bound.
+
+    Args:
+        a: First string
+        b: Second string
+        max_distance: Stop early once the distance is known to exceed this
+
+    Returns:
+        The distance, or max_distance + 1 if it is larger than max_distance
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    limit = max_distance + 1
+    before_previous = None
+    previous = [j if j <= max_distance else limit for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [limit] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            char_b = b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value if value < limit else limit
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return limit
+        before_previous, previous = previous, current
+    return previous[-1]
+
+def _has_trigrams(term):
+    # ISBNs and other numbers aren't worth typo tolerance
+    return not term.isdigit()
+
+def looks_like_isbn(search_term):
+    """Whether a search term is an ISBN or ISBN prefix (digits, separators, trailing X)"""
+    return bool(_ISBN_RE.match(search_term.strip())) and len(isbn_token(search_term)) >= 4
+
+def query_tokens(search_term):
+    """
+    Tokens for a search term; an ISBN-looking term is kept as one token
+
+    Args:
+        search_term: User search input
+
+    Returns:
+        List of tokens
+    """
+    if not search_term:
+        return []
+    if looks_like_isbn(search_term):
+        return [isbn_token(search_term)]
+    return list(dict.fromkeys(tokenize(search_term)))
+
+def load_documents(book_ids=None):
+    """
+    Read the indexed fields of books from the database
+
+    Args:
+        book_ids: Book IDs to load, or None for the whole catalog
+
+    Returns:
+        Dictionary of book_id to keyword arguments for document_tokens
+    """
+    from models import db
+    from models.author import Author
+    from models.book import Book
+    from models.book_author import BookAuthor
+    from models.tag import Tag, BookTag
+
+    books = db.session.query(Book.book_id, Book.title, Book.isbn)
+    authors = db.session.query(BookAuthor.book_id, Author.name).join(Author, Author.author_id == BookAuthor.author_id)
+    tags = db.session.query(BookTag.book_id, Tag.name).join(Tag, Tag.tag_id == BookTag.tag_id)
+    if book_ids is not None:
+        books = books.filter(Book.book_id.in_(book_ids))
+        authors = authors.filter(BookAuthor.book_id.in_(book_ids))
+        tags = tags.filter(BookTag.book_id.in_(book_ids))
+
+    documents = {
+        book_id: {'title': title, 'isbn': isbn, 'authors': [], 'tags': []}
+        for book_id, title, isbn in books.order_by(Book.book_id)
+    }
+    for book_id, name in authors:
+        if book_id in documents:
+            documents[book_id]['authors'].append(name)
+    for book_id, name in tags:
+        if book_id in documents:
+            documents[book_id]['tags'].append(name)
+    return documents
+
+class SearchIndex:
+    """
+    Token to book ID inverted index with prefix search
+
+    Args:
+        min_prefix_length: Query tokens shorter than this only match whole
+            tokens, so one-letter queries don't expand to most of the vocabulary
+        max_ids: Most book IDs a search returns; broader searches are left
+            to SQL rather than sent back as an ID list
+    """
+
+    def __init__(self, min_prefix_length=2, max_ids=1000):
+        self.min_prefix_length = min_prefix_length
+        self.max_ids = max_ids
+        self._postings = {}
+        self._terms = []
+        self._trigrams = {}
+        self._documents = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._app = None
+        self._rebuild_thread = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self._documents)
+
+    def init_app(self, app):
+        """Build the index in the background and follow model commits"""
+        if not app.config.get('SEARCH_INDEX_ENABLED', False):
+            return
+
+        from models.base_model import on_commit
+        self._app = app
+        self.min_prefix_length = app.config.get('SEARCH_INDEX_MIN_PREFIX', self.min_prefix_length)
+        self.max_ids = app.config.get('SEARCH_INDEX_MAX_IDS', self.max_ids)
+        on_commit(self.on_commit)
+
+        interval = app.config.get('SEARCH_INDEX_REBUILD_INTERVAL', 0)
+        self._rebuild_thread = threading.Thread(
+            target=self._run, args=(interval,), name='search-index-builder'
+        )
+        self._rebuild_thread.daemon = True
+        self._rebuild_thread.start()
+
+    def _run(self, interval):
+        while True:
+            try:
+                with self._app.app_context():
+                    started = time.perf_counter()
+                    self.build(load_documents())
+                    logger.info(
+                        f"Search index built: {len(self)} books, {len(self._terms)} terms "
+                        f"in {time.perf_counter() - started:.2f}s"
+                    )
+            except Exception as e:
+                logger.error(f"Search index build failed: {e}")
+            if not interval:
+                return
+            time.sleep(interval)
+
+    def build(self, documents):
+        """
+        Replace the index contents
+
+        Args:
+            documents: Dictionary of book_id to document_tokens keyword arguments
+        """
+        postings = {}
+        tokens_by_book = {}
+        for book_id in sorted(documents):
+            tokens = document_tokens(**documents[book_id])
+            tokens_by_book[book_id] = tokens
+            for token in tokens:
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = array('I')
+                posting.append(book_id)
+
+        term_trigrams = {}
+        for term in postings:
+            if _has_trigrams(term):
+                for gram in trigrams(term):
+                    term_trigrams.setdefault(gram, set()).add(term)
+
+        with self._lock:
+            self._postings = postings
+            self._terms = sorted(postings)
+            self._trigrams = term_trigrams
+            self._documents = tokens_by_book
+            self.ready = True
+
+    def add(self, book_id, **fields):
+        """Index a book, replacing its previous tokens"""
+        tokens = document_tokens(**fields)
+        with self._lock:
+            self._remove(book_id)
+            for token in tokens:
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = array('I')
+                    insort(self._terms, token)
+                    if _has_trigrams(token):
+                        for gram in trigrams(token):
+                            self._trigrams.setdefault(gram, set()).add(token)
+                if not posting or posting[-1] < book_id:
+                    posting.append(book_id)
+                else:
+                    position = bisect_left(posting, book_id)
+                    if position == len(posting) or posting[position] != book_id:
+                        posting.insert(position, book_id)
+            self._documents[book_id] = tokens
+
+    def remove(self, book_id):
+        """Remove a book from the index"""
+        with self._lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id):
+        tokens = self._documents.pop(book_id, None)
+        for token in tokens or ():
+            posting = self._postings[token]
+            position = bisect_left(posting, book_id)
+            if position < len(posting) and posting[position] == book_id:
+                del posting[position]
+            if not posting:
+                del self._postings[token]
+                del self._terms[bisect_left(self._terms, token)]
+                if _has_trigrams(token):
+                    for gram in trigrams(token):
+                        terms = self._trigrams.get(gram)
+                        if terms is not None:
+                            terms.discard(token)
+                            if not terms:
+                                del self._trigrams[gram]
+
+    def on_commit(self, changes):
+        """Commit hook: mark books whose indexed text may have changed"""
+        book_ids = {
+            values.get('book_id') for table, values in changes
+            if table in BOOK_TABLES
+        }
+        book_ids.discard(None)
+        if book_ids:
+            with self._lock:
+                self._dirty.update(book_ids)
+
+    def refresh(self):
+        """Re-read dirty books from the database"""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            book_ids, self._dirty = self._dirty, set()
+
+        try:
+            documents = load_documents(book_ids)
+        except Exception:
+            with self._lock:
+                self._dirty.update(book_ids)
+            raise
+
+        for book_id in book_ids:
+            if book_id in documents:
+                self.add(book_id, **documents[book_id])
+            else:
+                self.remove(book_id)
+        return len(book_ids)
+
+    def _matching(self, token):
+        """Postings of all terms starting with token"""
+        if len(token) < self.min_prefix_length:
+            return self._postings.get(token, ())
+
+        postings = []
+        position = bisect_left(self._terms, token)
+        while position < len(self._terms) and self._terms[position].startswith(token):
+            postings.append(self._postings[self._terms[position]])
+            position += 1
+        if len(postings) == 1:
+            return postings[0]
+        return set().union(*postings)
+
+    def search(self, search_term):
+        """
+        Find books matching every token of a search term
+
+        Args:
+            search_term: User search input
+
+        Returns:
+            Sorted list of book IDs, or None when the term has no tokens or
+            matches more than max_ids books
+        """
+        tokens = query_tokens(search_term)
+        if not tokens:
+            return None
+
+        if self._dirty:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Search index refresh failed: {e}")
+
+        with self._lock:
+            matches = sorted((self._matching(token) for token in tokens), key=len)
+            if not matches[0]:
+                return []
+            result = set(matches[0])
+            for posting in matches[1:]:
+                result.intersection_update(posting)
+                if not result:
+                    break
+        if len(result) > self.max_ids:
+            return None
+        return sorted(result)
+
+    def _fuzzy_terms(self, token):
+        """Vocabulary terms within max_typos(token) edits, closest first"""
+        max_distance = max_typos(token)
+        if not max_distance:
+            return [(token, 0)] if token in self._postings else []
+
+        # Each edit changes at most three trigrams, so a term within
+        # max_distance shares all but 3 * max_distance of the longer one's
+        # trigrams (a padded term of length n has at most n trigrams)
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+
+        candidates = []
+        for term, count in shared.items():
+            if abs(len(term) - len(token)) > max_distance:
+                continue
+            if count >= max(len(grams), len(term)) - 3 * max_distance:
+                distance = edit_distance(token, term, max_distance)
+                if distance <= max_distance:
+                    candidates.append((distance, -len(self._postings[term]), term))
+        candidates.sort()
+        return [(term, distance) for distance, _, term in candidates[:MAX_FUZZY_EXPANSIONS]]
+
+    def fuzzy_search(self, search_term, max_results=None):
+        """
+        Find books matching every token of a search term, tolerating typos
+
+        Args:
+            search_term: User search input
+            max_results: Maximum number of book IDs to return, max_ids by
+                default
+
+        Returns:
+            Book IDs ordered by total edit distance, then ID, or None when the
+            term has no tokens
+        """
+        tokens = [token for token in query_tokens(search_term) if not token.isdigit()]
+        if not tokens:
+            return None
+
+        if self._dirty:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Search index refresh failed: {e}")
+
+        with self._lock:
+            distances = None
+            for token in tokens:
+                matches = {}
+                for term, distance in self._fuzzy_terms(token):
+                    for book_id in self._postings[term]:
+                        if distance < matches.get(book_id, distance + 1):
+                            matches[book_id] = distance
+                if distances is None:
+                    distances = matches
+                else:
+                    distances = {
+                        book_id: total + matches[book_id]
+                        for book_id, total in distances.items() if book_id in matches
+                    }
+                if not distances:
+                    return []
+        return sorted(distances, key=lambda book_id: (distances[book_id], book_id))[:max_results or self.max_ids]
+
+# Create a singleton instance
+search_index = SearchIndex()
@@ -2,9 +2,10 @@ import secrets
 import hashlib
 import re
 from datetime import datetime, timedelta
-from flask import request, abort, current_app
+from flask import request, abort, current_app, g
 from utils.logger import get_logger
 from utils.cache import cache
+from utils.rate_limiter import rate_limiter
 from flask_login import current_user
 from functools import wraps
 
@@ -130,7 +131,8 @@ class Security:
                     return False, ""
             
             # Set lockout
-            cache.set(lockout_key, datetime.now() + timedelta(minutes=Security.LOCKOUT_DURATION))
+            cache.set(lockout_key, datetime.now() + timedelta(minutes=Security.LOCKOUT_DURATION),
+                      ttl=Security.LOCKOUT_DURATION * 60)
             return True, f"Account is locked for {Security.LOCKOUT_DURATION} minutes"
         
         return False, ""
@@ -150,11 +152,10 @@ class Security:
             cache.delete(cache_key)
             cache.delete(f"account_locked:{username}")
         else:
-            attempts = cache.get(cache_key, 0) + 1
-            cache.set(cache_key, attempts, timeout=3600)  # Store for 1 hour
+            cache.incr(cache_key, ttl=3600)  # Store for 1 hour
     
     @staticmethod
-    def rate_limit(key, limit=10, period=60):
+    def rate_limit(key, limit=10, period=60, algorithm=None):
         """
         Rate limiting function
         
@@ -162,48 +163,49 @@ class Security:
             key: Key to rate limit (e.g., IP address, user ID)
             limit: Maximum number of requests
             period: Time period in seconds
+            algorithm: 'sliding_window', 'token_bucket' or 'gcra'
+                (defaults to RATELIMIT_ALGORITHM)
         
         Returns:
             Boolean indicating if request is allowed
         """
-        # Get current timestamp
-        now = datetime.now().timestamp()
-        
-        # Get cache key
-        cache_key = f"rate_limit:{key}"
-        
-        # Get existing timestamps from cache
-        timestamps = cache.get(cache_key, [])
-        
-        # Filter out timestamps older than the period
-        valid_timestamps = [ts for ts in timestamps if ts > now - period]
-        
-        # Check if limit is reached
-        if len(valid_timestamps) >= limit:
+        result = rate_limiter.hit(key, limit, period, algorithm)
+        if not result.allowed:
             logger.warning(f"Rate limit exceeded for {key}")
-            return False
-        
-        # Add current timestamp and update cache
-        valid_timestamps.append(now)
-        cache.set(cache_key, valid_timestamps, period)
-        
-        return True
+        return result.allowed
     
     @staticmethod
     def check_ip_rate_limit(limit=10, period=60):
         """
-        Check rate limit for current IP address
+        Check rate limit for the current request
+        
+        Endpoints listed in RATELIMIT_POLICIES use their own limit, counted
+        per user (or per IP for anonymous requests) unless the policy says
+        per='ip'. Other endpoints share the default limit per IP address.
+        The result is stored on flask.g for the rate limit response headers.
         
         Args:
-            limit: Maximum number of requests
-            period: Time period in seconds
+            limit: Default maximum number of requests
+            period: Default time period in seconds
         
         Returns:
             None, aborts with 429 if rate limit is exceeded
         """
-        ip = request.remote_addr
-        if not Security.rate_limit(ip, limit, period):
-            logger.warning(f"IP rate limit exceeded: {ip}")
+        policy = rate_limiter.policy_for(request.endpoint, limit, period)
+        
+        if policy.per == 'user' and current_user.is_authenticated:
+            identity = f"user:{current_user.get_id()}"
+        else:
+            identity = f"ip:{request.remote_addr}"
+        
+        key = identity
+        if request.endpoint in rate_limiter.policies:
+            key = f"{request.endpoint}:{identity}"
+        
+        result = rate_limiter.hit(key, policy.limit, policy.period, policy.algorithm)
+        g.rate_limit = result
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded: {key}")
             abort(429, "Too many requests. Please try again later.")
     
     @staticmethod
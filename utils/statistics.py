@@ -1,8 +1,12 @@
 from utils.db_manager import execute_query
+from utils.cache import cached
+from utils.db_router import read_only
 from datetime import datetime, timedelta
 
 class Statistics:
     @staticmethod
+    @cached(ttl=3600, tags=['books', 'users', 'borrowings'])
+    @read_only
     def get_dashboard_stats():
         """Get statistics for dashboard"""
         stats = {}
@@ -52,6 +56,8 @@ class Statistics:
         return stats
     
     @staticmethod
+    @cached(ttl=3600, tags=['books', 'users', 'borrowings'])
+    @read_only
     def get_borrowing_stats(period='month'):
         """
         Get borrowing statistics for a specific period
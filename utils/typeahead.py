@@ -0,0 +1,237 @@
+"""
+Typeahead suggestions for book titles, author names and ISBNs
+
+Suggestion keys are normalized (lower-case words, ISBNs without separators)
+and kept in one sorted array, so the keys starting with a prefix form a
+contiguous range found by binary search. A segment tree over the entries'
+popularity scores returns the best entry of any range in O(log n), and the
+top k come from repeatedly splitting the range around the best entry, so a
+lookup costs O(k log n) however many keys share the prefix.
+
+Popularity is the number of borrowings of a book; an author scores the sum
+over their books. The index is an immutable snapshot rebuilt in a background
+thread every TYPEAHEAD_REBUILD_INTERVAL seconds and swapped in whole.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from utils.search_index import tokenize, isbn_token, looks_like_isbn
+
+logger = logging.getLogger(__name__)
+
+KIND_TITLE = 0
+KIND_AUTHOR = 1
+KIND_ISBN = 2
+KIND_NAMES = ('title', 'author', 'isbn')
+
+def normalize(text):
+    """Lower-case words of text joined by single spaces"""
+    return ' '.join(tokenize(text))
+
+class _MaxTree:
+    """Segment tree answering 'index of the highest score in [lo, hi)'"""
+
+    def __init__(self, scores):
+        self.scores = scores
+        size = 1
+        while size < len(scores):
+            size *= 2
+        self.size = size
+        tree = array('i', [-1]) * (2 * size)
+        for i in range(len(scores)):
+            tree[size + i] = i
+        for node in range(size - 1, 0, -1):
+            tree[node] = self._better(tree[2 * node], tree[2 * node + 1])
+        self.tree = tree
+
+    def _better(self, a, b):
+        # Ties go to the lower index, i.e. the alphabetically first key
+        if b < 0:
+            return a
+        if a < 0:
+            return b
+        return a if self.scores[a] >= self.scores[b] else b
+
+    def argmax(self, lo, hi):
+        best = -1
+        lo += self.size
+        hi += self.size
+        tree = self.tree
+        while lo < hi:
+            if lo & 1:
+                best = self._better(best, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = self._better(tree[hi], best)
+            lo >>= 1
+            hi >>= 1
+        return best
+
+class TypeaheadIndex:
+    """
+    Immutable prefix index over suggestion entries
+
+    Args:
+        entries: Iterable of (text, kind, ref_id, score) where kind is
+            KIND_TITLE, KIND_AUTHOR or KIND_ISBN and ref_id is the book or
+            author ID
+    """
+
+    def __init__(self, entries=()):
+        rows = []
+        for text, kind, ref_id, score in entries:
+            key = isbn_token(text) if kind == KIND_ISBN else normalize(text)
+            if key:
+                rows.append((key, kind, ref_id, score, text))
+        rows.sort(key=lambda row: row[0])
+
+        self.keys = [row[0] for row in rows]
+        self.labels = [row[4] for row in rows]
+        self.kinds = array('B', (row[1] for row in rows))
+        self.ref_ids = array('I', (row[2] for row in rows))
+        self.scores = array('I', (row[3] for row in rows))
+        self._tree = _MaxTree(self.scores)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _prefix_range(self, prefix):
+        lo = bisect_left(self.keys, prefix)
+        # Every key with the prefix sorts before prefix + the highest code point
+        hi = bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def suggest(self, query, limit=10):
+        """
+        Most popular entries whose key starts with the normalized query
+
+        Args:
+            query: Text typed so far
+            limit: Maximum number of suggestions
+
+        Returns:
+            List of dicts with type, text, id and score, most popular first
+        """
+        if looks_like_isbn(query):
+            prefix = isbn_token(query)
+        else:
+            prefix = normalize(query)
+            # Keep a trailing space so 'harry ' doesn't match 'harrys'
+            if prefix and query[-1:].isspace():
+                prefix += ' '
+        if not prefix:
+            return []
+
+        lo, hi = self._prefix_range(prefix)
+        if lo >= hi:
+            return []
+
+        suggestions = []
+        seen = set()
+        best = self._tree.argmax(lo, hi)
+        candidates = [(-self.scores[best], best, lo, hi)]
+        while candidates and len(suggestions) < limit:
+            _, index, lo, hi = heapq.heappop(candidates)
+            kind = self.kinds[index]
+            identity = (kind, self.labels[index].lower())
+            if identity not in seen:
+                seen.add(identity)
+                suggestions.append({
+                    'type': KIND_NAMES[kind],
+                    'text': self.labels[index],
+                    'id': self.ref_ids[index],
+                    'score': self.scores[index]
+                })
+            for sub_lo, sub_hi in ((lo, index), (index + 1, hi)):
+                if sub_lo < sub_hi:
+                    sub_best = self._tree.argmax(sub_lo, sub_hi)
+                    heapq.heappush(candidates, (-self.scores[sub_best], sub_best, sub_lo, sub_hi))
+        return suggestions
+
+def load_entries():
+    """
+    Read suggestion entries and borrow counts from the database
+
+    Returns:
+        List of (text, kind, ref_id, score) tuples
+    """
+    from sqlalchemy import func
+    from models import db
+    from models.author import Author
+    from models.book import Book
+    from models.book_author import BookAuthor
+    from models.borrowing import Borrowing
+
+    borrows = dict(
+        db.session.query(Borrowing.book_id, func.count(Borrowing.borrowing_id)).group_by(Borrowing.book_id)
+    )
+
+    entries = []
+    for book_id, title, isbn in db.session.query(Book.book_id, Book.title, Book.isbn):
+        score = borrows.get(book_id, 0)
+        entries.append((title, KIND_TITLE, book_id, score))
+        if isbn:
+            entries.append((isbn, KIND_ISBN, book_id, score))
+
+    author_scores = {}
+    for author_id, book_id in db.session.query(BookAuthor.author_id, BookAuthor.book_id):
+        author_scores[author_id] = author_scores.get(author_id, 0) + borrows.get(book_id, 0)
+    for author_id, name in db.session.query(Author.author_id, Author.name):
+        entries.append((name, KIND_AUTHOR, author_id, author_scores.get(author_id, 0)))
+    return entries
+
+class Typeahead:
+    """Holds the current TypeaheadIndex snapshot and rebuilds it in the background"""
+
+    def __init__(self):
+        self.index = None
+        self._app = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.index is not None
+
+    def init_app(self, app):
+        """Start building the index if TYPEAHEAD_ENABLED is set"""
+        if not app.config.get('TYPEAHEAD_ENABLED', False):
+            return
+
+        self._app = app
+        interval = app.config.get('TYPEAHEAD_REBUILD_INTERVAL', 600)
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='typeahead-builder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def rebuild(self):
+        """Build a new snapshot from the database and swap it in"""
+        started = time.perf_counter()
+        index = TypeaheadIndex(load_entries())
+        self.index = index
+        logger.info(f"Typeahead index built: {len(index)} entries in {time.perf_counter() - started:.2f}s")
+
+    def _run(self, interval):
+        while True:
+            try:
+                with self._app.app_context():
+                    self.rebuild()
+            except Exception as e:
+                logger.error(f"Typeahead index build failed: {e}")
+            if not interval:
+                return
+            time.sleep(interval)
+
+    def suggest(self, query, limit=10):
+        """Suggestions from the current snapshot, or None if it isn't built yet"""
+        index = self.index
+        if index is None:
+            return None
+        return index.suggest(query, limit)
+
+# Create a singleton instance
+typeahead = Typeahead()